@@ -0,0 +1,323 @@
+# agent/async_ollama_client.py
+import asyncio
+import json
+import time
+import config
+from .build_trace import record_llm_call
+from .ollama_client import BaseOllamaClient, GenerationBudgetExceeded, PromptSession, RetryCounter, retry_backoff_delay
+
+try:
+    import aiohttp # Optional: pip install aiohttp
+except ImportError:
+    aiohttp = None
+
+class AsyncOllamaClient(BaseOllamaClient):
+    """
+    Asyncio counterpart of OllamaClient for driving many generations from one event loop.
+
+    generate() has the same contract as OllamaClient.generate (returns the text, or
+    an empty string on failure) and shares the on-disk response cache. The cache,
+    failover, response handling and trace recording come from BaseOllamaClient; this
+    class only supplies the aiohttp transport and its retries, which follow the same
+    retry_limits() as the sync client's urllib3 transport. The number of requests in
+    flight is capped by a semaphore, since Ollama's OLLAMA_NUM_PARALLEL is the real
+    limit. Cancelling a task (Ctrl-C, deadlines) aborts its HTTP request.
+
+    Use as an async context manager, or call close() when done.
+    """
+    BROKEN_RESPONSE_ERRORS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) if aiohttp else ()
+    # Failures before the request was sent, retried as 'connect' (any other failure after sending counts as 'read')
+    CONNECT_ERRORS = (aiohttp.ClientConnectorError, getattr(aiohttp, 'ConnectionTimeoutError', aiohttp.ClientConnectorError)) if aiohttp else ()
+
+    def __init__(self, model_name: str = None, api_url=None, use_cache: bool = None, max_concurrency: int = None,
+                 keep_alive=None):
+        """
+        Args:
+            model_name (str, optional): Ollama model. Defaults to config.DEFAULT_OLLAMA_MODEL.
+            api_url (str or list, optional): Generate API URL, or a list of them (see EndpointPool).
+                                             Defaults to config.OLLAMA_ENDPOINTS, or config.OLLAMA_API_URL
+                                             when that is empty.
+            use_cache (bool, optional): Use the on-disk response cache. Defaults to config.LLM_CACHE_ENABLED.
+            max_concurrency (int, optional): Maximum in-flight requests.
+                                             Defaults to config.OLLAMA_ASYNC_MAX_CONCURRENCY.
+            keep_alive (optional): How long Ollama keeps the model loaded after each request.
+                                   Defaults to config.OLLAMA_KEEP_ALIVE.
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncOllamaClient requires aiohttp. Install it with: pip install aiohttp")
+        self._setup(model_name, api_url, use_cache, keep_alive)
+        self.max_concurrency = max_concurrency or config.OLLAMA_ASYNC_MAX_CONCURRENCY
+        self._semaphore = None # Created lazily inside the running event loop
+        self._session = None
+        print(f"    AsyncOllamaClient initialized (model: {self.model_name}, max concurrency: {self.max_concurrency}).")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=config.OLLAMA_POOL_MAXSIZE)
+            self._session = aiohttp.ClientSession(connector=connector, headers={'Content-Type': 'application/json'})
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _post_with_retries(self, payload: dict, timeout, call: dict = None, retry_reads: bool = True) -> tuple:
+        """
+        POSTs to the least-loaded endpoint of the pool, retrying with backoff within
+        retry_limits(): connection failures and retryable statuses up to
+        config.OLLAMA_MAX_RETRIES, read failures (timeouts or dropped connections after the
+        request was sent) up to config.OLLAMA_READ_RETRIES, or not at all with
+        retry_reads=False (requests with a latency budget). Once an endpoint's retries are
+        used up, or it lacks the model, the request fails over to the next endpoint (see
+        BaseOllamaClient._fail_over). The number of retries is stored in call['retries']
+        when a dict is given.
+
+        Returns:
+            tuple: (response, endpoint); hand the endpoint back with _release_endpoint().
+        """
+        session = self._get_session()
+        tried = []
+        if call is not None: call["retries"] = 0
+        while True:
+            endpoint = self.pool.acquire(exclude=tried)
+            retries = RetryCounter(retry_reads)
+            try:
+                while True:
+                    failure, response = None, None
+                    try:
+                        response = await session.post(endpoint.url, data=json.dumps(payload), timeout=timeout)
+                    except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                        failure, kind = e, 'connect' if isinstance(e, self.CONNECT_ERRORS) else 'read'
+                    else:
+                        if response.status not in config.OLLAMA_RETRY_STATUS_CODES and response.status != 404:
+                            return response, endpoint
+                        failure, kind = f"HTTP {response.status}", 'status'
+                    if failure == "HTTP 404" or not retries.allow(kind): break
+                    if response is not None: response.release()
+                    if call is not None: call["retries"] += 1
+                    await asyncio.sleep(retry_backoff_delay(sum(retries.counts.values())))
+            except BaseException: # Cancelled, or an unexpected error
+                self.pool.release(endpoint)
+                raise
+            if not self._fail_over(endpoint, tried, failure, failure == "HTTP 404", payload, call):
+                if response is not None: return response, None # Let the caller report the final response
+                raise failure
+            if response is not None: response.release()
+
+    async def _session_context(self, session: PromptSession, model_name: str = None) -> list:
+        """Async counterpart of OllamaClient._session_context (None if priming failed)."""
+        model_name = model_name or self.model_name
+        if session.async_lock is None: session.async_lock = asyncio.Lock()
+        async with session.async_lock:
+            if session.context is not None or session.failed: return session.context
+            print(f"    Evaluating shared prompt prefix once (project session, model: {model_name})...")
+            payload = session.prime_payload(model_name, self.DEFAULT_OPTIONS, self.keep_alive)
+            timeout = aiohttp.ClientTimeout(total=None, connect=config.OLLAMA_CONNECT_TIMEOUT, sock_read=config.OLLAMA_READ_TIMEOUT)
+            start = time.perf_counter()
+            call = {"retries": None, "server": None, "error": None} # For the build trace
+            endpoint, failure = None, None
+            try:
+                async with self._get_semaphore():
+                    response, endpoint = await self._post_with_retries(payload, timeout, call)
+                    async with response:
+                        response.raise_for_status()
+                        response_data = json.loads(await response.text())
+                self._store_session_context(session, response_data, call)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                failure = e
+                call["error"] = f"{type(e).__name__}: {e}"
+            except BaseException as e:
+                failure = e
+                raise
+            finally:
+                self._release_endpoint(endpoint, start, failure)
+                record_llm_call(model=model_name, start=start, end=time.perf_counter(), ok=session.context is not None, **call)
+            return self._end_priming(session, call)
+
+    async def generate(self, prompt: str, system_message: str = None, format_json: bool = False, options: dict = None,
+                       stream: bool = False, session: PromptSession = None, model_name: str = None,
+                       budget_seconds: float = None) -> str:
+        """
+        Sends a prompt to the Ollama API and returns the generated text.
+
+        Args:
+            prompt (str): The main user prompt for the LLM.
+            system_message (str, optional): An optional system message.
+            format_json (bool): Whether to request JSON output format from Ollama.
+            options (dict, optional): Ollama model options, merged over DEFAULT_OPTIONS.
+            stream (bool): Collect the response via generate_stream(), salvaging partial output.
+            session (PromptSession, optional): `prompt` is a suffix of the session's shared prefix
+                                               (see OllamaClient.generate).
+            model_name (str, optional): Model for this request instead of the client's model.
+            budget_seconds (float, optional): Latency budget, not counting the wait for a
+                                              concurrency slot (see OllamaClient.generate).
+
+        Returns:
+            str: The generated text content, or an empty string if an error occurs.
+
+        Raises:
+            asyncio.CancelledError: If the calling task is cancelled.
+            GenerationBudgetExceeded: If `budget_seconds` ran out; partial output is discarded.
+        """
+        prompt, system_message, session, merged_options, cache_key, model_name = self._prepare_request(
+            prompt, system_message, format_json, options, session, model_name)
+        cached_text = self._cached_response(cache_key, model_name)
+        if cached_text: return cached_text
+
+        context = None
+        if session is not None:
+            context = await self._session_context(session, model_name)
+            if context is None:
+                return await self.generate(session.full_prompt(prompt), session.system_message, format_json, options, stream,
+                                           model_name=model_name, budget_seconds=budget_seconds)
+            system_message = None # Part of the context
+
+        retry_reads = budget_seconds is None # A retried read would start the generation over, past the budget
+        async with self._get_semaphore():
+            if stream:
+                generation = self._generate_streamed(prompt, system_message, format_json, merged_options, cache_key, context,
+                                                     model_name, retry_reads)
+            else:
+                generation = self._generate_once(prompt, system_message, format_json, merged_options, cache_key, context,
+                                                 model_name, retry_reads)
+            if budget_seconds is None: return await generation
+            try:
+                return await asyncio.wait_for(generation, budget_seconds)
+            except asyncio.TimeoutError:
+                raise GenerationBudgetExceeded(f"'{model_name}' did not finish within {budget_seconds}s") from None
+
+    async def _generate_once(self, prompt: str, system_message: str, format_json: bool, options: dict, cache_key: str,
+                             context: list, model_name: str, retry_reads: bool = True) -> str:
+        """One non-streamed generation request (the caller holds a concurrency slot)."""
+        print(f"    Sending prompt to Ollama asynchronously (model: {model_name})...")
+        payload = self._build_payload(prompt, system_message, format_json, options, stream=False, context=context,
+                                      model_name=model_name)
+        timeout = aiohttp.ClientTimeout(total=None, connect=config.OLLAMA_CONNECT_TIMEOUT, sock_read=config.OLLAMA_READ_TIMEOUT)
+        start = time.perf_counter()
+        generated_text = ""
+        call = {"retries": None, "server": None, "error": None} # For the build trace
+        endpoint, failure = None, None
+        try:
+            response, endpoint = await self._post_with_retries(payload, timeout, call, retry_reads)
+            async with response:
+                if response.status >= 400:
+                    print(f"      ERROR: Failed to get response from Ollama API: HTTP {response.status}")
+                    print(f"      Ollama Response Body: {await response.text()}")
+                    call["error"] = f"HTTP {response.status}"
+                    return ""
+                response_data = json.loads(await response.text())
+            generated_text = self._read_response(response_data, cache_key, model_name, call)
+            return generated_text
+        except asyncio.TimeoutError as e:
+            print(f"      ERROR: Request to Ollama timed out after {config.OLLAMA_READ_TIMEOUT} seconds.")
+            call["error"], failure = "timeout", e
+            return ""
+        except aiohttp.ClientError as e:
+            print(f"      ERROR: Failed to get response from Ollama API: {e}")
+            call["error"], failure = f"{type(e).__name__}: {e}", e
+            return ""
+        except json.JSONDecodeError as e:
+            print(f"      ERROR: Could not decode JSON response from Ollama.")
+            call["error"], failure = "invalid JSON response", e
+            return ""
+        except BaseException as e: # Cancelled (also when a latency budget runs out)
+            call["error"], failure = type(e).__name__, e
+            raise
+        finally:
+            self._release_endpoint(endpoint, start, failure)
+            record_llm_call(model=model_name, start=start, end=time.perf_counter(), ok=bool(generated_text), **call)
+
+    async def _generate_streamed(self, prompt: str, system_message: str, format_json: bool, options: dict, cache_key: str,
+                                 context: list = None, model_name: str = None, retry_reads: bool = True) -> str:
+        model_name = model_name or self.model_name
+        print(f"    Streaming prompt to Ollama asynchronously (model: {model_name})...")
+        chunks = []
+        metrics = {}
+        try:
+            async for chunk in self._stream(prompt, system_message, format_json, options, metrics, context, model_name, retry_reads):
+                chunks.append(chunk)
+        except asyncio.TimeoutError:
+            print(f"      ERROR: Ollama stream stalled (no data for {config.OLLAMA_STREAM_INACTIVITY_TIMEOUT} seconds).")
+        except aiohttp.ClientError as e:
+            print(f"      ERROR: Ollama stream failed: {e}")
+        except ValueError as e:
+            print(f"      ERROR: Ollama stream returned malformed data: {e}")
+        return self._collect_stream(chunks, metrics, cache_key, model_name)
+
+    async def generate_stream(self, prompt: str, system_message: str = None, format_json: bool = False, options: dict = None,
+                              metrics: dict = None, context: list = None, model_name: str = None, budget_seconds: float = None):
+        """
+        Async generator yielding text chunks as Ollama's NDJSON lines arrive.
+
+        Same arguments, semantics and metrics as OllamaClient.generate_stream. Holds a
+        concurrency slot for the lifetime of the stream; `budget_seconds` does not count
+        the wait for it.
+
+        Raises:
+            aiohttp.ClientError / asyncio.TimeoutError: On connection failure, HTTP error or stalled stream.
+            GenerationBudgetExceeded: If `budget_seconds` ran out.
+        """
+        model_name = model_name or self.model_name
+        merged_options = {**self.DEFAULT_OPTIONS, **(options or {})}
+        async with self._get_semaphore():
+            stream = self._stream(prompt, system_message, format_json, merged_options, metrics, context, model_name,
+                                  retry_reads=budget_seconds is None)
+            if budget_seconds is None:
+                async for chunk in stream: yield chunk
+                return
+            deadline = time.perf_counter() + budget_seconds
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), max(deadline - time.perf_counter(), 0.0))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        if time.perf_counter() < deadline: raise # The stream stalled (inactivity timeout)
+                        raise GenerationBudgetExceeded(f"'{model_name}' did not finish within {budget_seconds}s") from None
+                    yield chunk
+            finally:
+                await stream.aclose()
+
+    async def _stream(self, prompt: str, system_message: str, format_json: bool, options: dict, metrics: dict = None,
+                      context: list = None, model_name: str = None, retry_reads: bool = True):
+        model_name = model_name or self.model_name
+        payload = self._build_payload(prompt, system_message, format_json, options, stream=True, context=context,
+                                      model_name=model_name)
+        metrics = self._start_stream_metrics(metrics)
+        timeout = aiohttp.ClientTimeout(total=None, connect=config.OLLAMA_CONNECT_TIMEOUT, sock_read=config.OLLAMA_STREAM_INACTIVITY_TIMEOUT)
+        start = time.perf_counter()
+        error = None
+        endpoint, failure = None, None
+        try:
+            response, endpoint = await self._post_with_retries(payload, timeout, metrics, retry_reads)
+            async with response:
+                response.raise_for_status()
+                async for line in response.content:
+                    line = line.strip()
+                    if not line: continue
+                    data = json.loads(line)
+                    if data.get('error'):
+                        raise aiohttp.ClientError(f"Ollama stream error: {data['error']}")
+                    chunk = self._stream_chunk(data, metrics, start)
+                    if chunk: yield chunk
+                    if metrics["done"]: break
+        except BaseException as e:
+            failure = e
+            if isinstance(e, Exception): error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._release_endpoint(endpoint, start, failure)
+            self._finish_stream(metrics, start, model_name, error)
@@ -0,0 +1,229 @@
+# agent/batch_runner.py
+import contextlib
+import glob
+import json
+import multiprocessing
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+import config
+
+# Per-process build pipeline, created once by _init_worker in each pool process
+_worker_state = {}
+
+def collect_project_files(source: str) -> list:
+    """
+    Resolves a directory or glob pattern to a sorted list of project YAML files.
+
+    Args:
+        source (str): A directory (all *.yaml / *.yml inside it) or a glob pattern.
+
+    Returns:
+        list: Path objects for the matching files.
+    """
+    source_path = Path(source)
+    if source_path.is_dir():
+        files = list(source_path.glob('*.yaml')) + list(source_path.glob('*.yml'))
+    else:
+        files = [Path(p) for p in glob.glob(source, recursive=True)]
+    return sorted(p for p in files if p.is_file())
+
+def _init_worker(request_slots, use_cache: bool, incremental: bool, output_dir: str, log_dir: str, api_url=None,
+                 trace_format: str = None, keep_alive=None):
+    """Builds the agent components once per worker process."""
+    from .guideline_manager import GuidelineManager
+    from .ollama_client import OllamaClient
+    from .content_generator import ContentGenerator
+    from .document_formatter import DocumentFormatter
+    from .report_builder import ReportBuilder
+
+    log_path = Path(log_dir) / f"worker_{multiprocessing.current_process().pid}.log"
+    with open(log_path, 'a', encoding='utf-8') as log_file, contextlib.redirect_stdout(log_file):
+        guideline_mgr = GuidelineManager(config.GUIDELINES_FILE_PATH)
+        ollama_client = OllamaClient(model_name=config.DEFAULT_OLLAMA_MODEL, api_url=api_url,
+                                     use_cache=use_cache, request_slots=request_slots, keep_alive=keep_alive,
+                                     warm_up=False) # BatchRunner.run loads the model once for all workers
+        content_gen = ContentGenerator(ollama_client, guideline_mgr)
+        report_builder = ReportBuilder(guideline_mgr, content_gen, DocumentFormatter(guideline_mgr), output_dir=output_dir,
+                                       incremental=incremental, trace_format=trace_format)
+    _worker_state.update({"report_builder": report_builder, "log_dir": Path(log_dir)})
+
+def _build_project_file(project_file: str, doc_types: list) -> list:
+    """
+    Builds every requested document type for one project file inside a worker.
+
+    Never raises: each (file, doc_type) pair yields a result dict with its status,
+    timing, output path and error message. Build output goes to a per-file log.
+    When several document types are requested they are built with
+    ReportBuilder.build_combined, and each result carries the combined build time.
+    """
+    from .input_parser import InputParser
+    report_builder = _worker_state["report_builder"]
+    log_path = _worker_state["log_dir"] / f"{Path(project_file).stem}.log"
+    results = []
+    with open(log_path, 'w', encoding='utf-8') as log_file, contextlib.redirect_stdout(log_file):
+        try:
+            project_data = InputParser(project_file).load_and_validate()
+        except Exception as e:
+            print(f"ERROR: Failed to load or parse input file: {e}")
+            return [{"file": str(project_file), "doc_type": doc_type, "status": "failed", "seconds": 0.0,
+                     "output": None, "error": f"Invalid input: {e}", "log": str(log_path)} for doc_type in doc_types]
+
+        if len(doc_types) > 1:
+            # Combined build shares the sections common to both documents
+            start = time.perf_counter()
+            try:
+                outputs = report_builder.build_combined(project_data, tuple(doc_types))
+            except Exception as e:
+                traceback.print_exc()
+                outputs = {doc_type: e for doc_type in doc_types}
+            seconds = round(time.perf_counter() - start, 3)
+            for doc_type in doc_types:
+                output = outputs.get(doc_type)
+                result = {"file": str(project_file), "doc_type": doc_type, "status": "failed", "seconds": seconds,
+                          "output": None, "error": None, "log": str(log_path), "combined": True}
+                if isinstance(output, Exception) or output is None:
+                    result["error"] = f"{type(output).__name__}: {output}" if output is not None else "Not built"
+                else:
+                    result.update({"status": "succeeded", "output": str(output),
+                                   "phases": dict(report_builder.phase_timings.get(doc_type, {})),
+                                   "llm": report_builder.traces[doc_type].summary()})
+                results.append(result)
+            return results
+
+        for doc_type in doc_types:
+            start = time.perf_counter()
+            result = {"file": str(project_file), "doc_type": doc_type, "status": "failed",
+                      "output": None, "error": None, "log": str(log_path)}
+            try:
+                output_path = report_builder.build(doc_type, project_data)
+                if output_path is None: raise ValueError(f"Invalid document type '{doc_type}'")
+                result.update({"status": "succeeded", "output": str(output_path),
+                               "phases": dict(report_builder.phase_timings.get(doc_type, {})),
+                               "llm": report_builder.traces[doc_type].summary()})
+            except Exception as e:
+                traceback.print_exc()
+                result["error"] = f"{type(e).__name__}: {e}"
+            result["seconds"] = round(time.perf_counter() - start, 3)
+            results.append(result)
+    return results
+
+class BatchRunner:
+    """
+    Builds documents for many project YAML files without user interaction.
+
+    Files are spread across a process pool. All workers share one LLM request
+    limit (a manager-backed semaphore), so the Ollama server sees at most
+    `llm_concurrency` generations at once however many processes run. Individual
+    failures are recorded and the batch continues. A JSON summary with per-file
+    status and timing is written at the end.
+    """
+    def __init__(self, doc_types: list, max_processes: int = None, llm_concurrency: int = None,
+                 output_dir: str = None, use_cache: bool = True, incremental: bool = True, api_url=None,
+                 trace_format: str = None, keep_alive=None):
+        """
+        Args:
+            doc_types (list): Document types to build for each file (config.DOC_SYNOPSIS / config.DOC_REPORT).
+            max_processes (int, optional): Worker processes. Defaults to config.BATCH_MAX_PROCESSES.
+            llm_concurrency (int, optional): Concurrent LLM requests across all workers.
+                                             Defaults to config.BATCH_LLM_CONCURRENCY.
+            output_dir (str, optional): Where documents, logs and the summary go. Defaults to config.OUTPUT_DIR.
+            use_cache (bool): Whether workers use the on-disk LLM response cache.
+            incremental (bool): Whether workers reuse unchanged sections from previous builds.
+            api_url (str or list, optional): Ollama generate endpoint(s) for the workers. Defaults to
+                                             config.OLLAMA_ENDPOINTS, or config.OLLAMA_API_URL when that is empty.
+            trace_format (str, optional): Export a build trace per document ('jsonl' or 'chrome').
+                                          Defaults to config.BUILD_TRACE_FORMAT.
+            keep_alive (optional): How long Ollama keeps the model loaded between requests.
+                                   Defaults to config.OLLAMA_BATCH_KEEP_ALIVE.
+        """
+        invalid = [d for d in doc_types if d not in (config.DOC_SYNOPSIS, config.DOC_REPORT)]
+        if invalid: raise ValueError(f"Unknown document type(s): {', '.join(invalid)}")
+        self.doc_types = list(doc_types)
+        self.max_processes = max_processes or config.BATCH_MAX_PROCESSES
+        self.llm_concurrency = llm_concurrency or config.BATCH_LLM_CONCURRENCY
+        self.output_dir = Path(output_dir or config.OUTPUT_DIR)
+        self.use_cache = use_cache and config.LLM_CACHE_ENABLED
+        self.incremental = incremental and config.INCREMENTAL_BUILDS
+        self.api_url = api_url
+        self.trace_format = trace_format
+        self.keep_alive = config.OLLAMA_BATCH_KEEP_ALIVE if keep_alive is None else keep_alive
+
+    def _warm_up(self, api_url: str):
+        """Loads the model once for the whole batch on one Ollama host, while the workers initialize."""
+        import requests
+        from .endpoint_pool import base_url_of
+        from .ollama_client import warm_up_model
+        try:
+            seconds = warm_up_model(api_url, config.DEFAULT_OLLAMA_MODEL, self.keep_alive)
+            print(f"    Model '{config.DEFAULT_OLLAMA_MODEL}' loaded on {base_url_of(api_url)} ({seconds:.1f}s, keep-alive {self.keep_alive}).")
+        except requests.exceptions.RequestException as e:
+            print(f"    Warning: Model warm-up failed on {base_url_of(api_url)}: {e}")
+
+    def run(self, project_files: list, summary_path: str = None) -> dict:
+        """
+        Builds all files and writes the summary JSON.
+
+        Args:
+            project_files (list): Paths of project YAML files.
+            summary_path (str, optional): Summary location. Defaults to
+                                          <output_dir>/batch_summary_<timestamp>.json.
+
+        Returns:
+            dict: The summary that was written.
+        """
+        started_at = datetime.now()
+        log_dir = self.output_dir / "batch_logs"
+        log_dir.mkdir(parents=True, exist_ok=True)
+        summary_path = Path(summary_path) if summary_path else self.output_dir / f"batch_summary_{started_at:%Y%m%d_%H%M%S}.json"
+        print(f"    Batch: {len(project_files)} files x {self.doc_types} with {self.max_processes} processes, "
+              f"{self.llm_concurrency} shared LLM slots.")
+
+        results = []
+        start = time.perf_counter()
+        with multiprocessing.Manager() as manager:
+            request_slots = manager.BoundedSemaphore(self.llm_concurrency)
+            with ProcessPoolExecutor(max_workers=self.max_processes, initializer=_init_worker,
+                                     initargs=(request_slots, self.use_cache, self.incremental, str(self.output_dir), str(log_dir),
+                                               self.api_url, self.trace_format, self.keep_alive)) as executor:
+                futures = {executor.submit(_build_project_file, str(f), self.doc_types): f for f in project_files}
+                if config.OLLAMA_WARMUP:
+                    # Started only once the workers have been forked (on the first submit), so no
+                    # worker inherits a connection lock held mid-request; overlaps with worker setup
+                    api_urls = self.api_url or config.OLLAMA_ENDPOINTS or config.OLLAMA_API_URL
+                    for api_url in [api_urls] if isinstance(api_urls, str) else api_urls:
+                        threading.Thread(target=self._warm_up, args=(api_url,), name="ollama-warm-up", daemon=True).start()
+                for future in as_completed(futures):
+                    project_file = futures[future]
+                    try:
+                        file_results = future.result()
+                    except Exception as e: # Worker crashed (e.g. killed); record and continue
+                        file_results = [{"file": str(project_file), "doc_type": doc_type, "status": "failed", "seconds": None,
+                                         "output": None, "error": f"Worker failure: {e}", "log": None} for doc_type in self.doc_types]
+                    for result in file_results:
+                        marker = "OK  " if result["status"] == "succeeded" else "FAIL"
+                        print(f"      [{marker}] {result['doc_type']:<8} {Path(result['file']).name} ({result['seconds']}s)"
+                              + (f" - {result['error']}" if result["error"] else ""))
+                    results.extend(file_results)
+
+        results.sort(key=lambda r: (r["file"], r["doc_type"]))
+        succeeded = sum(1 for r in results if r["status"] == "succeeded")
+        summary = {
+            "started_at": started_at.isoformat(timespec='seconds'),
+            "finished_at": datetime.now().isoformat(timespec='seconds'),
+            "wall_time_s": round(time.perf_counter() - start, 3),
+            "doc_types": self.doc_types,
+            "files": len(project_files),
+            "builds": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results,
+        }
+        summary_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"    Batch finished: {succeeded}/{len(results)} builds succeeded in {summary['wall_time_s']}s. Summary: {summary_path}")
+        return summary
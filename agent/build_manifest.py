@@ -0,0 +1,74 @@
+# agent/build_manifest.py
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+
+class BuildManifest:
+    """
+    Records, per generated section, the input fields its prompt consumed, a
+    fingerprint of the full request, and the generated text.
+
+    The manifest is saved next to the output document (e.g. Report_<roll>.manifest.json).
+    On the next build, a section whose fingerprint is unchanged reuses the stored
+    text instead of calling the LLM; changed_fields() explains why a section is stale.
+    """
+    VERSION = 1
+
+    def __init__(self, path, doc_type: str = None):
+        self.path = Path(path)
+        self.doc_type = doc_type
+        self.sections = {}
+
+    @classmethod
+    def for_output(cls, output_dir, doc_type: str, roll_number: str) -> "BuildManifest":
+        """Loads (or starts) the manifest belonging to a document's output file."""
+        path = Path(output_dir) / f"{doc_type.capitalize()}_{roll_number}.manifest.json"
+        return cls.load(path, doc_type)
+
+    @classmethod
+    def load(cls, path, doc_type: str = None) -> "BuildManifest":
+        manifest = cls(path, doc_type)
+        if manifest.path.is_file():
+            try:
+                with open(manifest.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == cls.VERSION:
+                    manifest.sections = data.get('sections', {})
+            except (OSError, ValueError) as e:
+                print(f"    Warning: Ignoring unreadable build manifest {manifest.path}: {e}")
+        return manifest
+
+    @staticmethod
+    def _value_hash(value) -> str:
+        return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()[:16]
+
+    def lookup(self, section_name: str, fingerprint: str):
+        """Returns the stored text if the section was built with the same fingerprint, else None."""
+        entry = self.sections.get(section_name)
+        if entry and entry.get('fingerprint') == fingerprint and entry.get('text'):
+            return entry['text']
+        return None
+
+    def changed_fields(self, section_name: str, dependencies: dict) -> list:
+        """Lists the dependency fields whose values differ from the recorded build."""
+        entry = self.sections.get(section_name)
+        if not entry: return sorted(dependencies)
+        recorded = entry.get('dependencies', {})
+        current = {key: self._value_hash(value) for key, value in dependencies.items()}
+        return sorted(key for key in set(recorded) | set(current) if recorded.get(key) != current.get(key))
+
+    def record(self, section_name: str, fingerprint: str, dependencies: dict, text: str):
+        self.sections[section_name] = {
+            "fingerprint": fingerprint,
+            "dependencies": {key: self._value_hash(value) for key, value in dependencies.items()},
+            "text": text,
+            "updated_at": datetime.now().isoformat(timespec='seconds'),
+        }
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": self.VERSION, "doc_type": self.doc_type, "sections": self.sections}, f, indent=2)
+        tmp_path.replace(self.path)
@@ -0,0 +1,188 @@
+# agent/build_trace.py
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Timing fields of Ollama's final /api/generate response (durations in nanoseconds)
+SERVER_TIMING_FIELDS = ("total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration",
+                        "eval_count", "eval_duration")
+
+# (BuildTrace, section name) of the generation running in the current thread / asyncio task
+_current_call = contextvars.ContextVar("llm_call_context", default=(None, None))
+
+def extract_server_timings(response_data: dict) -> dict:
+    """Picks Ollama's timing fields out of a (final) generate response."""
+    return {field: response_data[field] for field in SERVER_TIMING_FIELDS if response_data.get(field) is not None}
+
+@contextlib.contextmanager
+def trace_section(trace, section_name: str):
+    """
+    Attributes LLM calls made inside the block (in this thread or asyncio task) to
+    `section_name` in `trace`. A None trace disables recording.
+    """
+    token = _current_call.set((trace, section_name))
+    try:
+        yield
+    finally:
+        _current_call.reset(token)
+
+def record_llm_call(**fields):
+    """Adds an LLM call to the trace active in the current context, if any (see BuildTrace.add_llm_call)."""
+    trace, section_name = _current_call.get()
+    if trace is not None: trace.add_llm_call(section=section_name, **fields)
+
+class BuildTrace:
+    """
+    Per-build record of LLM calls and build phases.
+
+    Each LLM call records the section it generated, client-side latency, retries,
+    whether it came from the cache or a stream, and Ollama's server-side timings
+    (model load, prompt evaluation, decoding), so model-load stalls, slow prompt
+    evaluation and slow decoding can be told apart. Clients record into the trace
+    that trace_section() made current, so concurrent builds keep separate traces.
+
+    Export with write_jsonl() (one event per line) or write_chrome_trace()
+    (chrome://tracing / Perfetto).
+    """
+    def __init__(self, name: str, doc_type: str = None):
+        """
+        Args:
+            name (str): Build label (e.g. the output file stem).
+            doc_type (str, optional): Document type(s) being built.
+        """
+        self.name = name
+        self.doc_type = doc_type
+        self.started_at = datetime.now()
+        self._origin = time.perf_counter()
+        self.events = []
+        self._lock = threading.Lock()
+
+    def _offset(self, perf_time: float) -> float:
+        return round(perf_time - self._origin, 6)
+
+    def add_llm_call(self, section: str, model: str, start: float, end: float, retries: int = 0, cached: bool = False,
+                     streamed: bool = False, ok: bool = True, server: dict = None, error: str = None):
+        """
+        Records one generation.
+
+        Args:
+            section (str): Section the call generated (None if made outside trace_section()).
+            model (str): Model name.
+            start (float), end (float): time.perf_counter() at request start and end.
+            retries (int): Retries performed by the transport for this call.
+            cached (bool): Answered from the response cache (no request made).
+            streamed (bool): Streamed response.
+            ok (bool): Whether text was obtained.
+            server (dict, optional): Ollama timing fields (see extract_server_timings).
+            error (str, optional): Error description for failed calls.
+        """
+        event = {"type": "llm_call", "section": section, "model": model, "start_s": self._offset(start),
+                 "latency_s": round(end - start, 6), "retries": retries, "cached": cached, "streamed": streamed, "ok": ok}
+        event.update(server or {})
+        if error: event["error"] = error
+        with self._lock: self.events.append(event)
+
+    def add_phase(self, phase: str, start: float, end: float, doc_type: str = None):
+        """Records a build phase (time.perf_counter() start/end)."""
+        event = {"type": "phase", "phase": phase, "doc_type": doc_type or self.doc_type,
+                 "start_s": self._offset(start), "latency_s": round(end - start, 6)}
+        with self._lock: self.events.append(event)
+
+    def llm_calls(self) -> list:
+        with self._lock: return [e for e in self.events if e["type"] == "llm_call"]
+
+    def summary(self) -> dict:
+        """Totals over all LLM calls: counts, retries, client latency and server-side seconds/tokens."""
+        calls = self.llm_calls()
+        ns_total = lambda field: round(sum(c.get(field, 0) for c in calls) / 1e9, 3)
+        eval_count = sum(c.get("eval_count", 0) for c in calls)
+        eval_seconds = ns_total("eval_duration")
+        return {
+            "llm_calls": len(calls),
+            "cached": sum(1 for c in calls if c["cached"]),
+            "failed": sum(1 for c in calls if not c["ok"]),
+            "retries": sum(c["retries"] or 0 for c in calls),
+            "client_latency_s": round(sum(c["latency_s"] for c in calls), 3),
+            "load_s": ns_total("load_duration"),
+            "prompt_eval_s": ns_total("prompt_eval_duration"),
+            "prompt_eval_count": sum(c.get("prompt_eval_count", 0) for c in calls),
+            "eval_s": eval_seconds,
+            "eval_count": eval_count,
+            "eval_tokens_per_s": round(eval_count / eval_seconds, 1) if eval_seconds else None,
+        }
+
+    def print_summary(self):
+        s = self.summary()
+        if not s["llm_calls"]: return
+        print(f"    LLM trace: {s['llm_calls']} calls ({s['cached']} cached, {s['failed']} failed, {s['retries']} retries), "
+              f"client {s['client_latency_s']}s; server: load {s['load_s']}s, prompt eval {s['prompt_eval_s']}s "
+              f"({s['prompt_eval_count']} tok), eval {s['eval_s']}s ({s['eval_count']} tok"
+              + (f", {s['eval_tokens_per_s']} tok/s)" if s['eval_tokens_per_s'] else ")"))
+
+    def write_jsonl(self, path) -> Path:
+        """Writes a header line (build info and summary) followed by one line per event."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock: events = sorted(self.events, key=lambda e: e["start_s"])
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"type": "build", "name": self.name, "doc_type": self.doc_type,
+                                "started_at": self.started_at.isoformat(timespec='milliseconds'),
+                                "summary": self.summary()}) + "\n")
+            for event in events:
+                wall = self.started_at + timedelta(seconds=event["start_s"])
+                f.write(json.dumps({**event, "started_at": wall.isoformat(timespec='milliseconds')}) + "\n")
+        return path
+
+    def write_chrome_trace(self, path) -> Path:
+        """
+        Writes the Chrome trace event format. Phases go on one track; concurrent LLM calls
+        are spread over as many tracks as needed, each with its server-side load /
+        prompt eval / eval breakdown nested underneath (placed at the end of the call).
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pid = os.getpid()
+        us = lambda seconds: round(seconds * 1e6, 1)
+        trace_events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"build {self.name}"}},
+                        {"name": "thread_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "phases"}}]
+        with self._lock: events = sorted(self.events, key=lambda e: e["start_s"])
+        lane_free_at = [] # End time of the last call on each LLM track
+        for event in events:
+            if event["type"] == "phase":
+                trace_events.append({"name": event["phase"], "cat": "phase", "ph": "X", "pid": pid, "tid": 0,
+                                     "ts": us(event["start_s"]), "dur": us(event["latency_s"]), "args": {"doc_type": event["doc_type"]}})
+                continue
+            start, end = event["start_s"], event["start_s"] + event["latency_s"]
+            lane = next((i for i, free_at in enumerate(lane_free_at) if free_at <= start), len(lane_free_at))
+            if lane == len(lane_free_at):
+                lane_free_at.append(end)
+                trace_events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": lane + 1, "args": {"name": f"llm {lane + 1}"}})
+            lane_free_at[lane] = end
+            args = {k: v for k, v in event.items() if k not in ("type", "start_s")}
+            trace_events.append({"name": event["section"] or "llm call", "cat": "llm", "ph": "X", "pid": pid, "tid": lane + 1,
+                                 "ts": us(start), "dur": us(event["latency_s"]), "args": args})
+            # Server-side breakdown: load, then prompt evaluation, then decoding, ending with the call
+            server_total = event.get("total_duration", 0) / 1e9
+            cursor = max(end - server_total, start) if server_total else None
+            for field, label in (("load_duration", "load"), ("prompt_eval_duration", "prompt eval"), ("eval_duration", "eval")):
+                seconds = event.get(field, 0) / 1e9
+                if cursor is None or not seconds: continue
+                trace_events.append({"name": label, "cat": "server", "ph": "X", "pid": pid, "tid": lane + 1,
+                                     "ts": us(cursor), "dur": us(seconds)})
+                cursor += seconds
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms",
+                       "otherData": {"name": self.name, "started_at": self.started_at.isoformat(timespec='milliseconds'),
+                                     "summary": self.summary()}}, f)
+        return path
+
+    def export(self, path_stem, trace_format: str) -> Path:
+        """Writes <path_stem>.trace.jsonl ('jsonl') or <path_stem>.trace.json ('chrome')."""
+        if trace_format == 'jsonl': return self.write_jsonl(f"{path_stem}.trace.jsonl")
+        if trace_format == 'chrome': return self.write_chrome_trace(f"{path_stem}.trace.json")
+        raise ValueError(f"Unknown trace format '{trace_format}' (expected 'jsonl' or 'chrome')")
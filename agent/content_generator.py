@@ -1,82 +1,471 @@
 # agent/content_generator.py
-from .ollama_client import OllamaClient
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from .ollama_client import GenerationBudgetExceeded, OllamaClient, PartialResponse, PromptSession
 from .guideline_manager import GuidelineManager
 import config
 
+class _FieldRecorder(dict):
+    """Copy of project_data that records which keys a prompt builder reads."""
+    def __init__(self, data: dict):
+        super().__init__(data)
+        self.accessed = set()
+
+    def get(self, key, default=None):
+        self.accessed.add(key)
+        return super().get(key, default)
+
+    def __getitem__(self, key):
+        self.accessed.add(key)
+        return super().__getitem__(key)
+
 class ContentGenerator:
     """
     Uses an OllamaClient to generate text content for different sections
     of a project report or synopsis based on project data.
     """
+    # Text used in place of a section whose generation failed
+    PLACEHOLDER_TEMPLATE = "[Content for '{section_name}' could not be generated.]"
+    # Target lengths when a report section is condensed into its synopsis variant
+    CONDENSED_LENGTH_HINTS = {
+        "Introduction": "1-2 paragraphs",
+        "Background and Literature Review": "2-3 paragraphs",
+    }
+    # Relative length of the body sections for token budgets: section -> {doc_type: weight}, in
+    # paragraphs (the upper end of each prompt's "Length:" hint, or an estimate where it has none).
+    # A body section's budget is its weighted share of the body page target (see section_word_budget).
+    SECTION_BUDGET_WEIGHTS = {
+        "Introduction": {config.DOC_REPORT: 4, config.DOC_SYNOPSIS: 2},
+        "Background and Literature Review": {config.DOC_REPORT: 6, config.DOC_SYNOPSIS: 3},
+        "Problem Statement and Objectives": {config.DOC_SYNOPSIS: 2},
+        "Methodology and Tools Used": {config.DOC_SYNOPSIS: 3},
+        "System Design and Methodology": {config.DOC_REPORT: 6},
+        "Implementation and Results": {config.DOC_REPORT: 6},
+        "Expected Results and Contribution": {config.DOC_SYNOPSIS: 2},
+        "Conclusion and Future Scope": {config.DOC_REPORT: 3, config.DOC_SYNOPSIS: 3},
+    }
+    DEFAULT_BUDGET_WEIGHT = 3 # Weight of body sections missing from SECTION_BUDGET_WEIGHTS
+    MAX_PROJECT_SESSIONS = 8 # Primed project prefixes kept (one per project, document type and model)
+    DEFAULT_SECTION_CLASS = 'chapter' # Model routing class of sections not in config.SECTION_MODEL_CLASSES
+    JSON_KEY_TOKENS = 16 # Extra num_predict per section of a JSON-mode response (key, quotes, escapes)
+    TRUNCATION_THRESHOLD = 0.8 # Responses estimated at this share of num_predict or more may have been cut off
+    _SENTENCE_END = re.compile(r'[.!?]["\')\]]*(?=\s|$)')
     DEFAULT_SYSTEM_MESSAGE = "You are a helpful academic assistant drafting sections for a student project report. Write clearly, concisely, and professionally in the third person, focusing on the provided details. Avoid making up results or specific technical details not provided, but elaborate reasonably on the given concepts. IMPORTANT: Generate ONLY the body text for the requested section. Do NOT include the section title itself or any markdown formatting (like ## or **)."
 
-    def __init__(self, ollama_client: OllamaClient, guideline_manager: GuidelineManager):
+    def __init__(self, ollama_client: OllamaClient, guideline_manager: GuidelineManager, use_streaming: bool = None,
+                 async_client=None, use_project_session: bool = None, model_routes: dict = None, token_budgets: bool = None):
         self.ollama_client = ollama_client
+        self.async_client = async_client # Optional AsyncOllamaClient for generate_section_async
         self.guideline_mgr = guideline_manager
+        # Streaming avoids wall-clock timeouts on long sections and keeps partial output
+        self.use_streaming = config.OLLAMA_USE_STREAMING if use_streaming is None else use_streaming
+        # Project session: the shared project context is evaluated once, not once per section
+        self.use_project_session = config.OLLAMA_PROJECT_SESSION if use_project_session is None else use_project_session
+        self._sessions = {} # (model, base context) -> PromptSession, least recently used first
+        self._sessions_lock = threading.Lock()
+        # Section class -> route (model, options, latency budget, fallback model); see config.SECTION_MODEL_ROUTES
+        self.model_routes = config.SECTION_MODEL_ROUTES if model_routes is None else model_routes
+        self._fallback_until = {} # Section class -> time.monotonic() until which its fallback model is used
+        # Guideline-derived num_predict caps and stop sequences; see config.GENERATION_TOKEN_BUDGETS
+        self.token_budgets = config.GENERATION_TOKEN_BUDGETS if token_budgets is None else token_budgets
         print("    ContentGenerator initialized.")
+        for section_class in self.model_routes:
+            route = self._route(section_class)
+            budget = f" (budget {route['budget_seconds']}s, fallback {route['fallback_model']})" if route['budget_seconds'] else ""
+            print(f"      Model route: {section_class} -> {route['model']}{budget}")
 
-    def _build_prompt(self, section_name: str, doc_type: str, project_data: dict) -> str:
+    def _base_context(self, doc_type: str, project_data: dict) -> str:
         title = project_data.get('project_title', '[Project Title]')
         summary = project_data.get('project_summary', 'No summary provided.')
-        objectives = project_data.get('objectives', [])
-        methodology = project_data.get('methodology_tools', 'No methodology specified.')
-        results = project_data.get('results_summary', 'No results summary provided.')
-        conclusions = project_data.get('conclusions_future_scope', [])
-        intro_hints = project_data.get('introduction_points', [])
-        lit_review_hints = project_data.get('literature_review_ideas', [])
-
-        base_context = (f"Project Title: {title}\nProject Summary: {summary}\nDocument Type: {doc_type.capitalize()}\n")
+        return f"Project Title: {title}\nProject Summary: {summary}\nDocument Type: {doc_type.capitalize()}\n"
+
+    def _build_prompt(self, section_name: str, doc_type: str, project_data: dict) -> str:
+        base_context = self._base_context(doc_type, project_data)
+        heading, guidance = self._section_guidance(section_name, doc_type, project_data)
         prompt = f"{base_context}\n"
         # Reiterate core instruction
-        prompt += f"Instructions: Write ONLY the body content for the '{section_name}' section. Do NOT include the section title itself or any markdown/formatting. Focus on the details below.\n\n"
+        prompt += f"Instructions: Write ONLY the body content for the '{heading}' section. Do NOT include the section title itself or any markdown/formatting. Focus on the details below.\n\n"
+        prompt += guidance
+        prompt += f"\nEnsure output is suitable body text for a '{doc_type.capitalize()}'."
+        return prompt
 
+    def _section_guidance(self, section_name: str, doc_type: str, project_data: dict) -> tuple:
+        """
+        Returns (heading, guidance): the section heading the prompt names and the
+        section-specific content focus, inputs and length for it.
+        """
+        # Fields are read only in the branches that use them, so get_section_dependencies()
+        # can record exactly which inputs each section's prompt consumed.
+        get = project_data.get
+        heading = section_name
+        prompt = ""
         # Section-specific guidance
         if section_name == "Introduction":
             prompt += "Content Focus:\n- Briefly introduce domain/relevance.\n- State core problem/motivation.\n- Mention main objectives (use list below).\n- Outline report/synopsis structure.\n"
+            intro_hints = get('introduction_points', []); objectives = get('objectives', [])
             if intro_hints: prompt += "Specific points to consider:\n" + "\n".join([f"- {p}" for p in intro_hints]) + "\n"
             if objectives: prompt += "Project Objectives reference:\n" + "\n".join([f"- {o}" for o in objectives]) + "\n"
             prompt += "Length: 2-4 paragraphs (Report), 1-2 paragraphs (Synopsis)."
         elif section_name == "Abstract":
-            prompt += "Content Focus (under 250 words, single paragraph):\n- Purpose and scope.\n- Key methodology.\n- Main results/outcomes.\n- Primary conclusions.\n(Do NOT include references).\n"
+            word_limit = self.guideline_mgr.get_word_limit(doc_type, section_name)
+            prompt += f"Content Focus ({f'under {word_limit} words, ' if word_limit else ''}single paragraph):\n- Purpose and scope.\n- Key methodology.\n- Main results/outcomes.\n- Primary conclusions.\n(Do NOT include references).\n"
+            objectives = get('objectives', []); methodology = get('methodology_tools', 'No methodology specified.')
+            results = get('results_summary', 'No results summary provided.'); conclusions = get('conclusions_future_scope', [])
             prompt += f"Base on: Objectives: {objectives}\nMethodology: {methodology}\nResults: {results}\nConclusions: {conclusions}"
         elif section_name == "Acknowledgement":
-            supervisor = project_data.get('supervisor_name', '[Supervisor Name]'); college = project_data.get('college', '[College Name]'); dept = project_data.get('department', '[Department Name]')
+            supervisor = get('supervisor_name', '[Supervisor Name]'); college = get('college', '[College Name]'); dept = get('department', '[Department Name]')
             prompt += f"Content Focus:\n- Thank supervisor: {supervisor}.\n- Mention {dept} and {college}.\n- Optional general thanks (faculty, friends etc.).\nLength: 1-2 paragraphs."
         elif section_name == "Background and Literature Review":
             prompt += "Content Focus:\n- Background concepts.\n- Related work (techniques, tools, studies).\n- Gaps/limitations addressed by this project.\n"
+            lit_review_hints = get('literature_review_ideas', [])
             if lit_review_hints: prompt += "Incorporate topics/keywords:\n" + "\n".join([f"- {h}" for h in lit_review_hints]) + "\n"
             prompt += "Length: Several paragraphs (Report), 2-3 paragraphs (Synopsis).\nIMPORTANT: Describe concepts generally, do NOT invent specific citations like '[1]'."
         elif section_name == "Problem Statement and Objectives": # Synopsis focus
              prompt += "Content Focus:\n- Define the problem addressed.\n- List specific objectives (use list below or formulate plausible ones).\n"
+             objectives = get('objectives', [])
              if objectives: prompt += "Objectives:\n" + "\n".join([f"- {o}" for o in objectives]) + "\n"
              else: prompt += "(No objectives provided; formulate based on title/summary).\n"
              prompt += "Length: 1 paragraph problem statement, bulleted objectives."
         elif section_name == "Methodology and Tools Used" or section_name == "System Design and Methodology":
+             methodology = get('methodology_tools', 'No methodology specified.')
              prompt += f"Content Focus:\n- Describe methodology, design, algorithms, frameworks, tools used/proposed based on: '{methodology}'.\n- Explain relevance to objectives.\n- Detail design/architecture/workflow (Report) or provide high-level overview (Synopsis)."
         elif section_name == "Implementation and Results" or section_name == "Expected Results and Contribution":
-             is_report = doc_type == config.DOC_REPORT; section_title = "Implementation and Results" if is_report else "Expected Results and Contribution"
-             prompt = prompt.replace(f"'{section_name}'", f"'{section_title}'") # Adjust title in intro line if needed
+             is_report = doc_type == config.DOC_REPORT; heading = "Implementation and Results" if is_report else "Expected Results and Contribution"
+             results = get('results_summary', 'No results summary provided.')
              if is_report:
                  prompt += f"Content Focus:\n- Implementation details.\n- Key results/findings/metrics based on: '{results}'.\n- Analysis/interpretation of results.\n- Mention figures/tables if relevant (e.g., 'Table X.Y summarizes...')."
              else: # Synopsis
                  prompt += f"Content Focus:\n- Expected outcomes.\n- How outcomes address the problem.\n- Potential significance/contribution.\nBase on expected results: '{results}'.\nLength: 1-2 paragraphs."
         elif section_name == "Conclusion and Future Scope":
              prompt += f"Content Focus:\n- Summarize project achievements vs objectives.\n- Discuss limitations.\n- Suggest future research/enhancements.\n"
+             conclusions = get('conclusions_future_scope', [])
              if conclusions: prompt += "Use provided points:\n" + "\n".join([f"- {c}" for c in conclusions]) + "\n"
              prompt += "Length: 1-2 paragraphs conclusion, 1 paragraph future scope."
         else: prompt += f"Write a general section about '{section_name}' based on project title/summary. Keep concise."
-        prompt += f"\nEnsure output is suitable body text for a '{doc_type.capitalize()}'."
-        return prompt
+        return heading, prompt
+
+    def _session_request(self, prompt: str, doc_type: str, project_data: dict, model_name: str = None) -> tuple:
+        """
+        Splits a prompt into what is sent for it: (prompt, PromptSession) in project session
+        mode, where the prompt is the part after the shared project context, else (prompt, None).
+        Sessions are kept per model, since a primed context only fits the model that made it.
+        """
+        if not self.use_project_session: return prompt, None
+        prefix = self._base_context(doc_type, project_data)
+        if not prompt.startswith(prefix + "\n"): return prompt, None
+        key = (model_name or self.ollama_client.model_name, prefix)
+        with self._sessions_lock:
+            session = self._sessions.pop(key, None) or PromptSession(prefix, self.DEFAULT_SYSTEM_MESSAGE)
+            self._sessions[key] = session
+            while len(self._sessions) > self.MAX_PROJECT_SESSIONS: self._sessions.pop(next(iter(self._sessions)))
+        return prompt[len(prefix) + 1:], session
+
+    def section_class(self, section_name: str) -> str:
+        """Model routing class of a section (see config.SECTION_MODEL_CLASSES)."""
+        return config.SECTION_MODEL_CLASSES.get(section_name, self.DEFAULT_SECTION_CLASS)
+
+    def _route(self, section_class: str) -> dict:
+        """
+        Resolves the route for a section class: 'model' (the client's model if unset),
+        'options' (None if unset), 'budget_seconds' (None unless a fallback model is set)
+        and 'fallback_model'.
+        """
+        route = self.model_routes.get(section_class) or {}
+        fallback_model = route.get('fallback_model')
+        return {"model": route.get('model') or self.ollama_client.model_name, "options": route.get('options') or None,
+                "budget_seconds": route.get('budget_seconds') if fallback_model else None, "fallback_model": fallback_model}
+
+    def _routed_model(self, section_class: str) -> tuple:
+        """(route, model, budget) for the next request of a class: the fallback model while the class is demoted."""
+        route = self._route(section_class)
+        if route["budget_seconds"] is not None and time.monotonic() < self._fallback_until.get(section_class, 0):
+            return route, route["fallback_model"], None
+        return route, route["model"], route["budget_seconds"]
+
+    def _demote(self, section_class: str, route: dict, reason: str):
+        """Switches a class to its fallback model for config.SECTION_MODEL_FALLBACK_SECONDS."""
+        self._fallback_until[section_class] = time.monotonic() + config.SECTION_MODEL_FALLBACK_SECONDS
+        print(f"      Warning: Model '{route['model']}' {reason}; generating with '{route['fallback_model']}' instead "
+              f"({section_class} sections use it for the next {config.SECTION_MODEL_FALLBACK_SECONDS}s).")
+
+    def section_word_budget(self, section_name: str, doc_type: str) -> int:
+        """
+        Words budgeted for a section: its explicit guideline word limit (e.g. the Abstract's),
+        else, for body sections, its weighted share (SECTION_BUDGET_WEIGHTS) of the body page
+        target, a point in the guideline page range (see config.GENERATION_BODY_PAGE_TARGET),
+        else one page. The body budgets never add up to less than page_limit_min.
+        """
+        word_limit = self.guideline_mgr.get_word_limit(doc_type, section_name)
+        if word_limit: return word_limit
+        words_per_page = self.guideline_mgr.get_words_per_page(doc_type) * config.GENERATION_PAGE_FILL
+        body_sections = self.guideline_mgr.get_body_sections(doc_type)
+        body_pages = self._body_page_target(doc_type)
+        if section_name not in body_sections or not body_pages: return int(words_per_page)
+        weights = [self._budget_weight(s, doc_type) for s in body_sections]
+        return math.ceil(body_pages * words_per_page * self._budget_weight(section_name, doc_type) / sum(weights))
+
+    def _budget_weight(self, section_name: str, doc_type: str) -> float:
+        return self.SECTION_BUDGET_WEIGHTS.get(section_name, {}).get(doc_type, self.DEFAULT_BUDGET_WEIGHT)
+
+    def _body_page_target(self, doc_type: str):
+        """Body pages the budgets add up to: config.GENERATION_BODY_PAGE_TARGET of the way from page_limit_min to page_limit_max."""
+        min_pages, max_pages = self.guideline_mgr.get_page_limits(doc_type)
+        if not max_pages: return min_pages
+        min_pages = min_pages or 0
+        return min_pages + (max_pages - min_pages) * config.GENERATION_BODY_PAGE_TARGET
+
+    def _budget_options(self, section_names: list, doc_type: str, format_json: bool = False) -> dict:
+        """Ollama options enforcing the sections' word budgets: num_predict and (except in JSON mode) stop sequences."""
+        if not self.token_budgets: return {}
+        words = sum(self.section_word_budget(section_name, doc_type) for section_name in section_names)
+        options = {"num_predict": math.ceil(words * config.GENERATION_TOKENS_PER_WORD)}
+        if format_json: options["num_predict"] += self.JSON_KEY_TOKENS * len(section_names)
+        elif config.GENERATION_STOP_SEQUENCES: options["stop"] = list(config.GENERATION_STOP_SEQUENCES)
+        return options
+
+    @staticmethod
+    def _request_options(route: dict, budget_options: dict) -> dict:
+        """Options sent with a routed request: the budget options, overridden by the route's own. None if empty."""
+        return {**(budget_options or {}), **(route["options"] or {})} or None
+
+    def _trim_truncated(self, generated_text: str, options: dict) -> str:
+        """
+        Cuts a response that ran into its num_predict cap back to its last complete sentence.
+        A response counts as cut off when it ends mid-sentence and its estimated token count
+        reaches TRUNCATION_THRESHOLD of the cap.
+        """
+        num_predict = (options or {}).get("num_predict")
+        if not generated_text or not num_predict: return generated_text
+        if len(generated_text.split()) * config.GENERATION_TOKENS_PER_WORD < self.TRUNCATION_THRESHOLD * num_predict:
+            return generated_text
+        sentence_ends = list(self._SENTENCE_END.finditer(generated_text))
+        if not sentence_ends or sentence_ends[-1].end() == len(generated_text): return generated_text # Ends with a full sentence
+        trimmed = generated_text[:sentence_ends[-1].end()]
+        print(f"      Response reached its {num_predict}-token budget; trimmed {len(generated_text) - len(trimmed)} chars "
+              f"back to the last full sentence.")
+        return trimmed
+
+    def _routed_request(self, prompt: str, doc_type: str, project_data: dict, model: str, options: dict, format_json: bool,
+                        budget_seconds: float = None) -> dict:
+        """Keyword arguments of one generate call of a routed request, for either client."""
+        sent_prompt, session = self._session_request(prompt, doc_type, project_data, model)
+        return {"prompt": sent_prompt, "system_message": self.DEFAULT_SYSTEM_MESSAGE, "format_json": format_json,
+                "options": options, "stream": self.use_streaming, "session": session, "model_name": model,
+                "budget_seconds": budget_seconds}
+
+    def _routed_result(self, generated_text: str, options: dict, format_json: bool) -> str:
+        if format_json: return generated_text
+        trimmed = self._trim_truncated(generated_text, options)
+        # Trimming returns a plain str; keep the mark of a broken-off response for the build manifest
+        return PartialResponse(trimmed) if isinstance(generated_text, PartialResponse) else trimmed
+
+    def _generate_routed(self, section_class: str, prompt: str, doc_type: str, project_data: dict, format_json: bool = False,
+                         budget_options: dict = None) -> str:
+        """
+        Generates `prompt` with the model routed for `section_class`. If the preferred model
+        exceeds the class's latency budget or returns nothing, the request is repeated with
+        the fallback model (see _demote). `budget_options` (see _budget_options) cap the
+        response length; a capped response is trimmed to its last full sentence.
+        """
+        route, model, budget = self._routed_model(section_class)
+        options = self._request_options(route, budget_options)
+        try:
+            generated_text = self.ollama_client.generate(**self._routed_request(prompt, doc_type, project_data, model, options,
+                                                                                format_json, budget))
+            if generated_text or budget is None: return self._routed_result(generated_text, options, format_json)
+            reason = "returned no text"
+        except GenerationBudgetExceeded:
+            reason = f"exceeded its {budget}s latency budget"
+        self._demote(section_class, route, reason)
+        generated_text = self.ollama_client.generate(**self._routed_request(prompt, doc_type, project_data, route["fallback_model"],
+                                                                            options, format_json))
+        return self._routed_result(generated_text, options, format_json)
+
+    async def _generate_routed_async(self, section_class: str, prompt: str, doc_type: str, project_data: dict,
+                                     format_json: bool = False, budget_options: dict = None) -> str:
+        """Async variant of _generate_routed using the AsyncOllamaClient passed at construction."""
+        route, model, budget = self._routed_model(section_class)
+        options = self._request_options(route, budget_options)
+        try:
+            generated_text = await self.async_client.generate(**self._routed_request(prompt, doc_type, project_data, model, options,
+                                                                                     format_json, budget))
+            if generated_text or budget is None: return self._routed_result(generated_text, options, format_json)
+            reason = "returned no text"
+        except GenerationBudgetExceeded:
+            reason = f"exceeded its {budget}s latency budget"
+        self._demote(section_class, route, reason)
+        generated_text = await self.async_client.generate(**self._routed_request(prompt, doc_type, project_data,
+                                                                                 route["fallback_model"], options, format_json))
+        return self._routed_result(generated_text, options, format_json)
+
+    def report_generation_budgets(self, doc_type: str, section_names: list):
+        """
+        Prints the word and token budget of each section to be generated for a document,
+        and the body total against the guideline page limits.
+        """
+        if not self.token_budgets: return
+        min_pages, max_pages = self.guideline_mgr.get_page_limits(doc_type)
+        words_per_page = self.guideline_mgr.get_words_per_page(doc_type) * config.GENERATION_PAGE_FILL
+        body_sections = self.guideline_mgr.get_body_sections(doc_type)
+        print(f"    Generation budgets ({doc_type}, ~{int(words_per_page)} words per page):")
+        body_words = 0
+        for section_name in section_names:
+            words = self.section_word_budget(section_name, doc_type)
+            if section_name in body_sections: body_words += words
+            num_predict = self._budget_options([section_name], doc_type)["num_predict"]
+            print(f"      {section_name}: <= {words} words (num_predict {num_predict})")
+        if body_words:
+            limits = f"{min_pages}-{max_pages}" if min_pages else f"<= {max_pages}"
+            print(f"      Body: <= {body_words} words, ~{body_words / words_per_page:.1f} pages (guideline: {limits} pages)")
+
+    def get_section_dependencies(self, section_name: str, doc_type: str, project_data: dict) -> dict:
+        """Returns {field: value} for the project_data fields the section's prompt reads."""
+        recorder = _FieldRecorder(project_data)
+        self._build_prompt(section_name, doc_type, recorder)
+        return {key: project_data.get(key) for key in sorted(recorder.accessed)}
+
+    def get_section_fingerprint(self, section_name: str, doc_type: str, project_data: dict, section_class: str = None) -> tuple:
+        """
+        Fingerprints everything that determines a section's generated text.
+        `section_class` overrides the section's model routing class (e.g. 'json').
+
+        Returns:
+            tuple: (fingerprint hex string, {field: value} dependencies consumed by the prompt).
+                   The fingerprint covers the routed model (and options, including the
+                   section's num_predict budget), system message and
+                   full prompt, so it also changes when the prompt template itself is edited.
+        """
+        recorder = _FieldRecorder(project_data)
+        prompt = self._build_prompt(section_name, doc_type, recorder)
+        dependencies = {key: project_data.get(key) for key in sorted(recorder.accessed)}
+        section_class = section_class or self.section_class(section_name)
+        route = self._route(section_class)
+        options = self._request_options(route, self._budget_options([section_name], doc_type, format_json=section_class == 'json'))
+        material = {"model": route["model"], "system": self.DEFAULT_SYSTEM_MESSAGE, "prompt": prompt}
+        if options: material["options"] = options
+        material = json.dumps(material, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest(), dependencies
 
     def generate_section(self, section_name: str, doc_type: str, project_data: dict) -> str:
         print(f"    Generating content for section: '{section_name}' ({doc_type})...")
-        prompt = self._build_prompt(section_name, doc_type, project_data)
-        system_msg = self.DEFAULT_SYSTEM_MESSAGE
-        generated_text = self.ollama_client.generate(prompt, system_message=system_msg)
+        generated_text = self._generate_routed(self.section_class(section_name), self._build_prompt(section_name, doc_type, project_data),
+                                               doc_type, project_data, budget_options=self._budget_options([section_name], doc_type))
+        return self._finish_section(section_name, generated_text)
+
+    async def generate_section_async(self, section_name: str, doc_type: str, project_data: dict) -> str:
+        """Async variant of generate_section using the AsyncOllamaClient passed at construction."""
+        if self.async_client is None:
+            raise RuntimeError("ContentGenerator was created without an async_client.")
+        print(f"    Generating content for section: '{section_name}' ({doc_type}) [async]...")
+        generated_text = await self._generate_routed_async(self.section_class(section_name),
+                                                           self._build_prompt(section_name, doc_type, project_data), doc_type, project_data,
+                                                           budget_options=self._budget_options([section_name], doc_type))
+        return self._finish_section(section_name, generated_text)
+
+    def condense_section(self, section_name: str, source_text: str, doc_type: str, project_data: dict) -> str:
+        """
+        Derives a shorter variant of an already generated section (e.g. the synopsis
+        Introduction from the report Introduction) with one cheap condensation call.
+
+        Returns:
+            str: The condensed text, or an empty string if condensation failed.
+        """
+        print(f"    Condensing section: '{section_name}' for {doc_type}...")
+        length_hint = self.CONDENSED_LENGTH_HINTS.get(section_name, "1-2 paragraphs")
+        prompt = f"{self._base_context(doc_type, project_data)}\n"
+        prompt += (f"Instructions: Condense the following '{section_name}' text, written for the full project report, "
+                   f"into the body content of the same section for a {doc_type.capitalize()}. Keep the key points, do not add "
+                   f"new information, and do NOT include the section title itself or any markdown/formatting.\n"
+                   f"Length: {length_hint}.\n\nText to condense:\n{source_text}")
+        condensed = self._generate_routed('condense', prompt, doc_type, project_data,
+                                          budget_options=self._budget_options([section_name], doc_type))
+        if condensed: print(f"      Condensed '{section_name}' ({len(source_text)} -> {len(condensed)} chars).")
+        return condensed
+
+    def _json_sections_prompt(self, section_names: list, doc_type: str, project_data: dict) -> str:
+        """One prompt asking for all `section_names` as keys of a single JSON object."""
+        prompt = f"{self._base_context(doc_type, project_data)}\n"
+        prompt += (f"Instructions: Write the body content of each section listed below for the {doc_type.capitalize()}. "
+                   "Respond with ONE JSON object that has exactly these keys, each mapped to that section's body text as a "
+                   "single string. Separate paragraphs with blank lines. Do NOT include section titles, markdown/formatting or other keys.\n")
+        for section_name in section_names:
+            _, guidance = self._section_guidance(section_name, doc_type, project_data)
+            prompt += f'\n"{section_name}": "<body text>"\n{guidance}\n'
+        return prompt
+
+    @staticmethod
+    def _parse_json_sections(generated_text: str, section_names: list) -> dict:
+        """
+        Extracts {section_name: text} for the requested keys from a JSON-mode response.
+        Keys that are missing, empty or not text are left out; keys are matched
+        case-insensitively and a list of paragraphs is joined into one text.
+        """
+        if not generated_text: return {}
+        try:
+            data = json.loads(generated_text)
+        except ValueError:
+            start, end = generated_text.find("{"), generated_text.rfind("}") # Tolerate text around the object
+            try: data = json.loads(generated_text[start:end + 1]) if 0 <= start < end else None
+            except ValueError: data = None
+        if not isinstance(data, dict): return {}
+        by_key = {str(key).strip().lower(): value for key, value in data.items()}
+        sections = {}
+        for section_name in section_names:
+            value = data.get(section_name, by_key.get(section_name.lower()))
+            if isinstance(value, list) and all(isinstance(v, str) for v in value): value = "\n\n".join(value)
+            if isinstance(value, str) and value.strip(): sections[section_name] = value.strip()
+        return sections
+
+    def _json_attempt_done(self, sections: dict, new_sections: dict, section_names: list) -> list:
+        """Merges an attempt's sections and returns the names still missing."""
+        sections.update(new_sections)
+        missing = [name for name in section_names if name not in sections]
+        if missing: print(f"      JSON response lacked {len(missing)} section(s): {', '.join(missing)}")
+        return missing
+
+    def generate_sections_json(self, section_names: list, doc_type: str, project_data: dict) -> dict:
+        """
+        Generates several sections with one JSON-mode request keyed by section name,
+        instead of one request per section. Keys that are missing or malformed are
+        requested again (only those), up to config.JSON_GENERATION_MAX_ATTEMPTS requests.
+
+        Returns:
+            dict: Text per section name; sections that could not be obtained are absent,
+                  so the caller can generate them individually.
+        """
+        sections, missing = {}, list(section_names)
+        for attempt in range(config.JSON_GENERATION_MAX_ATTEMPTS):
+            if not missing: break
+            print(f"    Generating {len(missing)} sections in one JSON request ({doc_type}, attempt {attempt + 1})...")
+            generated_text = self._generate_routed('json', self._json_sections_prompt(missing, doc_type, project_data), doc_type,
+                                                   project_data, format_json=True,
+                                                   budget_options=self._budget_options(missing, doc_type, format_json=True))
+            missing = self._json_attempt_done(sections, self._parse_json_sections(generated_text, missing), section_names)
+        return sections
+
+    async def generate_sections_json_async(self, section_names: list, doc_type: str, project_data: dict) -> dict:
+        """Async variant of generate_sections_json using the AsyncOllamaClient passed at construction."""
+        if self.async_client is None:
+            raise RuntimeError("ContentGenerator was created without an async_client.")
+        sections, missing = {}, list(section_names)
+        for attempt in range(config.JSON_GENERATION_MAX_ATTEMPTS):
+            if not missing: break
+            print(f"    Generating {len(missing)} sections in one JSON request ({doc_type}, attempt {attempt + 1}) [async]...")
+            generated_text = await self._generate_routed_async('json', self._json_sections_prompt(missing, doc_type, project_data),
+                                                               doc_type, project_data, format_json=True,
+                                                               budget_options=self._budget_options(missing, doc_type, format_json=True))
+            missing = self._json_attempt_done(sections, self._parse_json_sections(generated_text, missing), section_names)
+        return sections
+
+    def _finish_section(self, section_name: str, generated_text: str) -> str:
         if not generated_text:
             print(f"      WARNING: Ollama returned empty content for '{section_name}'. Returning placeholder.")
             # Return specific placeholder to match observed output
-            return f"[Content for '{section_name}' could not be generated.]"
+            return self.PLACEHOLDER_TEMPLATE.format(section_name=section_name)
         print(f"      Content generation successful for '{section_name}'.")
         return generated_text
 
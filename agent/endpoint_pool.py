@@ -0,0 +1,214 @@
+# agent/endpoint_pool.py
+import json
+import os
+import threading
+import time
+from pathlib import Path
+import config
+
+def model_tag(model_name: str) -> str:
+    """The name /api/tags lists a model under ('mistral' -> 'mistral:latest')."""
+    return model_name if ':' in model_name else f"{model_name}:latest"
+
+def base_url_of(api_url: str) -> str:
+    """Server root of a generate API URL (http://host:11434/api/generate -> http://host:11434)."""
+    return api_url.replace("/api/generate", "")
+
+def get_available_models(session, base_url: str, use_cache: bool = True) -> tuple:
+    """
+    Returns (model names, age in seconds of the cached list or None if fetched now)
+    from GET <base_url>/api/tags.
+
+    The list is cached in LLM_CACHE_DIR/ollama_tags.json for
+    config.OLLAMA_TAGS_CACHE_TTL_SECONDS, so processes started shortly after each
+    other skip the request.
+
+    Raises:
+        requests.exceptions.RequestException: If the server cannot be queried.
+        ValueError: If the response is not a model list.
+    """
+    cache_path = Path(config.LLM_CACHE_DIR) / "ollama_tags.json"
+    if use_cache:
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f).get(base_url)
+            age = time.time() - entry["fetched_at"]
+            if 0 <= age < config.OLLAMA_TAGS_CACHE_TTL_SECONDS:
+                return entry["models"], age
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass # No usable cache entry
+
+    tags_response = session.get(base_url + "/api/tags", timeout=(config.OLLAMA_CONNECT_TIMEOUT, 5))
+    tags_response.raise_for_status()
+    models = [m['name'] for m in tags_response.json().get('models', [])]
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f: entries = json.load(f)
+            if not isinstance(entries, dict): entries = {}
+        except (OSError, ValueError):
+            entries = {}
+        entries[base_url] = {"fetched_at": time.time(), "models": models}
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(entries, f)
+        tmp_path.replace(cache_path)
+    except OSError:
+        pass # The cache is only an optimization
+    return models, None
+
+class Endpoint:
+    """One Ollama server in an EndpointPool, with its routing state."""
+    def __init__(self, url: str):
+        self.url = url # Generate API URL
+        self.base_url = base_url_of(url)
+        self.in_flight = 0
+        self.latency_s = None # Moving average of successful request durations
+        self.healthy = True # False once a request failed, until a probe or request succeeds
+        self.has_model = None # From /api/tags; None until checked
+        self.retry_at = 0.0 # When an unhealthy endpoint is probed again
+        self.probing = False
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and self.has_model is not False
+
+    def __repr__(self):
+        return f"Endpoint({self.base_url}, in_flight={self.in_flight}, latency={self.latency_s}, available={self.available})"
+
+class EndpointPool:
+    """
+    Routes requests over several Ollama servers.
+
+    Each request goes to the available endpoint with the lowest expected wait,
+    (in-flight requests + 1) x observed average latency, so a slow host receives
+    less work and an idle one more. An endpoint whose request fails (connection
+    error, timeout, overload status) or that lacks the model is taken out of
+    rotation and probed again via /api/tags every `reprobe_seconds` on a
+    background thread. With a single endpoint this reduces to always using it.
+    """
+    LATENCY_SMOOTHING = 0.3 # Weight of the newest request in the moving average
+
+    def __init__(self, urls: list, model_name: str, session, reprobe_seconds: float = None):
+        """
+        Args:
+            urls (list): Generate API URLs of the Ollama servers.
+            model_name (str): Model every endpoint must have.
+            session (requests.Session): Session used for probes.
+            reprobe_seconds (float, optional): Interval between probes of a failed endpoint.
+                                               Defaults to config.OLLAMA_ENDPOINT_REPROBE_SECONDS.
+        """
+        if not urls: raise ValueError("EndpointPool needs at least one endpoint URL")
+        self.endpoints = [Endpoint(url) for url in dict.fromkeys(urls)]
+        self.model_name = model_name
+        self.session = session
+        self.reprobe_seconds = config.OLLAMA_ENDPOINT_REPROBE_SECONDS if reprobe_seconds is None else reprobe_seconds
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def _expected_wait(self, endpoint: Endpoint, default_latency: float) -> float:
+        return (endpoint.in_flight + 1) * (endpoint.latency_s if endpoint.latency_s is not None else default_latency)
+
+    def acquire(self, exclude=()) -> Endpoint:
+        """
+        Picks the endpoint for a request and counts it as in flight (see release).
+        Unavailable endpoints are only used when no available one is left; `exclude`
+        lists endpoints already tried for this request.
+
+        Returns:
+            Endpoint: The chosen endpoint, or None if every endpoint is excluded.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for endpoint in self.endpoints if len(self.endpoints) > 1 else ():
+                if not endpoint.available and not endpoint.probing and endpoint.retry_at <= now:
+                    endpoint.probing = True
+                    threading.Thread(target=self._reprobe, args=(endpoint,), name="ollama-reprobe", daemon=True).start()
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates: return None
+            available = [e for e in candidates if e.available]
+            if available:
+                known = [e.latency_s for e in self.endpoints if e.latency_s is not None]
+                default_latency = sum(known) / len(known) if known else 1.0
+                # Ties (e.g. equally fast or not yet measured hosts) go to the least used endpoint
+                endpoint = min(available, key=lambda e: (self._expected_wait(e, default_latency), e.requests))
+            else:
+                endpoint = min(candidates, key=lambda e: e.retry_at) # Nothing available: try the longest-failed one
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, seconds: float = None, error=None, model_missing: bool = False):
+        """
+        Ends a request started with acquire().
+
+        Args:
+            endpoint (Endpoint): The endpoint the request went to.
+            seconds (float, optional): Duration of a successful request (updates the latency average).
+            error (optional): Why the request failed; takes the endpoint out of rotation.
+            model_missing (bool): The endpoint answered that it does not have the model.
+        """
+        with self._lock:
+            endpoint.in_flight = max(endpoint.in_flight - 1, 0)
+            if error is None and not model_missing:
+                endpoint.healthy = True
+                endpoint.has_model = True # It just answered a request for the model
+                if seconds is not None:
+                    endpoint.latency_s = seconds if endpoint.latency_s is None else (
+                        self.LATENCY_SMOOTHING * seconds + (1 - self.LATENCY_SMOOTHING) * endpoint.latency_s)
+                return
+            endpoint.failures += 1
+            if model_missing: endpoint.has_model = False
+            else: endpoint.healthy = False
+            endpoint.retry_at = time.monotonic() + self.reprobe_seconds
+        if len(self.endpoints) > 1:
+            reason = f"model '{self.model_name}' missing" if model_missing else error
+            print(f"      Warning: Ollama host {endpoint.base_url} taken out of rotation ({reason}); "
+                  f"probing again in {self.reprobe_seconds:.0f}s.")
+
+    def has_alternative(self, tried) -> bool:
+        """Whether an endpoint not in `tried` is left to fail over to."""
+        return any(e not in tried for e in self.endpoints)
+
+    def probe(self, endpoint: Endpoint, use_cache: bool = False) -> tuple:
+        """
+        Checks an endpoint's reachability and model list (GET /api/tags) and updates its state.
+
+        Returns:
+            tuple: (available models, age in seconds of the cached list or None if fetched now).
+
+        Raises:
+            requests.exceptions.RequestException: If the endpoint cannot be queried.
+            ValueError: If the response is not a model list.
+        """
+        try:
+            models, age = get_available_models(self.session, endpoint.base_url, use_cache=use_cache)
+        except Exception:
+            with self._lock:
+                endpoint.healthy = False
+                endpoint.retry_at = time.monotonic() + self.reprobe_seconds
+            raise
+        with self._lock:
+            endpoint.healthy = True
+            endpoint.has_model = model_tag(self.model_name) in models
+            if not endpoint.has_model: endpoint.retry_at = time.monotonic() + self.reprobe_seconds
+        return models, age
+
+    def _reprobe(self, endpoint: Endpoint):
+        """Background probe of an endpoint out of rotation."""
+        try:
+            self.probe(endpoint)
+            if endpoint.available: print(f"      Ollama host {endpoint.base_url} is back in rotation.")
+        except Exception:
+            pass # Still down; probed again after reprobe_seconds
+        finally:
+            endpoint.probing = False
+
+    def stats(self) -> list:
+        """Per-endpoint routing statistics."""
+        with self._lock:
+            return [{"url": e.base_url, "available": e.available, "requests": e.requests, "failures": e.failures,
+                     "latency_s": round(e.latency_s, 3) if e.latency_s is not None else None} for e in self.endpoints]
@@ -1,12 +1,66 @@
 # agent/guideline_manager.py
-from docx.shared import Inches, Pt, Cm
+import hashlib
+import json
+from dataclasses import dataclass
+from types import MappingProxyType
+from docx.shared import Inches, Pt, Cm, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
 from docx.enum.section import WD_SECTION_START # For page numbering breaks
 from docx.enum.style import WD_STYLE_TYPE # For potential style usage
+from .pagination import PaginationEstimator
 
 # Define common constants (based on typical guidelines, adjust as needed from OCR text)
 FONT_TIMES_NEW_ROMAN = "Times New Roman"
-# COLOR_BLACK = RGBColor(0, 0, 0) # Example, if needed later
+COLOR_BLACK = RGBColor(0, 0, 0)
+PAGE_SIZES = {"A4": (Cm(21.0), Cm(29.7))} # (width, height)
+AVG_CHARS_PER_WORD = 6.0 # English prose, including the following space and punctuation
+
+def _freeze(value):
+    """Recursively converts dicts to read-only mappings and lists to tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+@dataclass(frozen=True)
+class ResolvedStyle:
+    """
+    A formatting style with every default filled in, ready to apply to a paragraph.
+
+    Built once per (doc_type, style_key) when the rules are compiled, so
+    DocumentFormatter reads plain attributes instead of dict lookups with defaults.
+    `align` and `line_spacing` stay None when the style does not set them.
+    """
+    key: str
+    align: object = None
+    line_spacing: float = None
+    space_before: object = Pt(0)
+    space_after: object = Pt(0)
+    first_line_indent: object = None
+    left_indent: object = None
+    right_indent: object = None
+    hanging_indent: object = None
+    keep_together: bool = False
+    keep_with_next: bool = False
+    page_break_before: bool = False
+    widow_control: bool = True
+    font: str = FONT_TIMES_NEW_ROMAN
+    size: object = Pt(12)
+    bold: bool = False
+    italic: bool = False
+    underline: bool = False
+    all_caps: bool = False
+    color: RGBColor = COLOR_BLACK
+
+    @classmethod
+    def from_rule(cls, key: str, rule) -> "ResolvedStyle":
+        """Builds a resolved style from a formatting_styles entry, ignoring unknown keys."""
+        fields = cls.__dataclass_fields__
+        return cls(key=key, **{name: value for name, value in rule.items() if name in fields and name != 'key'})
+
+# Used when a style key is missing from the guidelines
+_DEFAULT_STYLE_RULE = MappingProxyType({"font": FONT_TIMES_NEW_ROMAN, "size": Pt(12)})
 
 class GuidelineManager:
     """
@@ -36,6 +90,9 @@ class GuidelineManager:
                 "figure_prefix": "Fig",
                 "table_prefix": "Table",
                 "reference_style": "IEEE", # As specified
+                "word_limits": { # Explicit length limits stated for individual sections
+                    "Abstract": 250,
+                },
             },
             "synopsis": {
                 "page_limit_min": 6,
@@ -118,6 +175,12 @@ class GuidelineManager:
                     "caption": {"font": FONT_TIMES_NEW_ROMAN, "size": Pt(10), "line_spacing": 1.0,
                                 "align": WD_ALIGN_PARAGRAPH.CENTER, # Captions often centered
                                 "space_before": Pt(6), "space_after": Pt(12)},
+                    "figure": {"line_spacing": 1.0, "align": WD_ALIGN_PARAGRAPH.CENTER, # Picture paragraph, kept with its caption
+                               "space_before": Pt(12), "keep_with_next": True},
+                    "table_text": {"font": FONT_TIMES_NEW_ROMAN, "size": Pt(10), "line_spacing": 1.0,
+                                   "align": WD_ALIGN_PARAGRAPH.LEFT},
+                    "table_header": {"font": FONT_TIMES_NEW_ROMAN, "size": Pt(10), "line_spacing": 1.0, "bold": True,
+                                     "align": WD_ALIGN_PARAGRAPH.CENTER},
                     "reference": {"font": FONT_TIMES_NEW_ROMAN, "size": Pt(10), "line_spacing": 1.0,
                                   "align": WD_ALIGN_PARAGRAPH.LEFT, "hanging_indent": Inches(0.5)},
                     # Declaration body can often remain justified if desired by guidelines
@@ -207,6 +270,7 @@ Date: {submission_date} Place: Hisar""" # Placeholder for date
             }
         }
         self._load_rules_from_file() # Placeholder for potential future implementation
+        self._compile_rules()
 
     def _load_rules_from_file(self):
         """
@@ -222,27 +286,62 @@ Date: {submission_date} Place: Hisar""" # Placeholder for date
             pass
 
 
-    def get_doc_rules(self, doc_type: str) -> dict:
-        """Gets all rules for a specific document type ('synopsis' or 'report')."""
-        if doc_type not in self._rules:
-            raise ValueError(f"Unknown document type: {doc_type}")
-        # Combine common rules with type-specific rules
+    def _compile_rules(self):
+        """
+        Freezes the loaded rules and precompiles them per document type.
+
+        The common and type-specific rules are merged once into read-only mappings,
+        and every formatting style is resolved into a ResolvedStyle. After this,
+        rule and style lookups are plain dict reads that never merge or allocate.
+        Also computes rules_fingerprint, which changes whenever any rule changes.
+        """
+        serialized = json.dumps(self._rules, sort_keys=True, default=repr)
+        self.rules_fingerprint = hashlib.sha256(serialized.encode('utf-8')).hexdigest()[:16]
+        self._rules = _freeze(self._rules)
         common = self._rules.get("common", {})
-        specific = self._rules.get(doc_type, {})
-        # Merge dictionaries (specific rules override common ones if keys conflict)
-        return {**common, **specific}
+        self._compiled_rules = {}
+        self._style_table = {}
+        for doc_type, specific in self._rules.items():
+            merged = MappingProxyType({**common, **specific})
+            self._compiled_rules[doc_type] = merged
+            self._style_table[doc_type] = MappingProxyType({
+                key: ResolvedStyle.from_rule(key, rule) for key, rule in merged.get("formatting_styles", {}).items()})
+        self._default_style = ResolvedStyle.from_rule("default", _DEFAULT_STYLE_RULE)
 
-    def get_formatting_rule(self, doc_type: str, style_key: str) -> dict:
-        """Gets specific formatting style details for a given key."""
-        doc_rules = self.get_doc_rules(doc_type)
-        styles = doc_rules.get("formatting_styles", {})
-        style = styles.get(style_key)
+    def get_doc_rules(self, doc_type: str):
+        """Gets all rules for a specific document type ('synopsis' or 'report') as a read-only mapping."""
+        try:
+            return self._compiled_rules[doc_type]
+        except KeyError:
+            raise ValueError(f"Unknown document type: {doc_type}") from None
+
+    def get_formatting_rule(self, doc_type: str, style_key: str):
+        """Gets specific formatting style details for a given key as a read-only mapping."""
+        style = self.get_doc_rules(doc_type).get("formatting_styles", {}).get(style_key)
         if not style:
              print(f"Warning: Formatting style key '{style_key}' not found for doc_type '{doc_type}'. Using default.")
-             # Return a basic default or raise an error
-             return {"font": FONT_TIMES_NEW_ROMAN, "size": Pt(12)}
+             return _DEFAULT_STYLE_RULE
         return style
 
+    def get_resolved_style(self, doc_type: str, style_key: str) -> ResolvedStyle:
+        """
+        Gets the precompiled, ready-to-apply style for a given key.
+
+        Args:
+            doc_type (str): 'synopsis' or 'report'.
+            style_key (str): Key in the formatting_styles rules (e.g. 'normal_text').
+
+        Returns:
+            ResolvedStyle: The shared, immutable style object (a default style if the key is unknown).
+        """
+        try:
+            return self._style_table[doc_type][style_key]
+        except KeyError:
+            if doc_type not in self._style_table:
+                raise ValueError(f"Unknown document type: {doc_type}") from None
+            print(f"Warning: Formatting style key '{style_key}' not found for doc_type '{doc_type}'. Using default.")
+            return self._default_style
+
     def get_section_order(self, doc_type: str) -> list:
         """Gets the list of body sections/chapters in order."""
         doc_rules = self.get_doc_rules(doc_type)
@@ -254,6 +353,10 @@ Date: {submission_date} Place: Hisar""" # Placeholder for date
             return structure.get("body_chapters", [])
         return []
 
+    def get_body_sections(self, doc_type: str) -> list:
+        """Gets the body sections/chapters that are generated, in order (the section order without References)."""
+        return [s for s in self.get_section_order(doc_type) if s.lower() != 'references']
+
     def get_report_structure(self) -> dict:
         """Gets the overall structure definition for the final report."""
         report_rules = self.get_doc_rules("report")
@@ -280,4 +383,29 @@ Date: {submission_date} Place: Hisar""" # Placeholder for date
         doc_rules = self.get_doc_rules(doc_type)
         return doc_rules.get("page_numbering", {})
 
-    # Add other getter methods as needed (e.g., get_page_limits)
\ No newline at end of file
+    def get_page_limits(self, doc_type: str) -> tuple:
+        """Gets (minimum, maximum) body pages; either is None if the guidelines set no limit."""
+        doc_rules = self.get_doc_rules(doc_type)
+        return doc_rules.get("page_limit_min"), doc_rules.get("page_limit_max")
+
+    def get_word_limit(self, doc_type: str, section_name: str):
+        """Gets the explicit word limit of a section (e.g. the Abstract), or None if it has none."""
+        return self.get_doc_rules(doc_type).get("word_limits", {}).get(section_name)
+
+    def get_words_per_page(self, doc_type: str) -> int:
+        """
+        Estimates how many words of normal body text fit on one page.
+
+        Uses the page size, margins and the 'normal_text' style (font size, line spacing)
+        with the same character width and line height model as PaginationEstimator.
+        Paragraph spacing and headings are not included, so this is an upper bound.
+        """
+        doc_rules = self.get_doc_rules(doc_type)
+        page_width, page_height = PAGE_SIZES.get(doc_rules.get("page_size"), PAGE_SIZES["A4"])
+        margins = doc_rules.get("margins", {})
+        layout = PaginationEstimator(page_height, margins.get("top", Inches(1.0)), margins.get("bottom", Inches(1.0)),
+                                     page_width, margins.get("left", Inches(1.0)), margins.get("right", Inches(1.0)))
+        style = self.get_resolved_style(doc_type, "normal_text")
+        chars_per_line = layout.usable_width / (int(style.size) * PaginationEstimator.AVG_CHAR_WIDTH_EM)
+        lines_per_page = layout.usable_height // layout.line_height(style.size, style.line_spacing)
+        return int(chars_per_line * lines_per_page / AVG_CHARS_PER_WORD)
\ No newline at end of file
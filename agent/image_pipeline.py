@@ -0,0 +1,120 @@
+# agent/image_pipeline.py
+import hashlib
+import io
+import os
+from pathlib import Path
+from docx.image.image import Image as DocxImage
+import config
+
+EMU_PER_INCH = 914400
+# Formats that are recompressed as JPEG when they have no transparency; the rest
+# (PNG, GIF, BMP: screenshots, diagrams) stay lossless
+_PHOTO_FORMATS = {"JPEG", "MPO", "WEBP", "TIFF", "HEIC"}
+
+class ImageOptimizer:
+    """
+    Prepares figure images for insertion: downscales them to the printable width at
+    `target_dpi` and recompresses them (JPEG at `jpeg_quality` for photographs,
+    optimized PNG otherwise).
+
+    Processed files are cached in `cache_dir` under the SHA-256 of the source bytes
+    plus the processing parameters, so an image is processed once however often it
+    is built or whichever path it is referenced by. Because identical sources yield
+    byte-identical outputs, python-docx stores them as a single image part.
+
+    Without Pillow, images are passed through unchanged.
+    """
+    def __init__(self, cache_dir: str = None, target_dpi: int = None, jpeg_quality: int = None):
+        """
+        Args:
+            cache_dir (str, optional): Processed image cache. Defaults to config.FIGURE_IMAGE_CACHE_DIR.
+            target_dpi (int, optional): Pixel density at the printed width. Defaults to config.FIGURE_IMAGE_DPI.
+            jpeg_quality (int, optional): JPEG quality 1-95. Defaults to config.FIGURE_JPEG_QUALITY.
+        """
+        self.cache_dir = Path(cache_dir or config.FIGURE_IMAGE_CACHE_DIR)
+        self.target_dpi = target_dpi or config.FIGURE_IMAGE_DPI
+        self.jpeg_quality = min(max(int(jpeg_quality or config.FIGURE_JPEG_QUALITY), 1), 95)
+        self._source_hashes = {} # (path, size, mtime) -> sha256 of the file
+        self._prepared = {} # cache key -> path of the image to insert
+        self.pillow_available = None # Checked on first use
+
+    def _source_hash(self, path: Path) -> str:
+        stat = path.stat()
+        key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+        if key not in self._source_hashes:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""): digest.update(chunk)
+            self._source_hashes[key] = digest.hexdigest()
+        return self._source_hashes[key]
+
+    def prepare(self, image_path, max_width_emu: int) -> Path:
+        """
+        Returns the file to insert for `image_path` when it is shown at most `max_width_emu` wide.
+
+        Raises:
+            OSError: If the image cannot be read or is not a recognised image (Pillow's
+                     UnidentifiedImageError is an OSError).
+        """
+        source = Path(image_path)
+        if self.pillow_available is None:
+            try:
+                import PIL.Image # noqa: F401
+                self.pillow_available = True
+            except ImportError:
+                print("      Warning: Pillow not installed; figure images are inserted without optimization. pip install Pillow")
+                self.pillow_available = False
+        if not self.pillow_available: return source
+        target_px = max(int(max_width_emu * self.target_dpi / EMU_PER_INCH), 1)
+        cache_key = f"{self._source_hash(source)[:32]}_{target_px}_q{self.jpeg_quality}"
+        if cache_key in self._prepared: return self._prepared[cache_key]
+
+        for suffix in (".jpg", ".png", ".src"):
+            cached = self.cache_dir / f"{cache_key}{suffix}"
+            if cached.is_file():
+                prepared = source if suffix == ".src" else cached # ".src": the original was already optimal
+                break
+        else:
+            prepared = self._process(source, target_px, cache_key)
+        self._prepared[cache_key] = prepared
+        return prepared
+
+    def _process(self, source: Path, target_px: int, cache_key: str) -> Path:
+        from PIL import Image, ImageOps
+        with Image.open(source) as original:
+            source_format = original.format
+            image = ImageOps.exif_transpose(original) # Phone photos are often stored rotated
+            transformed = image is not original
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+            # Keep the physical size: scale the DPI with the pixels (72 is python-docx's default too)
+            dpi = float((original.info.get("dpi") or (72, 72))[0]) or 72.0
+            if image.width > target_px:
+                dpi *= target_px / image.width
+                image = image.resize((target_px, max(round(image.height * target_px / image.width), 1)), Image.LANCZOS)
+                transformed = True
+            dpi = (round(dpi), round(dpi))
+            as_jpeg = source_format in _PHOTO_FORMATS and not has_alpha
+            buffer = io.BytesIO()
+            if as_jpeg:
+                if image.mode not in ("RGB", "L"): image = image.convert("RGB")
+                image.save(buffer, "JPEG", quality=self.jpeg_quality, optimize=True, progressive=True, dpi=dpi)
+            else:
+                if image.mode not in ("RGB", "RGBA", "L", "LA", "P"): image = image.convert("RGBA" if has_alpha else "RGB")
+                image.save(buffer, "PNG", optimize=True, dpi=dpi)
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        data = buffer.getvalue()
+        # Keep the original when it is already small enough and in a format Word displays
+        if not transformed and source_format in ("JPEG", "PNG", "GIF") and len(data) >= source.stat().st_size:
+            (self.cache_dir / f"{cache_key}.src").touch()
+            return source
+        output = self.cache_dir / f"{cache_key}{'.jpg' if as_jpeg else '.png'}"
+        tmp_output = output.with_suffix(output.suffix + f".{os.getpid()}.tmp")
+        tmp_output.write_bytes(data)
+        tmp_output.replace(output)
+        print(f"      Optimized image {source.name}: {source.stat().st_size // 1024} KB -> {len(data) // 1024} KB")
+        return output
+
+def display_width(image_path, max_width_emu: int) -> int:
+    """Width (EMU) to show an image at: its natural size from pixels and DPI, capped at `max_width_emu`."""
+    return min(DocxImage.from_file(str(image_path)).width, int(max_width_emu))
@@ -1,119 +1,659 @@
 # agent/ollama_client.py
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import contextlib
 import json
+from concurrent.futures import ThreadPoolExecutor
+import random
+import threading
+import time
 import config # Import the configuration file
 import os
+from pathlib import Path
+from .build_trace import extract_server_timings, record_llm_call
+from .endpoint_pool import EndpointPool, base_url_of, model_tag
+from .response_cache import ResponseCache
+
+_shared_sessions = {} # retry_reads -> session
+_shared_session_lock = threading.Lock()
+
+def retry_limits(retry_reads: bool = True) -> dict:
+    """
+    Per-endpoint retry limits for Ollama requests, by failure kind: 'connect' (the request
+    was never sent), 'read' (dropped connection or timeout after it was sent; a retry starts
+    the generation over, so keep low) and 'status' (config.OLLAMA_RETRY_STATUS_CODES).
+    At most config.OLLAMA_MAX_RETRIES retries are made in total. With retry_reads=False
+    (requests with a latency budget) read failures are not retried.
+    """
+    return {"connect": config.OLLAMA_MAX_RETRIES, "read": config.OLLAMA_READ_RETRIES if retry_reads else 0,
+            "status": config.OLLAMA_MAX_RETRIES}
+
+class RetryCounter:
+    """Counts one request's retries on one endpoint against retry_limits(), for transports without urllib3's Retry."""
+    def __init__(self, retry_reads: bool = True):
+        self.limits = retry_limits(retry_reads)
+        self.counts = dict.fromkeys(self.limits, 0)
+
+    def allow(self, kind: str) -> bool:
+        """Records a retry of `kind` ('connect', 'read' or 'status') if one is left. Returns whether to retry."""
+        if sum(self.counts.values()) >= config.OLLAMA_MAX_RETRIES or self.counts[kind] >= self.limits[kind]: return False
+        self.counts[kind] += 1
+        return True
+
+def _build_retry(read_retries: int = None) -> Retry:
+    """
+    Retry policy for Ollama requests: exponential backoff with jitter on connection
+    failures and gateway/overload statuses, within retry_limits(). /api/generate is a
+    POST, but it has no server-side effects, so it is safe to repeat.
+    """
+    limits = retry_limits()
+    retry_kwargs = dict(
+        total=config.OLLAMA_MAX_RETRIES,
+        connect=limits["connect"],
+        read=limits["read"] if read_retries is None else read_retries,
+        status=limits["status"],
+        other=0,
+        status_forcelist=config.OLLAMA_RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "POST"]),
+        backoff_factor=config.OLLAMA_RETRY_BACKOFF_FACTOR,
+        backoff_max=config.OLLAMA_RETRY_BACKOFF_MAX,
+        backoff_jitter=config.OLLAMA_RETRY_BACKOFF_JITTER,
+        respect_retry_after_header=True,
+        raise_on_status=False, # Hand the final response to raise_for_status() for normal error reporting
+    )
+    try:
+        return Retry(**retry_kwargs)
+    except TypeError: # urllib3 < 2.0 has no backoff_max/backoff_jitter arguments
+        retry_kwargs.pop('backoff_max'); retry_kwargs.pop('backoff_jitter')
+        return Retry(**retry_kwargs)
+
+def get_shared_session(retry_reads: bool = True) -> requests.Session:
+    """
+    Returns the process-wide keep-alive session used for all Ollama requests.
+    With retry_reads=False the transport does not retry read errors; requests with a
+    latency budget use it, since a retried read timeout would start the generation over.
+    """
+    with _shared_session_lock:
+        if retry_reads not in _shared_sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=config.OLLAMA_POOL_CONNECTIONS,
+                                  pool_maxsize=config.OLLAMA_POOL_MAXSIZE,
+                                  max_retries=_build_retry(None if retry_reads else 0))
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({'Content-Type': 'application/json'})
+            _shared_sessions[retry_reads] = session
+        return _shared_sessions[retry_reads]
 # from os import path
 # from sys import Path
 
-class OllamaClient:
+def retry_backoff_delay(retry_number: int) -> float:
+    """Exponential backoff with jitter for the given retry (1-based), matching _build_retry()."""
+    delay = min(config.OLLAMA_RETRY_BACKOFF_MAX, config.OLLAMA_RETRY_BACKOFF_FACTOR * (2 ** (retry_number - 1)))
+    return delay + random.uniform(0, config.OLLAMA_RETRY_BACKOFF_JITTER)
+
+def transport_retries(response) -> int:
+    """Number of retries urllib3 performed before returning `response` (see _build_retry)."""
+    retries = getattr(getattr(response, 'raw', None), 'retries', None)
+    return len(retries.history) if retries is not None and retries.history else 0
+
+def build_generate_payload(model_name: str, prompt: str, system_message: str, format_json: bool, options: dict, stream: bool,
+                           keep_alive=None, context: list = None) -> dict:
+    """Builds the JSON body for an /api/generate request (`context`: token array of a PromptSession)."""
+    payload = {
+        "model": model_name,
+        "prompt": prompt,
+        "stream": stream,
+        "options": options,
+    }
+    if system_message:
+        payload["system"] = system_message
+    if format_json:
+        payload["format"] = "json"
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    if context:
+        payload["context"] = context
+    return payload
+
+def warm_up_model(api_url: str, model_name: str, keep_alive=None, session: requests.Session = None) -> float:
+    """
+    Loads `model_name` into memory on the Ollama server without generating anything
+    (a generate request with an empty prompt), so later requests skip the model load.
+
+    Args:
+        api_url (str): The Ollama generate API URL.
+        model_name (str): Model to load.
+        keep_alive (optional): How long the model stays loaded (e.g. '30m', seconds, -1 for
+                               indefinitely). Defaults to config.OLLAMA_KEEP_ALIVE.
+        session (requests.Session, optional): Session to use. Defaults to the shared session.
+
+    Returns:
+        float: Seconds until the model was ready.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails.
+    """
+    session = session or get_shared_session()
+    payload = {"model": model_name, "keep_alive": config.OLLAMA_KEEP_ALIVE if keep_alive is None else keep_alive}
+    start = time.perf_counter()
+    response = session.post(api_url, data=json.dumps(payload), timeout=(config.OLLAMA_CONNECT_TIMEOUT, config.OLLAMA_READ_TIMEOUT))
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+class GenerationBudgetExceeded(TimeoutError):
+    """A generation given a latency budget (see OllamaClient.generate) did not finish within it."""
+
+class PartialResponse(str):
+    """
+    Text of a response that ended before Ollama reported it done (e.g. a stream that broke
+    off). It is returned so the partial output is not lost, but it is not cached, and builds
+    do not record it for reuse.
+    """
+
+class PromptSession:
+    """
+    A prompt prefix shared by several generations, such as the project details every
+    section prompt starts with. Ollama evaluates the system message and the prefix once
+    (the "priming" request) and returns them as a `context` token array; each later
+    request sends that array plus only its own suffix, so the prefix is not evaluated again.
+
+    Used through the `session` argument of OllamaClient.generate / AsyncOllamaClient.generate.
+    If priming fails, requests fall back to sending the full prompt. The context belongs to
+    the model that primed it, so use one session per model.
+    """
+    PRIME_INSTRUCTION = "Reply only with 'OK'. Instructions for the sections to write follow."
+
+    def __init__(self, prefix: str, system_message: str = None):
+        """
+        Args:
+            prefix (str): Text every prompt of the session starts with (followed by a newline).
+            system_message (str, optional): System message for all requests of the session.
+        """
+        self.prefix = prefix
+        self.system_message = system_message
+        self.context = None # Ollama's token array for the system message and prefix, once primed
+        self.failed = False # Priming failed; requests send full prompts instead
+        self.lock = threading.Lock()
+        self.async_lock = None # Created by AsyncOllamaClient inside its event loop
+
+    @property
+    def prime_prompt(self) -> str:
+        return f"{self.prefix}\n{self.PRIME_INSTRUCTION}"
+
+    def full_prompt(self, suffix: str) -> str:
+        """The equivalent stand-alone prompt for `suffix`."""
+        return f"{self.prefix}\n{suffix}"
+
+    def cache_prompt(self, suffix: str) -> str:
+        """What the model actually sees for `suffix`, used for the response cache key."""
+        return f"{self.prime_prompt}\n\n{suffix}"
+
+    def prime_payload(self, model_name: str, options: dict, keep_alive=None) -> dict:
+        """Non-streamed request that evaluates the prefix and produces a one-token reply."""
+        return build_generate_payload(model_name, self.prime_prompt, self.system_message, False,
+                                      {**options, "num_predict": 1}, stream=False, keep_alive=keep_alive)
+
+class BaseOllamaClient:
+    """
+    Request logic shared by OllamaClient (requests) and AsyncOllamaClient (aiohttp):
+    endpoint pool setup, response cache, failover decisions, response and stream handling,
+    and build trace fields. Subclasses only implement the HTTP transport around these.
+    """
+    DEFAULT_OPTIONS = {
+        "temperature": 0.7,
+        # "num_ctx": 4096 # Example context window size - adjust based on model/needs
+    }
+    BROKEN_RESPONSE_ERRORS = () # Transport errors meaning a host broke off mid-response (set by subclasses)
+
+    def _setup(self, model_name: str, api_url, use_cache: bool, keep_alive):
+        """Sets the model, endpoint pool, keep-alive and response cache (see OllamaClient.__init__ for the arguments)."""
+        self.model_name = model_name or config.DEFAULT_OLLAMA_MODEL
+        api_urls = api_url or config.OLLAMA_ENDPOINTS or config.OLLAMA_API_URL
+        api_urls = [api_urls] if isinstance(api_urls, str) else list(api_urls)
+        self.pool = EndpointPool(api_urls, self.model_name, get_shared_session()) # Probes use the sync session
+        self.api_url = self.pool.endpoints[0].url # First endpoint, for messages
+        self.keep_alive = config.OLLAMA_KEEP_ALIVE if keep_alive is None else keep_alive
+        if use_cache is None: use_cache = config.LLM_CACHE_ENABLED
+        self.cache = None
+        if use_cache:
+            try:
+                self.cache = ResponseCache()
+            except Exception as e:
+                print(f"      Warning: Could not open LLM response cache, continuing without it: {e}")
+        self.last_stream_metrics = {}
+
+    def _build_payload(self, prompt: str, system_message: str, format_json: bool, options: dict, stream: bool,
+                       context: list = None, model_name: str = None) -> dict:
+        return build_generate_payload(model_name or self.model_name, prompt, system_message, format_json, options, stream,
+                                      self.keep_alive, context)
+
+    def _prepare_request(self, prompt: str, system_message: str, format_json: bool, options: dict,
+                         session: PromptSession, model_name: str) -> tuple:
+        """
+        Resolves a generate call: (prompt, system_message, session, merged options, cache key, model).
+        A session whose priming failed is dropped in favour of its full prompt.
+        """
+        model_name = model_name or self.model_name
+        if session is not None and session.failed:
+            prompt, system_message, session = session.full_prompt(prompt), session.system_message, None
+        merged_options = {**self.DEFAULT_OPTIONS, **(options or {})}
+        cache_key = None
+        if self.cache:
+            if session is not None:
+                cache_key = ResponseCache.make_key(model_name, session.cache_prompt(prompt), session.system_message,
+                                                   merged_options, format_json)
+            else:
+                cache_key = ResponseCache.make_key(model_name, prompt, system_message, merged_options, format_json)
+        return prompt, system_message, session, merged_options, cache_key, model_name
+
+    def _cache_lookup(self, cache_key: str):
+        if not cache_key: return None
+        try:
+            return self.cache.get(cache_key)
+        except Exception as e:
+            print(f"      Warning: LLM cache lookup failed: {e}")
+            return None
+
+    def _cache_store(self, cache_key: str, generated_text: str, model_name: str = None):
+        if not cache_key or not generated_text: return
+        try: self.cache.put(cache_key, generated_text, model_name or self.model_name)
+        except Exception as e: print(f"      Warning: Could not store response in LLM cache: {e}")
+
+    def _cached_response(self, cache_key: str, model_name: str) -> str:
+        """The cached text for `cache_key` (recorded in the build trace), or None."""
+        start = time.perf_counter()
+        cached_text = self._cache_lookup(cache_key)
+        if cached_text:
+            print(f"    Using cached Ollama response (model: {model_name}).")
+            record_llm_call(model=model_name, start=start, end=time.perf_counter(), cached=True)
+        return cached_text
+
+    def _fail_over(self, endpoint, tried: list, failure, model_missing: bool, payload: dict, call: dict = None) -> bool:
+        """
+        Hands back an endpoint whose request failed after its retries (or that lacks the
+        model), taking it out of rotation, and decides whether the request moves on.
+
+        Returns:
+            bool: True if another endpoint is left to fail over to.
+        """
+        tried.append(endpoint)
+        if model_missing and payload.get("model") != self.pool.model_name:
+            self.pool.release(endpoint) # The pool tracks the default model only; the host itself is fine
+        else:
+            self.pool.release(endpoint, error=failure, model_missing=model_missing)
+        if not self.pool.has_alternative(tried): return False
+        if call is not None: call["retries"] += 1
+        print(f"      Warning: Request to {endpoint.base_url} failed ({failure}); failing over to another Ollama host.")
+        return True
+
+    def _release_endpoint(self, endpoint, start: float, exception: BaseException = None):
+        """Hands an endpoint from the failover loop back to the pool once its response was read."""
+        if endpoint is None: return # Already released by the failover loop
+        if isinstance(exception, self.BROKEN_RESPONSE_ERRORS):
+            self.pool.release(endpoint, error=type(exception).__name__) # The host broke off mid-response
+        else:
+            self.pool.release(endpoint, seconds=None if exception else time.perf_counter() - start)
+
+    def _read_response(self, response_data: dict, cache_key: str, model_name: str, call: dict) -> str:
+        """Text of a non-streamed response; records Ollama's timings in `call` and caches complete responses."""
+        call["server"] = extract_server_timings(response_data)
+        generated_text = response_data.get('response', '').strip()
+        if not response_data.get('done', True):
+            print("      Warning: Ollama response indicates generation might not be fully complete ('done': false).")
+            return PartialResponse(generated_text) if generated_text else generated_text
+        self._cache_store(cache_key, generated_text, model_name)
+        return generated_text
+
+    @staticmethod
+    def _store_session_context(session: PromptSession, response_data: dict, call: dict):
+        """Takes the context token array from a priming response."""
+        call["server"] = extract_server_timings(response_data)
+        session.context = response_data.get('context') or None
+        if session.context is None: call["error"] = "no context returned"
+
+    @staticmethod
+    def _end_priming(session: PromptSession, call: dict) -> list:
+        """Marks a session whose priming failed, so its requests send full prompts. Returns the context."""
+        if session.context is None:
+            session.failed = True
+            print(f"      Warning: Could not prime the project session ({call['error']}); sending full prompts.")
+        return session.context
+
+    @staticmethod
+    def _start_stream_metrics(metrics: dict) -> dict:
+        metrics = metrics if metrics is not None else {}
+        metrics.update({"time_to_first_token_s": None, "total_time_s": None, "chunk_count": 0,
+                        "eval_count": None, "tokens_per_second": None, "done": False, "retries": None, "server": {}})
+        return metrics
+
+    @staticmethod
+    def _stream_chunk(data: dict, metrics: dict, start: float) -> str:
+        """Text of one parsed NDJSON stream line; updates `metrics` (first token time, final timings)."""
+        chunk = data.get('response', '')
+        if chunk:
+            if metrics["time_to_first_token_s"] is None: metrics["time_to_first_token_s"] = time.perf_counter() - start
+            metrics["chunk_count"] += 1
+        if data.get('done'):
+            metrics["done"] = True
+            metrics["eval_count"] = data.get('eval_count')
+            metrics["server"] = extract_server_timings(data)
+            eval_duration_ns = data.get('eval_duration')
+            if metrics["eval_count"] and eval_duration_ns:
+                metrics["tokens_per_second"] = metrics["eval_count"] / (eval_duration_ns / 1e9)
+        return chunk
+
+    def _finish_stream(self, metrics: dict, start: float, model_name: str, error: str = None):
+        """Completes a stream's metrics, records it in the build trace and prints its summary."""
+        end = time.perf_counter()
+        metrics["total_time_s"] = end - start
+        ttft = metrics["time_to_first_token_s"]
+        if metrics["tokens_per_second"] is None and ttft is not None and end > start + ttft:
+            # Client-side estimate: one streamed chunk is roughly one token
+            metrics["tokens_per_second"] = metrics["chunk_count"] / (end - start - ttft)
+        self.last_stream_metrics = dict(metrics)
+        record_llm_call(model=model_name, start=start, end=end, retries=metrics["retries"], streamed=True,
+                        ok=metrics["chunk_count"] > 0, server=metrics["server"], error=error)
+        tps = metrics["tokens_per_second"]
+        print(f"      Stream finished: TTFT={f'{ttft:.2f}s' if ttft is not None else 'n/a'}, "
+              f"{f'{tps:.1f}' if tps else 'n/a'} tokens/s, total={metrics['total_time_s']:.2f}s, done={metrics['done']}")
+
+    def _collect_stream(self, chunks: list, metrics: dict, cache_key: str, model_name: str) -> str:
+        """Joins a collected stream; caches it if complete, else returns the salvaged partial output as a PartialResponse."""
+        generated_text = "".join(chunks).strip()
+        if metrics.get('done'):
+            self._cache_store(cache_key, generated_text, model_name)
+        elif generated_text:
+            print(f"      Warning: Stream ended early; salvaged {len(generated_text)} chars of partial output.")
+            return PartialResponse(generated_text)
+        return generated_text
+
+class OllamaClient(BaseOllamaClient):
     """
     A client to interact with a local Ollama API endpoint for text generation.
     """
-    def __init__(self, model_name: str = None, api_url: str = None):
+    BROKEN_RESPONSE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                              requests.exceptions.ChunkedEncodingError)
+
+    def __init__(self, model_name: str = None, api_url=None, use_cache: bool = None, request_slots=None,
+                 check_connection='background', keep_alive=None, warm_up: bool = None):
         """
         Initializes the Ollama client.
 
         Args:
             model_name (str, optional): The specific Ollama model to use (e.g., 'mistral', 'llama3').
                                         Defaults to config.DEFAULT_OLLAMA_MODEL.
-            api_url (str, optional): The URL for the Ollama generate API.
-                                     Defaults to config.OLLAMA_API_URL.
+            api_url (str or list, optional): The URL for the Ollama generate API, or a list of them
+                                             to spread requests over several servers (see EndpointPool).
+                                             Defaults to config.OLLAMA_ENDPOINTS, or config.OLLAMA_API_URL
+                                             when that is empty.
+            use_cache (bool, optional): Whether to serve repeated prompts from the on-disk
+                                        response cache. Defaults to config.LLM_CACHE_ENABLED.
+            request_slots (optional): A semaphore (e.g. a multiprocessing.Manager BoundedSemaphore)
+                                      held for the duration of each HTTP generation request, so
+                                      several clients or processes share one concurrency limit.
+            check_connection: 'background' (default) checks reachability and the model list on a
+                              background thread (see report_connection_status), True checks before
+                              returning, False skips the check.
+            keep_alive (optional): How long Ollama keeps the model loaded after each request
+                                   (e.g. '30m', seconds, -1 for indefinitely). Defaults to
+                                   config.OLLAMA_KEEP_ALIVE.
+            warm_up (bool, optional): Load the model on a background thread right away, so the
+                                      load overlaps with user input and front matter construction.
+                                      Defaults to config.OLLAMA_WARMUP.
         """
-        self.model_name = model_name or config.DEFAULT_OLLAMA_MODEL
-        self.api_url = api_url or config.OLLAMA_API_URL
+        self.request_slots = request_slots
+        self.session = get_shared_session()
+        self._setup(model_name, api_url, use_cache, keep_alive)
+        self.timeout = (config.OLLAMA_CONNECT_TIMEOUT, config.OLLAMA_READ_TIMEOUT)
         print(f"    OllamaClient initialized:")
-        print(f"      API URL: {self.api_url}")
+        print(f"      API URL: {', '.join(e.url for e in self.pool.endpoints)}")
         print(f"      Model:   {self.model_name}")
-        self._check_connection()
+        print(f"      Cache:   {self.cache.db_path if self.cache else 'disabled'}")
+        print(f"      Keep-alive: {self.keep_alive}")
+        self.connection_ok = None # Result of the connection check: True / False, None while unknown
+        self._connection_messages = []
+        self._connection_lock = threading.Lock()
+        self._connection_thread = None
+        if check_connection == 'background':
+            # The check overlaps with whatever the caller does next (e.g. prompting the user)
+            print("      Checking Ollama connection in the background...")
+            self._connection_thread = threading.Thread(target=self._check_connection, name="ollama-health-check", daemon=True)
+            self._connection_thread.start()
+        elif check_connection:
+            print("      Checking Ollama connection...")
+            self._check_connection()
+            self.report_connection_status()
+        self.warmup_seconds = None # Time the warm-up request took, once finished
+        if warm_up is None: warm_up = config.OLLAMA_WARMUP
+        if warm_up and self.connection_ok is not False:
+            for endpoint in self.pool.endpoints: # Each server loads its own copy of the model
+                threading.Thread(target=self._warm_up, args=(endpoint.url,), name="ollama-warm-up", daemon=True).start()
 
-    def _check_connection(self):
-        """Checks if the Ollama API endpoint is reachable."""
-        print("      Checking Ollama connection...")
+    def _report(self, message: str):
+        """Buffers a connection check / warm-up message for report_connection_status()."""
+        with self._connection_lock: self._connection_messages.append(message)
+
+    def _warm_up(self, api_url: str):
+        """Loads the model in the background; the outcome is reported with the connection check."""
+        host = f" on {base_url_of(api_url)}" if len(self.pool) > 1 else ""
         try:
-            # A simple GET request to the base Ollama URL often works for a basic health check
-            # Adjust if your Ollama setup requires a different check
-            base_url = self.api_url.replace("/api/generate", "")
-            response = requests.get(base_url, timeout=5) # 5 second timeout
-            response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-            print(f"      Ollama connection successful ({base_url})!")
-            # Optionally check if the specific model is available via /api/tags
-            try:
-                tags_url = base_url + "/api/tags"
-                tags_response = requests.get(tags_url, timeout=5)
-                tags_response.raise_for_status()
-                models_data = tags_response.json()
-                available_models = [m['name'] for m in models_data.get('models', [])]
-                model_tag = self.model_name if ':' in self.model_name else f"{self.model_name}:latest"
-                if model_tag not in available_models:
-                     print(f"      Warning: Model '{self.model_name}' (checked as '{model_tag}') not found in available models: {available_models}")
-                else:
-                     print(f"      Model '{self.model_name}' found.")
-            except Exception as e:
-                print(f"      Warning: Could not verify model list from Ollama API: {e}")
+            seconds = warm_up_model(api_url, self.model_name, self.keep_alive, self.session)
+            self.warmup_seconds = max(self.warmup_seconds or 0.0, seconds)
+            self._report(f"      Model '{self.model_name}' loaded in the background{host} ({seconds:.1f}s, keep-alive {self.keep_alive}).")
+        except requests.exceptions.RequestException as e:
+            self._report(f"      Warning: Model warm-up failed{host}: {e}")
 
+    def _check_connection(self):
+        """
+        Checks that every Ollama endpoint is reachable and has the configured model.
+
+        One GET of /api/tags per endpoint answers both questions; endpoints are checked
+        concurrently. The model list is cached on disk for config.OLLAMA_TAGS_CACHE_TTL_SECONDS,
+        so processes started shortly after each other (batch workers, repeated runs) skip
+        the request entirely. Endpoints that fail are taken out of rotation. Messages are
+        buffered and printed by report_connection_status(), since this usually runs on a
+        background thread while the user is being prompted.
+        """
+        if len(self.pool) == 1:
+            self.connection_ok = self._check_endpoint(self.pool.endpoints[0], "")
+            return
+        with ThreadPoolExecutor(max_workers=len(self.pool), thread_name_prefix="ollama-health-check") as executor:
+            results = list(executor.map(lambda e: self._check_endpoint(e, f"[{e.base_url}] "), self.pool.endpoints))
+        self.connection_ok = any(results)
+        usable = sum(1 for e in self.pool.endpoints if e.available)
+        self._report(f"      {usable} of {len(self.pool)} Ollama hosts available.")
+
+    def _check_endpoint(self, endpoint, label: str) -> bool:
+        """Checks one endpoint and buffers its messages. Returns whether it was reachable."""
+        report = self._report
+        try:
+            available_models, age = self.pool.probe(endpoint, use_cache=True)
+            source = f"cached model list, {age:.0f}s old" if age is not None else endpoint.base_url
+            report(f"      {label}Ollama connection successful ({source})!")
+            tag = model_tag(self.model_name)
+            if tag not in available_models:
+                 report(f"      {label}Warning: Model '{self.model_name}' (checked as '{tag}') not found in available models: {available_models}")
+            else:
+                 report(f"      {label}Model '{self.model_name}' found.")
+            return True
         except requests.exceptions.ConnectionError:
-            print(f"      ERROR: Could not connect to Ollama API at {self.api_url}.")
-            print("             Ensure Ollama is running and the URL in config.py is correct.")
-            # Consider raising an exception here to halt execution if connection is critical
-            # raise ConnectionError(f"Failed to connect to Ollama at {self.api_url}")
+            report(f"      {label}ERROR: Could not connect to Ollama API at {endpoint.url}.")
+            report("             Ensure Ollama is running and the URL in config.py is correct.")
         except requests.exceptions.Timeout:
-            print(f"      ERROR: Connection to Ollama API timed out ({self.api_url}).")
-            # raise TimeoutError(f"Connection timeout for Ollama at {self.api_url}")
+            report(f"      {label}ERROR: Connection to Ollama API timed out ({endpoint.url}).")
         except requests.exceptions.RequestException as e:
-            print(f"      ERROR: An error occurred during Ollama connection check: {e}")
-            # raise e
+            report(f"      {label}ERROR: An error occurred during Ollama connection check: {e}")
+        except (ValueError, KeyError, TypeError) as e:
+            endpoint.healthy = True # Reachable, but the model list could not be read
+            report(f"      {label}Warning: Could not verify model list from Ollama API: {e}")
+            return True
+        return False
+
+    def report_connection_status(self, timeout: float = None) -> bool:
+        """
+        Prints the connection check results once they are available.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a check still running in the
+                                       background (None waits until it finishes, 0 does not wait).
+
+        Returns:
+            bool: True if the server was reachable, False if not, None if the check has not finished.
+        """
+        if self._connection_thread is not None:
+            self._connection_thread.join(timeout)
+            if self._connection_thread.is_alive(): return None
+        with self._connection_lock:
+            messages, self._connection_messages = self._connection_messages, []
+        for message in messages: print(message)
+        return self.connection_ok
+
+    def _request_slot(self):
+        """Context manager holding one of the shared request slots, if any were given."""
+        return self.request_slots if self.request_slots is not None else contextlib.nullcontext()
+
+    def _post_generate(self, payload: dict, timeout, stream: bool = False, call: dict = None, deadline: float = None) -> tuple:
+        """
+        POSTs a generate request to the least-loaded available endpoint. Connection
+        errors, timeouts, overload statuses and "model not found" (after the transport's
+        own retries) take the endpoint out of rotation and the request moves on to the
+        next endpoint, until none is left. A timeout past `deadline` (time.perf_counter())
+        means the model exceeded its latency budget, which is not the endpoint's fault.
+
+        Returns:
+            tuple: (response, endpoint). The caller must hand the endpoint back with
+                   self.pool.release() once the response has been read.
+
+        Raises:
+            requests.exceptions.RequestException: If the request failed on every endpoint.
+            GenerationBudgetExceeded: If `deadline` passed.
+        """
+        tried = []
+        if call is not None: call["retries"] = 0
+        session = self.session if deadline is None else get_shared_session(retry_reads=False)
+        while True:
+            endpoint = self.pool.acquire(exclude=tried)
+            try:
+                response = session.post(endpoint.url, data=json.dumps(payload), timeout=timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    self.pool.release(endpoint)
+                    raise GenerationBudgetExceeded(f"'{payload.get('model')}' did not answer within its latency budget") from e
+                failure, response = e, None
+            else:
+                if call is not None: call["retries"] += transport_retries(response)
+                status = response.status_code
+                if status not in config.OLLAMA_RETRY_STATUS_CODES and status != 404: return response, endpoint
+                failure = f"HTTP {status}"
+            model_missing = response is not None and response.status_code == 404
+            if not self._fail_over(endpoint, tried, failure, model_missing, payload, call):
+                if response is not None: return response, None # Let the caller report the final response
+                raise failure
+            if response is not None: response.close()
 
+    def _session_context(self, session: PromptSession, model_name: str = None) -> list:
+        """Returns the session's context token array, priming it with one request on first use (None on failure)."""
+        model_name = model_name or self.model_name
+        with session.lock: # Concurrent sections wait for a single priming request
+            if session.context is not None or session.failed: return session.context
+            print(f"    Evaluating shared prompt prefix once (project session, model: {model_name})...")
+            payload = session.prime_payload(model_name, self.DEFAULT_OPTIONS, self.keep_alive)
+            start = time.perf_counter()
+            call = {"retries": None, "server": None, "error": None} # For the build trace
+            endpoint, failure = None, None
+            try:
+                with self._request_slot():
+                    start = time.perf_counter()
+                    response, endpoint = self._post_generate(payload, self.timeout, call=call)
+                response.raise_for_status()
+                self._store_session_context(session, response.json(), call)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                failure = e
+                call["error"] = f"{type(e).__name__}: {e}"
+            finally:
+                self._release_endpoint(endpoint, start, failure)
+                record_llm_call(model=model_name, start=start, end=time.perf_counter(), ok=session.context is not None, **call)
+            return self._end_priming(session, call)
 
-    def generate(self, prompt: str, system_message: str = None, format_json: bool = False) -> str:
+    def generate(self, prompt: str, system_message: str = None, format_json: bool = False, options: dict = None,
+                 stream: bool = False, session: PromptSession = None, model_name: str = None,
+                 budget_seconds: float = None) -> str:
         """
         Sends a prompt to the Ollama API and returns the generated text.
 
+        Identical requests are answered from the response cache when it is enabled.
+
         Args:
             prompt (str): The main user prompt for the LLM.
             system_message (str, optional): An optional system message to guide the LLM's behavior.
             format_json (bool): Whether to request JSON output format from Ollama (model must support it).
+            options (dict, optional): Ollama model options, merged over DEFAULT_OPTIONS.
+            stream (bool): Collect the response via generate_stream(). This uses an inactivity
+                           timeout instead of a total timeout, and partial output is returned
+                           if the stream breaks off.
+            session (PromptSession, optional): `prompt` is a suffix of the session's shared prefix,
+                                               which Ollama evaluates only once. The session's
+                                               system message replaces `system_message`.
+            model_name (str, optional): Model for this request instead of the client's model.
+            budget_seconds (float, optional): Latency budget: the request is abandoned once it has
+                                              run this long (not counting the wait for a request
+                                              slot) and GenerationBudgetExceeded is raised.
 
         Returns:
             str: The generated text content, or an empty string if an error occurs.
+
+        Raises:
+            GenerationBudgetExceeded: If `budget_seconds` ran out; partial output is discarded.
         """
-        print(f"    Sending prompt to Ollama (model: {self.model_name})...")
-        headers = {'Content-Type': 'application/json'}
-        payload = {
-            "model": self.model_name,
-            "prompt": prompt,
-            "stream": False, # Get the full response at once
-            "options": { # Add options like temperature if needed
-                 "temperature": 0.7,
-                # "num_ctx": 4096 # Example context window size - adjust based on model/needs
-            }
-        }
-        if system_message:
-            payload["system"] = system_message
-        if format_json:
-            payload["format"] = "json"
+        if self._connection_messages: self.report_connection_status(timeout=0) # Background check results, if ready
+        prompt, system_message, session, merged_options, cache_key, model_name = self._prepare_request(
+            prompt, system_message, format_json, options, session, model_name)
+        cached_text = self._cached_response(cache_key, model_name)
+        if cached_text: return cached_text
 
-        try:
-            response = requests.post(self.api_url, headers=headers, data=json.dumps(payload), timeout=120) # Increased timeout for generation
-            response.raise_for_status() # Check for HTTP errors
+        context = None
+        if session is not None:
+            context = self._session_context(session, model_name)
+            if context is None:
+                return self.generate(session.full_prompt(prompt), session.system_message, format_json, options, stream,
+                                     model_name=model_name, budget_seconds=budget_seconds)
+            system_message = None # Part of the context
 
-            response_data = response.json()
-            generated_text = response_data.get('response', '').strip()
+        if stream:
+            return self._generate_streamed(prompt, system_message, format_json, merged_options, cache_key, context,
+                                           model_name, budget_seconds)
 
-            # Basic logging of response length
-            # print(f"      Ollama response received (length: {len(generated_text)} chars).")
+        print(f"    Sending prompt to Ollama (model: {model_name})...")
+        payload = self._build_payload(prompt, system_message, format_json, merged_options, stream=False, # Get the full response at once
+                                      context=context, model_name=model_name)
+        timeout = self.timeout if budget_seconds is None else (self.timeout[0], min(self.timeout[1], budget_seconds))
 
-            # Optional: Check for "done: false" or other indicators of incomplete generation if not streaming
-            if not response_data.get('done', True):
-                print("      Warning: Ollama response indicates generation might not be fully complete ('done': false).")
+        generated_text = ""
+        call = {"retries": None, "server": None, "error": None} # For the build trace
+        endpoint, failure = None, None
+        start = time.perf_counter()
+        try:
+            with self._request_slot():
+                start = time.perf_counter() # Excludes waiting for a request slot
+                deadline = start + budget_seconds if budget_seconds is not None else None
+                response, endpoint = self._post_generate(payload, timeout, call=call, deadline=deadline)
+            response.raise_for_status() # Check for HTTP errors
 
+            generated_text = self._read_response(response.json(), cache_key, model_name, call)
             return generated_text
 
-        except requests.exceptions.Timeout:
-            print(f"      ERROR: Request to Ollama timed out after 120 seconds.")
+        except GenerationBudgetExceeded as e:
+            call["error"], failure = "latency budget exceeded", e
+            raise
+        except requests.exceptions.Timeout as e:
+            print(f"      ERROR: Request to Ollama timed out after {self.timeout[1]} seconds.")
+            call["error"], failure = "timeout", e
             return ""
         except requests.exceptions.RequestException as e:
             print(f"      ERROR: Failed to get response from Ollama API: {e}")
+            call["error"], failure = f"{type(e).__name__}: {e}", e
             # Print response body if available for debugging
             if hasattr(e, 'response') and e.response is not None:
                  try:
@@ -125,10 +665,115 @@ class OllamaClient:
         except json.JSONDecodeError:
             print(f"      ERROR: Could not decode JSON response from Ollama.")
             print(f"      Raw Response Text: {response.text}")
+            call["error"], failure = "invalid JSON response", ValueError("invalid JSON response")
             return ""
         except Exception as e:
             print(f"      ERROR: An unexpected error occurred during Ollama generation: {e}")
+            call["error"], failure = f"{type(e).__name__}: {e}", e
             return ""
+        finally:
+            self._release_endpoint(endpoint, start, failure)
+            record_llm_call(model=model_name, start=start, end=time.perf_counter(), ok=bool(generated_text), **call)
+
+    def _generate_streamed(self, prompt: str, system_message: str, format_json: bool, options: dict, cache_key: str,
+                           context: list = None, model_name: str = None, budget_seconds: float = None) -> str:
+        """Collects generate_stream() output, salvaging partial text if the stream fails (but not if the budget ran out)."""
+        model_name = model_name or self.model_name
+        print(f"    Streaming prompt to Ollama (model: {model_name})...")
+        chunks = []
+        metrics = {}
+        try:
+            for chunk in self.generate_stream(prompt, system_message=system_message, format_json=format_json,
+                                              options=options, metrics=metrics, context=context, model_name=model_name,
+                                              budget_seconds=budget_seconds):
+                chunks.append(chunk)
+        except GenerationBudgetExceeded:
+            raise
+        except requests.exceptions.Timeout:
+            print(f"      ERROR: Ollama stream stalled (no data for {config.OLLAMA_STREAM_INACTIVITY_TIMEOUT} seconds).")
+        except requests.exceptions.RequestException as e:
+            print(f"      ERROR: Ollama stream failed: {e}")
+        except Exception as e:
+            print(f"      ERROR: An unexpected error occurred during Ollama streaming: {e}")
+        return self._collect_stream(chunks, metrics, cache_key, model_name)
+
+    def generate_stream(self, prompt: str, system_message: str = None, format_json: bool = False, options: dict = None,
+                        metrics: dict = None, context: list = None, model_name: str = None, budget_seconds: float = None):
+        """
+        Streams a generation from the Ollama API, yielding text chunks as NDJSON lines arrive.
+
+        The request uses a connect timeout plus an inactivity timeout
+        (config.OLLAMA_STREAM_INACTIVITY_TIMEOUT) between received data, so long
+        generations are never cut off while the model is still producing tokens.
+        Responses are not cached here; generate(stream=True) handles caching.
+
+        Args:
+            prompt (str): The main user prompt for the LLM.
+            system_message (str, optional): An optional system message.
+            format_json (bool): Whether to request JSON output format from Ollama.
+            options (dict, optional): Ollama model options, merged over DEFAULT_OPTIONS.
+            metrics (dict, optional): Filled in with 'time_to_first_token_s', 'total_time_s',
+                                      'chunk_count', 'eval_count', 'tokens_per_second', 'done',
+                                      'retries' and 'server' (Ollama's timing fields).
+                                      Also available afterwards as self.last_stream_metrics.
+            context (list, optional): Context token array of a primed PromptSession.
+            model_name (str, optional): Model for this request instead of the client's model.
+            budget_seconds (float, optional): Abandon the stream once it has run this long.
+
+        Yields:
+            str: Generated text chunks.
+
+        Raises:
+            requests.exceptions.RequestException: On connection failure, HTTP error or stalled stream.
+            GenerationBudgetExceeded: If `budget_seconds` ran out.
+        """
+        model_name = model_name or self.model_name
+        merged_options = {**self.DEFAULT_OPTIONS, **(options or {})}
+        payload = self._build_payload(prompt, system_message, format_json, merged_options, stream=True, context=context,
+                                      model_name=model_name)
+        metrics = self._start_stream_metrics(metrics)
+        start = time.perf_counter()
+        error = None
+        endpoint, failure = None, None
+        call = {}
+        read_timeout = config.OLLAMA_STREAM_INACTIVITY_TIMEOUT
+        if budget_seconds is not None: read_timeout = min(read_timeout, budget_seconds)
+        deadline = None
+        try:
+            with self._request_slot():
+                # The budget excludes waiting for a request slot
+                if budget_seconds is not None: deadline = time.perf_counter() + budget_seconds
+                response, endpoint = self._post_generate(payload, (config.OLLAMA_CONNECT_TIMEOUT, read_timeout),
+                                                         stream=True, call=call, deadline=deadline)
+                metrics["retries"] = call["retries"]
+                with response:
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if deadline is not None and time.perf_counter() > deadline:
+                            raise GenerationBudgetExceeded(f"'{model_name}' did not finish within {budget_seconds}s")
+                        if not line: continue
+                        data = json.loads(line)
+                        if data.get('error'):
+                            raise requests.exceptions.RequestException(f"Ollama stream error: {data['error']}")
+                        chunk = self._stream_chunk(data, metrics, start)
+                        if chunk: yield chunk
+                        if metrics["done"]: break
+        except GenerationBudgetExceeded as e:
+            error, failure = "latency budget exceeded", e
+            raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if deadline is None or time.perf_counter() < deadline:
+                error, failure = f"{type(e).__name__}: {e}", e
+                raise
+            error = "latency budget exceeded" # A read timeout mid-stream
+            failure = GenerationBudgetExceeded(f"'{model_name}' did not finish within {budget_seconds}s")
+            raise failure from e
+        except Exception as e:
+            error, failure = f"{type(e).__name__}: {e}", e
+            raise
+        finally:
+            self._release_endpoint(endpoint, start, failure)
+            self._finish_stream(metrics, start, model_name, error)
 
 
 # --- Example Usage (if run directly) ---
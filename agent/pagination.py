@@ -0,0 +1,307 @@
+# agent/pagination.py
+import copy
+import math
+from docx.enum.text import WD_LINE_SPACING
+from docx.oxml.ns import qn
+from docx.shared import Pt, Emu
+
+_ROMAN_NUMERALS = ((1000, "m"), (900, "cm"), (500, "d"), (400, "cd"), (100, "c"), (90, "xc"),
+                   (50, "l"), (40, "xl"), (10, "x"), (9, "ix"), (5, "v"), (4, "iv"), (1, "i"))
+
+def to_roman(number: int, upper: bool = False) -> str:
+    """Converts a positive integer to a roman numeral (lower case unless upper=True)."""
+    parts = []
+    for value, numeral in _ROMAN_NUMERALS:
+        count, number = divmod(number, value)
+        parts.append(numeral * count)
+    roman = "".join(parts)
+    return roman.upper() if upper else roman
+
+def format_page_number(number: int, style: str) -> str:
+    """Formats a page number the way the PAGE field switches in DocumentFormatter do."""
+    if style == 'roman_lower': return to_roman(number)
+    if style == 'roman_upper': return to_roman(number, upper=True)
+    return str(number)
+
+class PaginationEstimator:
+    """
+    Estimates page breaks without a layout engine.
+
+    Content is fed in document order (paragraphs, fixed-height blocks, page and
+    section breaks) and every feed returns the absolute page (1-based) on which
+    that content starts. Line counts come from an average character width for the
+    font size; line height is the font size times Word's single-line factor,
+    scaled by the paragraph's line spacing. Widow control and keep-with-next are
+    approximated by requiring room for two lines.
+
+    The result is an estimate: it matches Word for the regular, mostly text
+    documents this agent produces, and may be off by a page on dense layouts.
+    """
+    AVG_CHAR_WIDTH_EM = 0.45 # Average glyph width incl. spaces, as a fraction of the font size (Times New Roman prose)
+    SINGLE_LINE_FACTOR = 1.15 # Height of a single-spaced line relative to the font size
+    TAB_WIDTH_CHARS = 4
+
+    def __init__(self, page_height, top_margin, bottom_margin, page_width, left_margin, right_margin):
+        """
+        Args:
+            page_height, top_margin, bottom_margin, page_width, left_margin, right_margin:
+                Geometry of the first section (docx Length values / EMU).
+        """
+        self.page = 1
+        self.cursor = 0 # Height used on the current page, in EMU
+        self.set_geometry(page_height, top_margin, bottom_margin, page_width, left_margin, right_margin)
+
+    def set_geometry(self, page_height, top_margin, bottom_margin, page_width, left_margin, right_margin):
+        self.usable_height = max(int(page_height) - int(top_margin) - int(bottom_margin), int(Pt(72)))
+        self.usable_width = max(int(page_width) - int(left_margin) - int(right_margin), int(Pt(72)))
+
+    def line_height(self, font_size, line_spacing=1.0) -> int:
+        """Height of one line; line_spacing is a multiple (float) or an exact Length."""
+        if line_spacing is not None and not isinstance(line_spacing, float):
+            return int(line_spacing)
+        return int(int(font_size) * self.SINGLE_LINE_FACTOR * (line_spacing or 1.0))
+
+    def count_lines(self, text: str, font_size, indent=0) -> int:
+        """Number of lines a text wraps to in the usable width minus indentation."""
+        width = max(self.usable_width - int(indent), int(Pt(36)))
+        chars_per_line = max(int(width / (int(font_size) * self.AVG_CHAR_WIDTH_EM)), 1)
+        lines = 0
+        for segment in text.split("\n"):
+            length = len(segment) + segment.count("\t") * (self.TAB_WIDTH_CHARS - 1)
+            lines += max(1, math.ceil(length / chars_per_line))
+        return lines
+
+    def new_page(self):
+        self.page += 1
+        self.cursor = 0
+
+    def page_break(self):
+        """An explicit page break: following content starts on a new page."""
+        self.new_page()
+
+    def section_break(self, *geometry):
+        """A next-page section break, optionally switching to the new section's geometry."""
+        self.new_page()
+        if geometry: self.set_geometry(*geometry)
+
+    def add_block(self, height, space_before=0, space_after=0) -> int:
+        """Adds content that cannot split across pages (an image, a table row). Returns its page."""
+        before = int(space_before) if self.cursor else 0
+        if self.cursor and self.cursor + before + int(height) > self.usable_height:
+            self.new_page(); before = 0
+        page = self.page
+        self.cursor += before + int(height)
+        while self.cursor > self.usable_height: # Taller than a page
+            self.cursor -= self.usable_height; self.page += 1
+        self._add_space_after(space_after)
+        return page
+
+    def add_paragraph(self, lines: int, line_height: int, space_before=0, space_after=0, page_break_before=False,
+                      keep_together=False, keep_with_next=False, extra_height=0) -> int:
+        """
+        Adds a paragraph of `lines` lines (plus `extra_height`, e.g. inline pictures).
+
+        Returns:
+            int: The page on which the paragraph starts.
+        """
+        if page_break_before and self.cursor: self.new_page()
+        before = int(space_before) if self.cursor else 0 # Space before is suppressed at the top of a page
+        height = lines * line_height + int(extra_height)
+        # Minimum that must fit on this page: whole paragraph, or two lines (widow control / keep with next)
+        if keep_together or lines <= 2: minimum = height
+        else: minimum = 2 * line_height + int(extra_height)
+        if keep_with_next: minimum += 2 * line_height
+        if self.cursor and self.cursor + before + minimum > self.usable_height:
+            self.new_page(); before = 0
+        page = self.page
+        self.cursor += before
+        remaining = height
+        while self.cursor + remaining > self.usable_height:
+            fits = max((self.usable_height - self.cursor) // max(line_height, 1), 0) * line_height
+            remaining -= fits
+            self.new_page()
+            if fits == 0 and remaining > self.usable_height: # Oversized content; avoid looping forever
+                remaining -= self.usable_height
+        self.cursor += remaining
+        self._add_space_after(space_after)
+        return page
+
+    def _add_space_after(self, space_after):
+        self.cursor = min(self.cursor + int(space_after or 0), self.usable_height)
+
+class _ParagraphProps:
+    """Effective paragraph properties merged from direct formatting, style chain and doc defaults."""
+    __slots__ = ("space_before", "space_after", "line", "line_rule", "left", "right", "first_line",
+                 "page_break_before", "keep_together", "keep_with_next", "font_size")
+
+    def __init__(self):
+        for name in self.__slots__: setattr(self, name, None)
+
+    def fill_from(self, pPr=None, rPr=None, override: bool = False):
+        """Sets properties from a w:pPr / w:rPr element; only unset ones unless override is True."""
+        if pPr is not None:
+            values = {"space_before": pPr.spacing_before, "space_after": pPr.spacing_after, "line": pPr.spacing_line,
+                      "line_rule": pPr.spacing_lineRule, "left": pPr.ind_left, "right": pPr.ind_right,
+                      "first_line": pPr.first_line_indent, "page_break_before": pPr.pageBreakBefore_val,
+                      "keep_together": pPr.keepLines_val, "keep_with_next": pPr.keepNext_val}
+            for name, value in values.items():
+                if value is not None and (override or getattr(self, name) is None): setattr(self, name, value)
+        if rPr is not None and (override or self.font_size is None) and rPr.sz_val is not None:
+            self.font_size = rPr.sz_val
+        return self
+
+    def copy(self):
+        props = _ParagraphProps()
+        for name in self.__slots__: setattr(props, name, getattr(self, name))
+        return props
+
+    def line_spacing(self):
+        """Line spacing as a float multiple or an exact Length, like ParagraphFormat.line_spacing."""
+        if self.line is None: return 1.0
+        if self.line_rule in (None, WD_LINE_SPACING.MULTIPLE): return self.line / Pt(12)
+        return Emu(self.line)
+
+def _section_geometry(sectPr):
+    """(page_height, top, bottom, page_width, left, right) of a w:sectPr, with A4 / 1 inch fallbacks."""
+    def value(v, default): return v if v is not None else default
+    return (value(sectPr.page_height, Emu(10692000)), value(sectPr.top_margin, Emu(914400)),
+            value(sectPr.bottom_margin, Emu(914400)), value(sectPr.page_width, Emu(7560000)),
+            value(sectPr.left_margin, Emu(914400)), value(sectPr.right_margin, Emu(914400)))
+
+_QN = {name: qn(f'w:{name}') for name in ('p', 'tbl', 'tr', 'tc', 'r', 'br', 'type', 'sectPr', 'pPr', 'pStyle',
+                                            'val', 'rPr', 'sz', 't', 'tab')}
+_QN_EXTENT = qn('wp:extent')
+_DEFAULT_GEOMETRY = (Emu(10692000), Emu(914400), Emu(914400), Emu(7560000), Emu(914400), Emu(914400)) # A4, 1" margins
+
+class DocumentPageEstimator:
+    """
+    Feeds the body elements of a python-docx Document to a PaginationEstimator.
+
+    Each paragraph's spacing, indentation and font size are resolved from its
+    direct formatting, its paragraph style chain and the document defaults
+    (style lookups are cached). Tables are estimated row by row; inline pictures
+    add their height. Elements must be fed in document order; they may be removed
+    from the body afterwards, which lets a streaming writer estimate pages while
+    flushing content to disk.
+    """
+    def __init__(self, document):
+        styles_element = document.styles.element
+        self._defaults = _ParagraphProps()
+        doc_defaults = styles_element.find(qn('w:docDefaults'))
+        if doc_defaults is not None:
+            self._defaults.fill_from(doc_defaults.find(qn('w:pPrDefault') + '/' + qn('w:pPr')),
+                                     doc_defaults.find(qn('w:rPrDefault') + '/' + qn('w:rPr')))
+        if self._defaults.font_size is None: self._defaults.font_size = Pt(11)
+        self._style_elements = {s.styleId: s for s in styles_element.findall(qn('w:style'))
+                                if s.get(qn('w:type')) == 'paragraph'}
+        self._default_style_id = next((sid for sid, s in self._style_elements.items()
+                                       if s.get(qn('w:default')) in ('1', 'true')), None)
+        self._resolved_styles = {}
+
+        self.body = document.element.body
+        first_sectPr = self.body.find(_QN['p'] + '/' + _QN['pPr'] + '/' + _QN['sectPr'])
+        if first_sectPr is None: first_sectPr = self.body.find(_QN['sectPr'])
+        self.layout = PaginationEstimator(*(_section_geometry(first_sectPr) if first_sectPr is not None else _DEFAULT_GEOMETRY))
+        self.section_index = 0
+        self.section_start_pages = [1] # First absolute page of each section
+
+    def fork(self) -> "DocumentPageEstimator":
+        """Copy of the current position that can be fed further without affecting this one."""
+        forked = copy.copy(self)
+        forked.layout = copy.copy(self.layout)
+        forked.section_start_pages = list(self.section_start_pages)
+        return forked
+
+    def _style_props(self, style_id) -> "_ParagraphProps":
+        props = self._resolved_styles.get(style_id)
+        if props is not None: return props
+        props, seen, current = _ParagraphProps(), set(), self._style_elements.get(style_id)
+        while current is not None and current.styleId not in seen: # Walk the basedOn chain
+            seen.add(current.styleId)
+            props.fill_from(current.pPr, current.rPr)
+            based_on = current.basedOn_val
+            current = self._style_elements.get(based_on) if based_on else None
+        for name in _ParagraphProps.__slots__: # Document defaults last
+            if getattr(props, name) is None: setattr(props, name, getattr(self._defaults, name))
+        self._resolved_styles[style_id] = props
+        return props
+
+    def feed(self, element):
+        """
+        Lays out one body element.
+
+        Returns:
+            tuple: (section_index, absolute_page) where a paragraph starts, 1-based pages
+                   counted from the start of the document; None for other elements.
+        """
+        layout = self.layout
+        if element.tag == _QN['tbl']:
+            _add_table(layout, element, self._style_props(self._default_style_id)); return None
+        if element.tag != _QN['p']: return None
+
+        pPr = element.find(_QN['pPr'])
+        style_element = pPr.find(_QN['pStyle']) if pPr is not None else None
+        props = self._style_props(style_element.get(_QN['val']) if style_element is not None else self._default_style_id)
+        if pPr is not None and len(pPr) > (style_element is not None): # Direct formatting beyond the style reference
+            props = props.copy().fill_from(pPr, override=True)
+        run_sizes = [int(sz.get(_QN['val'])) * 6350 for sz in element.iterfind(_QN['r'] + '/' + _QN['rPr'] + '/' + _QN['sz'])] # Half-points to EMU
+        font_size = max(run_sizes) if run_sizes else props.font_size
+        page_breaks = [br for br in element.iter(_QN['br']) if br.get(_QN['type']) == 'page']
+        text = _element_text(element)
+        picture_height = sum(int(extent.get('cy', 0)) for extent in element.iter(_QN_EXTENT))
+
+        if page_breaks and not text.strip() and not picture_height:
+            position = (self.section_index, layout.page) # A bare page-break paragraph
+            layout.page_break()
+        else:
+            line_height = layout.line_height(font_size, props.line_spacing())
+            indent = int(props.left or 0) + int(props.right or 0)
+            lines = layout.count_lines(text, font_size, indent) if (text or not picture_height) else 0
+            position = (self.section_index, layout.add_paragraph(
+                lines, line_height, props.space_before or 0, props.space_after or 0,
+                page_break_before=bool(props.page_break_before), keep_together=bool(props.keep_together),
+                keep_with_next=bool(props.keep_with_next), extra_height=picture_height))
+            for _ in page_breaks: layout.page_break()
+
+        if pPr is not None and pPr.find(_QN['sectPr']) is not None: # Paragraph ends a section
+            # The next section is described by the next section-ending paragraph, or the body's final sectPr
+            next_sectPr = next((p.find(_QN['pPr'] + '/' + _QN['sectPr']) for p in element.itersiblings(_QN['p'])
+                                if p.find(_QN['pPr'] + '/' + _QN['sectPr']) is not None), None)
+            if next_sectPr is None: next_sectPr = self.body.find(_QN['sectPr'])
+            self.section_index += 1
+            if next_sectPr is not None: layout.section_break(*_section_geometry(next_sectPr))
+            else: layout.section_break()
+            self.section_start_pages.append(layout.page)
+        return position
+
+def estimate_document_pages(document) -> dict:
+    """
+    Estimates the page of every top-level body paragraph of a python-docx Document.
+
+    Returns:
+        dict: {paragraph element: (section_index, absolute_page)}; pages are 1-based
+              and count from the first page of the document.
+    """
+    estimator = DocumentPageEstimator(document)
+    pages = {}
+    for element in estimator.body.iterchildren():
+        position = estimator.feed(element)
+        if position is not None: pages[element] = position
+    return pages
+
+def _element_text(element) -> str:
+    """Visible text of an element, with each w:tab counted as a tab character."""
+    return "".join(t.text or "" for t in element.iter(_QN['t'])) + "\t" * sum(1 for _ in element.iter(_QN['tab']))
+
+def _add_table(estimator: PaginationEstimator, tbl, props: _ParagraphProps):
+    """Feeds a w:tbl to the estimator one row at a time (rows do not split)."""
+    font_size = props.font_size or Pt(11)
+    line_height = estimator.line_height(font_size, 1.0)
+    for tr in tbl.iterchildren(_QN['tr']):
+        cells = list(tr.iterchildren(_QN['tc']))
+        if not cells: continue
+        column_indent = estimator.usable_width - estimator.usable_width // len(cells)
+        row_lines = max(sum(estimator.count_lines(_element_text(p), font_size, column_indent)
+                            for p in tc.iterchildren(_QN['p'])) or 1 for tc in cells)
+        estimator.add_block(row_lines * line_height + int(Pt(4))) # Plus default cell margins
+    estimator.add_block(0, space_after=line_height)
@@ -1,10 +1,16 @@
 # agent/report_builder.py
+import asyncio
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
 import config # For DOC_SYNOPSIS, DOC_REPORT constants etc.
 from .guideline_manager import GuidelineManager
 from .content_generator import ContentGenerator
 from .document_formatter import DocumentFormatter
+from .build_manifest import BuildManifest
+from .build_trace import BuildTrace, trace_section
+from .ollama_client import PartialResponse
 # No need for InputParser here, data comes pre-parsed
 
 class ReportBuilder:
@@ -41,7 +47,9 @@ class ReportBuilder:
     def __init__(self, guideline_manager: GuidelineManager,
                  content_generator: ContentGenerator,
                  document_formatter: DocumentFormatter,
-                 output_dir: str = config.OUTPUT_DIR):
+                 output_dir: str = config.OUTPUT_DIR,
+                 incremental: bool = None,
+                 trace_format: str = None):
         """
         Initializes the ReportBuilder.
 
@@ -50,48 +58,474 @@ class ReportBuilder:
             content_generator (ContentGenerator): Generates text content.
             document_formatter (DocumentFormatter): Formats and builds the DOCX.
             output_dir (str): Directory to save the final documents.
+            incremental (bool, optional): Reuse stored text for sections whose inputs did not
+                                          change since the last build (see BuildManifest).
+                                          Defaults to config.INCREMENTAL_BUILDS.
+            trace_format (str, optional): Export each build's BuildTrace next to the output as
+                                          'jsonl' or 'chrome'. Defaults to config.BUILD_TRACE_FORMAT.
         """
+        self.incremental = config.INCREMENTAL_BUILDS if incremental is None else incremental
         self.guideline_mgr = guideline_manager
         self.content_gen = content_generator
         self.formatter = document_formatter
         self.output_dir = Path(output_dir)
+        self.phase_timings = {} # doc_type -> {phase: seconds} of the most recent build of that type
+        self.trace_format = config.BUILD_TRACE_FORMAT if trace_format is None else trace_format
+        self.trace = None # BuildTrace of the build in progress
+        self.traces = {} # doc_type -> BuildTrace of the most recent build of that type
         print("    ReportBuilder initialized.")
 
-    def build(self, doc_type: str, project_data: dict):
+    def _get_body_sections(self, doc_type: str) -> list:
+        """Returns the body sections/chapters for the document type, in guideline order."""
+        # Report chapters come from its structure; 'References' in the synopsis order is left out
+        return self.guideline_mgr.get_body_sections(doc_type)
+
+    def _plan_generation(self, doc_type: str, body_sections: list) -> list:
         """
-        Builds the specified document type (synopsis or report).
+        Lists every LLM-generated section needed for the document.
+
+        Returns:
+            list: (section_name, generator_method_name, args) tuples. The method name
+                  is None for body sections without a mapped generator.
+        """
+        jobs = []
+        if doc_type == config.DOC_REPORT:
+            jobs.append(("Acknowledgement", "generate_acknowledgement", ()))
+            jobs.append(("Abstract", "generate_abstract", ()))
+        for section_name in body_sections:
+            jobs.append((section_name, self.SECTION_GENERATOR_MAP.get(section_name), (doc_type,)))
+        return jobs
+
+    @staticmethod
+    def _job_doc_type(args: tuple) -> str:
+        """Doc type a planned job's prompt is written for; front matter generators (no args) use report wording."""
+        return args[0] if args else config.DOC_REPORT
+
+    @staticmethod
+    def _is_placeholder(section_name: str, text: str) -> bool:
+        return (not text or text == ContentGenerator.PLACEHOLDER_TEMPLATE.format(section_name=section_name)
+                or text.startswith("[Placeholder content for"))
+
+    def _reuse_unchanged_sections(self, manifest: BuildManifest, jobs: list, project_data: dict, derived_names=(),
+                                  json_strategy: bool = False) -> tuple:
+        """
+        Splits planned jobs into sections reusable from the previous build and sections to generate.
 
         Args:
-            doc_type (str): config.DOC_SYNOPSIS or config.DOC_REPORT.
-            project_data (dict): Parsed data from the input YAML file.
+            manifest (BuildManifest): The document's manifest from the previous build.
+            jobs (list): Planned (section_name, method_name, args) jobs.
+            project_data (dict): Parsed project data.
+            derived_names: Sections that will be derived from another document's variant
+                           (combined builds); their fingerprint is kept separate.
+            json_strategy (bool): Sections are generated with the 'json' strategy (kept separate too).
+
+        Returns:
+            tuple: (reused contents dict, jobs still to generate, {section_name: (fingerprint, dependencies)})
+        """
+        reused, remaining, fingerprints = {}, [], {}
+        for job in jobs:
+            section_name, _, args = job
+            try:
+                fingerprint, dependencies = self.content_gen.get_section_fingerprint(
+                    section_name, self._job_doc_type(args), project_data,
+                    section_class='json' if json_strategy and section_name not in derived_names else None)
+            except Exception as e:
+                print(f"      Warning: Could not fingerprint '{section_name}': {e}")
+                remaining.append(job); continue
+            if section_name in derived_names:
+                fingerprint = f"{fingerprint}:derived:{config.COMBINED_SHARED_SECTION_MODE}"
+            elif json_strategy:
+                fingerprint = f"{fingerprint}:json"
+            fingerprints[section_name] = (fingerprint, dependencies)
+            if self.incremental:
+                stored_text = manifest.lookup(section_name, fingerprint)
+                if stored_text:
+                    print(f"      Reusing '{section_name}' from previous build (inputs unchanged).")
+                    reused[section_name] = stored_text
+                    continue
+                if section_name in manifest.sections:
+                    changed = manifest.changed_fields(section_name, dependencies)
+                    print(f"      Regenerating '{section_name}' (changed: {', '.join(changed) if changed else 'prompt/model'}).")
+            remaining.append(job)
+        return reused, remaining, fingerprints
+
+    def _save_manifest(self, manifest: BuildManifest, contents: dict, fingerprints: dict):
+        """
+        Records successfully generated sections and writes the manifest next to the output.
+        Placeholders and responses that broke off before Ollama finished them (PartialResponse)
+        are not recorded, so the next incremental build generates them again.
+        """
+        for section_name, (fingerprint, dependencies) in fingerprints.items():
+            text = contents.get(section_name)
+            if isinstance(text, PartialResponse):
+                print(f"      '{section_name}' is incomplete; not recording it for reuse.")
+            elif not self._is_placeholder(section_name, text):
+                manifest.record(section_name, fingerprint, dependencies, text)
+        try:
+            manifest.save()
+        except OSError as e:
+            print(f"    Warning: Could not save build manifest {manifest.path}: {e}")
+
+    def _generate_one(self, section_name: str, generator_method_name: str, args: tuple, doc_type: str, project_data: dict) -> str:
+        """Runs a single planned generation job, falling back to placeholder text on failure."""
+        with trace_section(self.trace, self._trace_label(section_name, doc_type)):
+            try:
+                if generator_method_name and hasattr(self.content_gen, generator_method_name):
+                    generator_func = getattr(self.content_gen, generator_method_name)
+                    return generator_func(*args, project_data)
+                print(f"      Warning: No specific generator method found for '{section_name}'. Using generic fallback.")
+                section_content = self.content_gen.generate_section(section_name, doc_type, project_data)
+                if not section_content or "[Content" in section_content : # Check if fallback also failed
+                     section_content = f"[Placeholder content for {section_name}. Generation failed or method not mapped.]"
+                return section_content
+            except Exception as e:
+                print(f"      ERROR: Generation failed for '{section_name}': {e}")
+                return ContentGenerator.PLACEHOLDER_TEMPLATE.format(section_name=section_name)
+
+    @staticmethod
+    def _uses_json_strategy(doc_type: str) -> bool:
+        return config.GENERATION_STRATEGY.get(doc_type, 'sections') == 'json'
+
+    def _json_label(self, jobs: list, doc_type: str) -> str:
+        return self._trace_label(f"{len(jobs)} sections (JSON)", doc_type)
+
+    def _json_remaining(self, jobs: list, contents: dict) -> list:
+        """Jobs a JSON-mode request did not deliver; they are generated one by one."""
+        remaining = [job for job in jobs if job[0] not in contents]
+        if remaining: print(f"    Generating {len(remaining)} section(s) missing from the JSON response individually.")
+        return remaining
+
+    def _generate_contents(self, jobs: list, doc_type: str, project_data: dict) -> dict:
         """
+        Sends all planned section prompts up front through a bounded worker pool
+        (after a single JSON-mode request for all of them with the 'json' strategy).
+
+        Returns:
+            dict: Generated text keyed by section name.
+        """
+        contents = {}
+        if len(jobs) > 1 and self._uses_json_strategy(doc_type):
+            with trace_section(self.trace, self._json_label(jobs, doc_type)):
+                contents = self.content_gen.generate_sections_json([job[0] for job in jobs], doc_type, project_data)
+            jobs = self._json_remaining(jobs, contents)
+            if not jobs: return contents
+        max_workers = max(1, min(config.MAX_GENERATION_WORKERS, len(jobs) or 1))
+        print(f"    Generating {len(jobs)} sections with up to {max_workers} concurrent requests...")
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="section-gen") as executor:
+            futures = {
+                executor.submit(self._generate_one, section_name, method_name, args, doc_type, project_data): section_name
+                for section_name, method_name, args in jobs
+            }
+            for future in as_completed(futures):
+                contents[futures[future]] = future.result()
+        return contents
+
+    async def _generate_one_async(self, section_name: str, generator_method_name: str, args: tuple, doc_type: str, project_data: dict) -> str:
+        """Async counterpart of _generate_one, using ContentGenerator.generate_section_async."""
+        section_doc_type = self._job_doc_type(args)
+        with trace_section(self.trace, self._trace_label(section_name, doc_type)):
+            try:
+                section_content = await self.content_gen.generate_section_async(section_name, section_doc_type, project_data)
+                if not generator_method_name and (not section_content or "[Content" in section_content):
+                    section_content = f"[Placeholder content for {section_name}. Generation failed or method not mapped.]"
+                return section_content
+            except Exception as e:
+                print(f"      ERROR: Generation failed for '{section_name}': {e}")
+                return ContentGenerator.PLACEHOLDER_TEMPLATE.format(section_name=section_name)
+
+    async def _generate_contents_async(self, jobs: list, doc_type: str, project_data: dict, deadline: float = None) -> dict:
+        """
+        Runs all planned section generations as tasks on the current event loop.
+
+        Concurrency is bounded by the AsyncOllamaClient semaphore. Sections still
+        running when `deadline` seconds have passed are cancelled and get placeholder
+        text. If this coroutine itself is cancelled, all outstanding generations are
+        cancelled before the cancellation propagates.
+        """
+        contents = {}
+        if len(jobs) > 1 and self._uses_json_strategy(doc_type):
+            json_start = time.perf_counter()
+            with trace_section(self.trace, self._json_label(jobs, doc_type)):
+                json_task = asyncio.ensure_future(
+                    self.content_gen.generate_sections_json_async([job[0] for job in jobs], doc_type, project_data))
+            try:
+                contents = await asyncio.wait_for(json_task, timeout=deadline)
+            except asyncio.TimeoutError:
+                print("    Warning: Deadline reached during the JSON request; using placeholders.")
+                return {name: ContentGenerator.PLACEHOLDER_TEMPLATE.format(section_name=name) for name, _, _ in jobs}
+            jobs = self._json_remaining(jobs, contents)
+            if not jobs: return contents
+            if deadline: deadline = max(deadline - (time.perf_counter() - json_start), 0.0)
+        print(f"    Generating {len(jobs)} sections asynchronously" + (f" (deadline {deadline}s)..." if deadline else "..."))
+        tasks = {
+            asyncio.create_task(self._generate_one_async(section_name, method_name, args, doc_type, project_data)): section_name
+            for section_name, method_name, args in jobs
+        }
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=deadline) if tasks else (set(), set())
+        except asyncio.CancelledError:
+            for task in tasks: task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        if pending:
+            print(f"    Warning: Deadline reached; cancelling {len(pending)} unfinished sections.")
+            for task in pending: task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        for task, section_name in tasks.items():
+            if task in done and not task.cancelled() and task.exception() is None:
+                contents[section_name] = task.result()
+            else:
+                contents[section_name] = ContentGenerator.PLACEHOLDER_TEMPLATE.format(section_name=section_name)
+        return contents
+
+    def _phase_timer(self, doc_type: str):
+        """
+        Returns mark(phase), which records the seconds since the previous mark (or since
+        this call) as phase_timings[doc_type][phase] and in the build trace.
+        """
+        timings = self.phase_timings.setdefault(doc_type, {})
+        last = [time.perf_counter()]
+        def mark(phase: str):
+            now = time.perf_counter()
+            timings[phase] = round(now - last[0], 4)
+            if self.trace: self.trace.add_phase(phase, last[0], now, doc_type)
+            last[0] = now
+        return mark
+
+    def _start_trace(self, doc_types: list, project_data: dict) -> BuildTrace:
+        """Starts the BuildTrace that LLM calls and phases of this build are recorded in."""
+        roll_number = project_data.get('roll_number', 'UnknownRollNo')
+        prefix = doc_types[0].capitalize() if len(doc_types) == 1 else "Combined"
+        self.trace = BuildTrace(f"{prefix}_{roll_number}", "+".join(doc_types))
+        for doc_type in doc_types: self.traces[doc_type] = self.trace
+        return self.trace
+
+    def _trace_label(self, section_name: str, doc_type: str) -> str:
+        """Section label for trace events; combined builds add the document type."""
+        if self.trace is None or self.trace.doc_type == doc_type: return section_name
+        return f"{section_name} [{doc_type}]"
+
+    def _finish_trace(self):
+        """Prints the trace summary and exports the trace if a format is configured."""
+        trace = self.trace
+        if trace is None: return
+        trace.print_summary()
+        if self.trace_format:
+            try:
+                path = trace.export(self.output_dir / trace.name, self.trace_format)
+                print(f"    Build trace written to: {path}")
+            except (OSError, ValueError) as e:
+                print(f"    Warning: Could not write build trace: {e}")
+
+    def _start_build(self, doc_type: str, project_data: dict) -> bool:
+        """Prints the build header and validates the document type."""
         print(f"\n--- Starting build process for: {doc_type.upper()} ---")
         if doc_type not in [config.DOC_SYNOPSIS, config.DOC_REPORT]:
             print(f"    ERROR: Invalid document type '{doc_type}'. Cannot build.")
-            return
+            return False
 
         # --- 1. Preparation ---
         # Extract key info for filename etc.
-        roll_number = project_data.get('roll_number', 'UnknownRollNo')
         print(f"    Project Title: {project_data.get('project_title', 'N/A')}")
-        print(f"    Student Roll No: {roll_number}")
+        print(f"    Student Roll No: {project_data.get('roll_number', 'UnknownRollNo')}")
+        return True
 
-        # Create the base document (resets formatter tracking, applies margins)
-        self.formatter.create_document(doc_type)
+    def _begin_build(self, doc_type: str, project_data: dict) -> dict:
+        """
+        First half of build() and build_async(), up to content generation: starts the trace
+        and phase timer, plans the sections and splits off those reusable from the previous build.
 
-        # --- 2. Build Front Matter ---
-        print("\n    [Phase 1: Building Front Matter]")
-        self.formatter.add_title_page(doc_type, project_data)
+        Returns:
+            dict: The build plan ('body_sections', 'manifest', 'jobs' to generate, 'reused'
+                  contents, 'fingerprints', 'mark_phase'), or None if the document type is invalid.
+        """
+        if not self._start_build(doc_type, project_data): return None
+        self.phase_timings[doc_type] = {}
+        self._start_trace([doc_type], project_data)
+        mark_phase = self._phase_timer(doc_type)
 
-        if doc_type == config.DOC_REPORT:
-            self.formatter.add_declaration(project_data)
+        # --- 2. Generate all LLM content ---
+        print("\n    [Phase 0: Generating Section Content]")
+        body_sections = self._get_body_sections(doc_type)
+        manifest = BuildManifest.for_output(self.output_dir, doc_type, project_data.get('roll_number', 'UnknownRollNo'))
+        planned_jobs = self._plan_generation(doc_type, body_sections)
+        self.content_gen.report_generation_budgets(doc_type, [job[0] for job in planned_jobs])
+        reused, jobs, fingerprints = self._reuse_unchanged_sections(manifest, planned_jobs, project_data,
+                                                                    json_strategy=self._uses_json_strategy(doc_type))
+        return {"body_sections": body_sections, "manifest": manifest, "jobs": jobs, "reused": reused,
+                "fingerprints": fingerprints, "mark_phase": mark_phase}
 
-            # Generate and add Acknowledgement & Abstract
-            ack_text = self.content_gen.generate_acknowledgement(project_data)
-            self.formatter.add_acknowledgement(ack_text, doc_type)
+    def _finish_build(self, doc_type: str, project_data: dict, plan: dict, contents: dict) -> Path:
+        """Second half of build() and build_async(): assembles the DOCX from the generated and reused contents."""
+        contents.update(plan["reused"])
+        plan["mark_phase"]("generate")
 
-            abs_text = self.content_gen.generate_abstract(project_data)
-            self.formatter.add_abstract(abs_text, doc_type)
+        output_path = self._assemble(doc_type, project_data, plan["body_sections"], contents)
+        self._save_manifest(plan["manifest"], contents, plan["fingerprints"])
+        self._finish_trace()
+        return output_path
+
+    def build(self, doc_type: str, project_data: dict):
+        """
+        Builds the specified document type (synopsis or report).
+
+        All LLM content is generated first (concurrently), then the DOCX is
+        assembled in the order given by GuidelineManager.
+
+        Args:
+            doc_type (str): config.DOC_SYNOPSIS or config.DOC_REPORT.
+            project_data (dict): Parsed data from the input YAML file.
+
+        Returns:
+            Path: The output file path, or None if the document type is invalid.
+        """
+        plan = self._begin_build(doc_type, project_data)
+        if plan is None: return None
+        contents = self._generate_contents(plan["jobs"], doc_type, project_data)
+        return self._finish_build(doc_type, project_data, plan, contents)
+
+    async def build_async(self, doc_type: str, project_data: dict, deadline: float = None):
+        """
+        Async variant of build(). Requires the ContentGenerator to have an async_client.
+
+        Several builds can run on one event loop, each with its own ReportBuilder
+        and DocumentFormatter, sharing one AsyncOllamaClient.
+
+        Args:
+            doc_type (str): config.DOC_SYNOPSIS or config.DOC_REPORT.
+            project_data (dict): Parsed data from the input YAML file.
+            deadline (float, optional): Seconds allowed for content generation; unfinished
+                                        sections are cancelled and replaced by placeholders.
+
+        Returns:
+            Path: The output file path, or None if the document type is invalid.
+        """
+        plan = self._begin_build(doc_type, project_data)
+        if plan is None: return None
+        contents = await self._generate_contents_async(plan["jobs"], doc_type, project_data, deadline)
+        return self._finish_build(doc_type, project_data, plan, contents)
+
+    def _condense_or_generate(self, section_name: str, source_text: str, doc_type: str, project_data: dict) -> str:
+        """Derives a section from its longer variant, generating it directly if that fails."""
+        failed_source = not source_text or source_text == ContentGenerator.PLACEHOLDER_TEMPLATE.format(section_name=section_name)
+        if not failed_source and config.COMBINED_SHARED_SECTION_MODE == 'reuse':
+            return source_text
+        if not failed_source:
+            try:
+                with trace_section(self.trace, f"{self._trace_label(section_name, doc_type)} (condensed)"):
+                    condensed = self.content_gen.condense_section(section_name, source_text, doc_type, project_data)
+                if condensed: return condensed
+            except Exception as e:
+                print(f"      ERROR: Condensing '{section_name}' failed: {e}")
+            print(f"      Warning: Could not condense '{section_name}'; generating the {doc_type} variant directly.")
+        return self._generate_one(section_name, self.SECTION_GENERATOR_MAP.get(section_name), (doc_type,), doc_type, project_data)
+
+    def build_combined(self, project_data: dict, doc_types: tuple = (config.DOC_REPORT, config.DOC_SYNOPSIS)) -> dict:
+        """
+        Builds several document types in one run, sharing section generation.
+
+        Body sections that appear in more than one document (e.g. "Introduction")
+        are generated once for the longest document (the report) and the shorter
+        variants are derived with a condensation call as soon as that finishes
+        (config.COMBINED_SHARED_SECTION_MODE='reuse' copies the text instead).
+        Everything else is generated concurrently as in build(), then each DOCX
+        is assembled from the shared results.
+
+        Args:
+            project_data (dict): Parsed data from the input YAML file.
+            doc_types (tuple): Document types to build.
+
+        Returns:
+            dict: Output path per document type. If assembling one document fails,
+                  its value is the exception and the remaining documents are still built.
+        """
+        doc_types = [d for d in (config.DOC_REPORT, config.DOC_SYNOPSIS) if d in doc_types] # Longest document first
+        print(f"\n--- Starting combined build for: {', '.join(d.upper() for d in doc_types)} ---")
+        for doc_type in doc_types:
+            if not self._start_build(doc_type, project_data): return {}
+        self._start_trace(doc_types, project_data)
+        generation_start = time.perf_counter()
+
+        print(f"\n    [Phase 0: Generating Section Content ({' + '.join(doc_types)})]")
+        body_sections = {doc_type: self._get_body_sections(doc_type) for doc_type in doc_types}
+        roll_number = project_data.get('roll_number', 'UnknownRollNo')
+        manifests = {doc_type: BuildManifest.for_output(self.output_dir, doc_type, roll_number) for doc_type in doc_types}
+        contents, fingerprints = {}, {}
+        jobs = [] # (doc_type, section_name, method_name, args)
+        derived = {} # source (doc_type, section_name) -> doc_types derived from it
+        planned_body = {} # section_name -> doc_type it is generated for
+        for doc_type in doc_types:
+            doc_jobs = self._plan_generation(doc_type, body_sections[doc_type])
+            self.content_gen.report_generation_budgets(doc_type, [name for name, _, _ in doc_jobs])
+            # Body sections already planned for a longer document are derived from it
+            derived_names = {name for name, _, args in doc_jobs if args and name in planned_body}
+            contents[doc_type], remaining, fingerprints[doc_type] = self._reuse_unchanged_sections(
+                manifests[doc_type], doc_jobs, project_data, derived_names)
+            for section_name, method_name, args in remaining:
+                if section_name in derived_names:
+                    derived.setdefault((planned_body[section_name], section_name), []).append(doc_type)
+                else:
+                    jobs.append((doc_type, section_name, method_name, args))
+            for section_name, _, args in doc_jobs:
+                if args: planned_body.setdefault(section_name, doc_type)
+        shared_count = sum(len(v) for v in derived.values())
+        max_workers = max(1, min(config.MAX_GENERATION_WORKERS, len(jobs) or 1))
+        print(f"    Generating {len(jobs)} sections ({shared_count} shared sections derived) with up to {max_workers} concurrent requests...")
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="section-gen") as executor:
+            futures = {}
+            def derive_from(source_doc_type, section_name):
+                # Derive the shorter variants as soon as their source section is ready
+                for target_doc_type in derived.get((source_doc_type, section_name), []):
+                    follow_up = executor.submit(self._condense_or_generate, section_name, contents[source_doc_type][section_name],
+                                                target_doc_type, project_data)
+                    futures[follow_up] = (target_doc_type, section_name)
+            for doc_type, section_name, method_name, args in jobs:
+                futures[executor.submit(self._generate_one, section_name, method_name, args, doc_type, project_data)] = (doc_type, section_name)
+            for source_doc_type, section_name in derived:
+                if section_name in contents[source_doc_type]: # Source reused from the previous build
+                    derive_from(source_doc_type, section_name)
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    doc_type, section_name = futures[future]
+                    contents[doc_type][section_name] = future.result()
+                    known = set(futures)
+                    derive_from(doc_type, section_name)
+                    pending |= set(futures) - known
+
+        generation_seconds = round(time.perf_counter() - generation_start, 4)
+        self.trace.add_phase("generate", generation_start, generation_start + generation_seconds)
+        outputs = {}
+        for doc_type in doc_types:
+            self.phase_timings[doc_type] = {"generate": generation_seconds} # Shared by all documents
+            try:
+                outputs[doc_type] = self._assemble(doc_type, project_data, body_sections[doc_type], contents[doc_type])
+                self._save_manifest(manifests[doc_type], contents[doc_type], fingerprints[doc_type])
+            except Exception as e:
+                print(f"    ERROR: Assembling {doc_type} failed: {e}")
+                import traceback; traceback.print_exc()
+                outputs[doc_type] = e
+        self._finish_trace()
+        return outputs
+
+    def _assemble(self, doc_type: str, project_data: dict, body_sections: list, contents: dict) -> Path:
+        """Assembles and saves the DOCX from already generated section contents. Returns the output path."""
+        roll_number = project_data.get('roll_number', 'UnknownRollNo')
+        mark_phase = self._phase_timer(doc_type)
+
+        # --- 3. Build Front Matter ---
+        print("\n    [Phase 1: Building Front Matter]")
+        # Creates the base document (resets formatter tracking, applies margins) with the
+        # title page and, for reports, the declaration - cloned from a cached skeleton
+        self.formatter.start_document(doc_type, project_data)
+
+        if doc_type == config.DOC_REPORT:
+            # Add the generated Acknowledgement & Abstract
+            self.formatter.add_acknowledgement(contents.get("Acknowledgement"), doc_type)
+            self.formatter.add_abstract(contents.get("Abstract"), doc_type)
 
             # Insert Placeholders for dynamic lists
             self.formatter.insert_toc_placeholder(doc_type)
@@ -104,18 +538,10 @@ class ReportBuilder:
             # This allows restarting page numbering with Arabic numerals.
             print("    Adding Section Break between Front Matter and Body...")
             self.formatter.add_section_break()
+        mark_phase("front_matter")
 
-        # --- 3. Build Body Content ---
+        # --- 4. Build Body Content ---
         print("\n    [Phase 2: Building Body Content]")
-        body_sections = []
-        if doc_type == config.DOC_REPORT:
-            structure = self.guideline_mgr.get_report_structure()
-            body_sections = structure.get('body_chapters', [])
-        elif doc_type == config.DOC_SYNOPSIS:
-            body_sections = self.guideline_mgr.get_section_order(doc_type)
-             # Filter out non-body sections like 'References' if included in synopsis order
-            body_sections = [s for s in body_sections if s.lower() != 'references']
-
         if not body_sections:
              print("    Warning: No body sections/chapters defined in GuidelineManager. Skipping body content.")
         else:
@@ -128,21 +554,7 @@ class ReportBuilder:
                 # Add the heading using the formatter
                 self.formatter.add_heading(section_name, level, doc_type)
 
-                # Find the corresponding generator method name
-                generator_method_name = self.SECTION_GENERATOR_MAP.get(section_name)
-
-                if generator_method_name and hasattr(self.content_gen, generator_method_name):
-                    # Get the generator method
-                    generator_func = getattr(self.content_gen, generator_method_name)
-                    # Call the generator method
-                    section_content = generator_func(doc_type, project_data)
-                else:
-                    print(f"      Warning: No specific generator method found for '{section_name}'. Using generic fallback.")
-                    # Use a generic generator call or provide placeholder text
-                    section_content = self.content_gen.generate_section(section_name, doc_type, project_data)
-                    if not section_content or "[Content" in section_content : # Check if fallback also failed
-                         section_content = f"[Placeholder content for {section_name}. Generation failed or method not mapped.]"
-
+                section_content = contents.get(section_name) or ContentGenerator.PLACEHOLDER_TEMPLATE.format(section_name=section_name)
 
                 # Add the generated content to the document
                 # Use 'normal_text' style defined in GuidelineManager
@@ -161,7 +573,7 @@ class ReportBuilder:
                          sample_data = [['Metric', 'Value'], ['Accuracy', '90%'], ['Speed', 'Fast']]
                          self.formatter.add_table(sample_data, f"Summary of key results for {section_name}.", doc_type)
 
-        # --- 4. Build Back Matter ---
+        # --- 5. Build Back Matter ---
         print("\n    [Phase 3: Building Back Matter]")
         # Add References section heading
         ref_heading = "REFERENCES" if doc_type == config.DOC_REPORT else "References"
@@ -183,16 +595,23 @@ class ReportBuilder:
                 doc_type
             )
 
-        # --- 5. Finalize and Save ---
+        mark_phase("body") # Includes the back matter
+
+        # --- 6. Finalize and Save ---
         print("\n    [Phase 4: Finalizing Document]")
         # Generate TOC, LoF, LoT; Apply Page Numbering
         self.formatter.finalize_document()
+        mark_phase("finalize")
 
         # Construct filename
         filename_base = f"{doc_type.capitalize()}_{roll_number}"
         filename = self.output_dir / f"{filename_base}.docx"
 
         print(f"\n    Attempting to save final document to: {filename}")
-        self.formatter.save_document(str(filename))
+        if not self.formatter.save_document(str(filename)):
+            raise IOError(f"Failed to save document to {filename}")
+        mark_phase("save")
+        print("    Phase timings (s): " + ", ".join(f"{phase}={seconds}" for phase, seconds in self.phase_timings[doc_type].items()))
 
-        print(f"\n--- Build process finished for: {doc_type.upper()} ---")
\ No newline at end of file
+        print(f"\n--- Build process finished for: {doc_type.upper()} ---")
+        return filename
\ No newline at end of file
@@ -0,0 +1,122 @@
+# agent/response_cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+import config
+
+class ResponseCache:
+    """
+    Persistent on-disk cache of Ollama responses backed by SQLite.
+
+    Entries are keyed by a hash of everything that affects the generated text
+    (model, prompt, system message, options, JSON mode). Entries older than the
+    TTL are ignored, and the least recently used entries are evicted once the
+    cache holds more than `max_entries` responses.
+    """
+    DB_FILENAME = "llm_responses.sqlite3"
+
+    def __init__(self, cache_dir: str = None, max_entries: int = None, ttl_seconds: float = None):
+        """
+        Opens (or creates) the cache database.
+
+        Args:
+            cache_dir (str, optional): Directory for the SQLite file. Defaults to config.LLM_CACHE_DIR.
+            max_entries (int, optional): LRU size limit. Defaults to config.LLM_CACHE_MAX_ENTRIES.
+            ttl_seconds (float, optional): Entry lifetime; 0/None disables expiry.
+                                           Defaults to config.LLM_CACHE_TTL_SECONDS.
+        """
+        self.cache_dir = Path(cache_dir or config.LLM_CACHE_DIR)
+        self.max_entries = max_entries if max_entries is not None else config.LLM_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.LLM_CACHE_TTL_SECONDS
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / self.DB_FILENAME
+        # One connection shared by the section worker threads, serialized by a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL") # Lets several build processes share the file
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL,"
+                " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used)")
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str, system_message: str = None, options: dict = None, format_json: bool = False) -> str:
+        """Builds the cache key for a generate request."""
+        key_material = json.dumps(
+            {"model": model_name, "prompt": prompt, "system": system_message or "",
+             "options": options or {}, "format_json": bool(format_json)},
+            sort_keys=True, ensure_ascii=False,
+        )
+        return hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and (now - created_at) > self.ttl_seconds
+
+    def get(self, key: str):
+        """Returns the cached response for `key`, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if self._is_expired(created_at, now):
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            return response
+
+    def put(self, key: str, response: str, model_name: str = None):
+        """Stores a response and evicts least recently used entries beyond the size limit."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, response, now, now),
+            )
+            if self.max_entries and self.max_entries > 0:
+                count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                if count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+
+    def invalidate(self, key: str = None, model_name: str = None) -> int:
+        """
+        Removes cached entries.
+
+        Args:
+            key (str, optional): Remove only this entry.
+            model_name (str, optional): Remove all entries for this model.
+            With neither argument, the whole cache is cleared.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        with self._lock, self._conn:
+            if key is not None:
+                cursor = self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            elif model_name is not None:
+                cursor = self._conn.execute("DELETE FROM responses WHERE model = ?", (model_name,))
+            else:
+                cursor = self._conn.execute("DELETE FROM responses")
+            return cursor.rowcount
+
+    def purge_expired(self) -> int:
+        """Removes all entries older than the TTL. Returns the number removed."""
+        if not self.ttl_seconds:
+            return 0
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
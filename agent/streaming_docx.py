@@ -0,0 +1,172 @@
+# agent/streaming_docx.py
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+from lxml import etree
+from docx.oxml.ns import qn
+from .pagination import DocumentPageEstimator
+
+_BODY_MARKER = b"<!--streamed-body-->"
+_NS_DECLARATION = re.compile(rb' xmlns:(\w+)="([^"]*)"')
+
+class StreamingBodyWriter:
+    """
+    Keeps a python-docx Document's body small by spooling finished elements to disk.
+
+    Once the body holds more than `flush_threshold` elements, everything except the
+    newest `keep_recent` is serialized to a temporary spool file and removed from
+    the tree, so memory stays roughly constant however long the document gets.
+    save() then writes the package with word/document.xml assembled from the spool.
+
+    Some elements stay in the tree as "anchors" (with their position in the spool
+    recorded): paragraphs that end a section, because python-docx derives
+    Document.sections and footers from them, and elements registered with keep(),
+    such as the TOC/LoF/LoT placeholders. Elements inserted before an anchor later
+    on (list entries) are written just before it.
+
+    Pages are estimated as elements are flushed; positions of elements registered
+    with track() are written into their info dict ('page') and the dict's
+    'paragraph' proxy is dropped so the element can be freed.
+    """
+    def __init__(self, document, flush_threshold: int = 200, keep_recent: int = 16, spool_dir: str = None):
+        """
+        Args:
+            document (docx.Document): The document being built (body elements are removed as they are flushed).
+            flush_threshold (int): Body size that triggers a flush.
+            keep_recent (int): Newest elements left in the tree, since callers may still format them.
+            spool_dir (str, optional): Directory for the spool file. Defaults to the system temp dir.
+        """
+        self.document = document
+        self.body = document.element.body
+        self.flush_threshold = max(flush_threshold, keep_recent + 1)
+        self.keep_recent = keep_recent
+        self.spool = tempfile.TemporaryFile(prefix="docx_body_", suffix=".xml", dir=spool_dir)
+        self.page_estimator = DocumentPageEstimator(document)
+        self.anchors = [] # (element, spool offset before it), in document order
+        self._anchor_set = set()
+        self._keep = set()
+        self._tracked = {} # element -> info dict
+        self._root_namespaces = {prefix: uri.encode() for prefix, uri in document.element.nsmap.items() if prefix}
+        self.flushed_elements = 0
+
+    def keep(self, element):
+        """Keeps an element in the tree when it is flushed (e.g. a placeholder that is filled in later)."""
+        self._keep.add(element)
+
+    def track(self, element, info: dict):
+        """Records the estimated (section_index, page) of an element in info['page'] when it is flushed."""
+        self._tracked[element] = info
+
+    def maybe_flush(self):
+        """Flushes the older part of the body if it has grown past the threshold."""
+        if len(self.body) > self.flush_threshold: self.flush()
+
+    def flush(self, keep_recent: int = None):
+        """Spools all body elements except anchors, the final sectPr and the newest `keep_recent`."""
+        keep_recent = self.keep_recent if keep_recent is None else keep_recent
+        children = [child for child in self.body.iterchildren() if child not in self._anchor_set and child.tag != qn('w:sectPr')]
+        if keep_recent: children = children[:-keep_recent]
+        for element in children:
+            position = self.page_estimator.feed(element)
+            info = self._tracked.pop(element, None)
+            if info is not None:
+                info['page'] = position; info['paragraph'] = None
+            if element in self._keep or element.find(qn('w:pPr') + '/' + qn('w:sectPr')) is not None:
+                self.anchors.append((element, self.spool.tell()))
+                self._anchor_set.add(element)
+                continue
+            self.spool.write(self._serialize(element))
+            self.body.remove(element)
+            self.flushed_elements += 1
+
+    def estimate_pages(self) -> DocumentPageEstimator:
+        """
+        Estimates the pages of tracked elements still in the tree, without flushing.
+
+        Returns:
+            DocumentPageEstimator: A fork positioned after the last body element
+                                   (see its section_start_pages).
+        """
+        estimator = self.page_estimator.fork()
+        # Everything up to the last anchor was laid out when flushed; elements inserted before
+        # anchors since then (list entries) are front matter the estimate does not revisit
+        unflushed = self.body.iterchildren()
+        if self.anchors: unflushed = self.anchors[-1][0].itersiblings()
+        for element in unflushed:
+            position = estimator.feed(element)
+            info = self._tracked.get(element)
+            if info is not None: info['page'] = position
+        return estimator
+
+    def _serialize(self, element) -> bytes:
+        """Serializes a body element, dropping namespace declarations the document root already makes."""
+        xml = etree.tostring(element, encoding="UTF-8")
+        start_tag_end = xml.index(b">")
+        start_tag = _NS_DECLARATION.sub(
+            lambda m: b"" if self._root_namespaces.get(m.group(1).decode()) == m.group(2) else m.group(0), xml[:start_tag_end])
+        return start_tag + xml[start_tag_end:]
+
+    def _write_document_xml(self, out):
+        """Writes word/document.xml: spooled elements interleaved with the anchors and the in-memory tail."""
+        root = self.document.element
+        shell = etree.Element(root.tag, attrib=dict(root.attrib), nsmap=root.nsmap)
+        for child in root.iterchildren():
+            if child is self.body:
+                body = etree.SubElement(shell, qn('w:body'))
+                body.append(etree.Comment("streamed-body"))
+            else:
+                shell.append(etree.fromstring(etree.tostring(child)))
+        head, tail = etree.tostring(shell, encoding="UTF-8", standalone=True).split(_BODY_MARKER)
+        out.write(head)
+
+        anchor_offsets = dict(self.anchors)
+        self.spool.flush(); self.spool.seek(0)
+        copied = 0
+        pending = [] # In-memory elements that precede the next anchor
+        for element in self.body.iterchildren():
+            if element not in anchor_offsets:
+                pending.append(element); continue
+            offset = anchor_offsets[element]
+            self._copy_spool(out, offset - copied); copied = offset
+            for pending_element in pending: out.write(self._serialize(pending_element))
+            out.write(self._serialize(element))
+            pending = []
+        shutil.copyfileobj(self.spool, out, 1024 * 1024) # Rest of the spool
+        for pending_element in pending: out.write(self._serialize(pending_element)) # Unflushed tail and final sectPr
+        out.write(tail)
+
+    def _copy_spool(self, out, length: int):
+        while length > 0:
+            chunk = self.spool.read(min(length, 1024 * 1024))
+            if not chunk: break
+            out.write(chunk); length -= len(chunk)
+
+    def save(self, output_path):
+        """
+        Saves the document: all other parts come from python-docx, document.xml is streamed.
+
+        Raises:
+            OSError: If the package cannot be written.
+        """
+        output_path = Path(output_path)
+        fd, staging_name = tempfile.mkstemp(prefix="docx_pkg_", suffix=".docx", dir=output_path.parent)
+        os.close(fd)
+        try:
+            self.document.save(staging_name) # document.xml in here only holds the in-memory part; replaced below
+            tmp_output = output_path.with_suffix(output_path.suffix + ".tmp")
+            with zipfile.ZipFile(staging_name) as zin, zipfile.ZipFile(tmp_output, 'w', zipfile.ZIP_DEFLATED) as zout:
+                for item in zin.infolist():
+                    with zout.open(item.filename, 'w') as dst:
+                        if item.filename == 'word/document.xml':
+                            self._write_document_xml(dst)
+                        else:
+                            with zin.open(item) as src: shutil.copyfileobj(src, dst, 1024 * 1024)
+            tmp_output.replace(output_path)
+        finally:
+            Path(staging_name).unlink(missing_ok=True)
+
+    def close(self):
+        self.spool.close()
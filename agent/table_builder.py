@@ -0,0 +1,110 @@
+# agent/table_builder.py
+import csv
+import re
+from pathlib import Path
+from xml.sax.saxutils import escape
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_NS_DECLARATION = re.compile(r' xmlns:\w+="[^"]*"')
+EMU_PER_TWIP = 635
+
+def iter_table_rows(data):
+    """
+    Yields table rows as lists of cell values from any supported source.
+
+    Args:
+        data: One of
+            - a path (str or Path) to a .csv file, read lazily;
+            - a pandas-like DataFrame (has `columns` and `itertuples`); the column
+              names become the first row;
+            - a NumPy-like 2-D array (has `ndim` and `tolist`);
+            - any iterable of row iterables (list of lists, generator, csv.reader...).
+
+    Yields:
+        list: The values of one row.
+    """
+    if isinstance(data, (str, Path)):
+        with open(data, newline='', encoding='utf-8-sig') as f:
+            yield from csv.reader(f)
+        return
+    if hasattr(data, 'columns') and hasattr(data, 'itertuples'):
+        yield [str(column) for column in data.columns]
+        for row in data.itertuples(index=False, name=None): yield list(row)
+        return
+    if hasattr(data, 'ndim') and hasattr(data, 'tolist'):
+        if data.ndim != 2: raise ValueError(f"Table arrays must be 2-D, got {data.ndim}-D")
+        for row in data: yield row.tolist()
+        return
+    for row in data: yield list(row)
+
+def _cell_text_xml(value) -> str:
+    text = "" if value is None else str(value)
+    text = escape(_INVALID_XML_CHARS.sub("", text))
+    # Line breaks inside a cell become w:br within the run
+    return '</w:t><w:br/><w:t xml:space="preserve">'.join(text.split("\n"))
+
+def strip_namespace_declarations(xml: str) -> str:
+    """Removes xmlns declarations from a serialized fragment that will be embedded under a declaring root."""
+    return _NS_DECLARATION.sub("", xml)
+
+def build_table_element(rows, usable_width_emu: int, column_widths: list = None, header: bool = True,
+                        repeat_header: bool = True, cell_format: tuple = ("", ""), header_format: tuple = ("", ""),
+                        table_style_id: str = "TableGrid"):
+    """
+    Builds a complete w:tbl element from rows in one pass.
+
+    The XML for all rows is generated as text and parsed once, instead of creating
+    the table through python-docx and filling it cell by cell (each table.cell()
+    call walks the grid). Rows shorter than the widest row are padded.
+
+    Args:
+        rows: Iterable of row lists (see iter_table_rows).
+        usable_width_emu (int): Width to distribute between columns without explicit widths.
+        column_widths (list, optional): Width per column (docx Length); None entries share the rest.
+        header (bool): Treat the first row as the header row.
+        repeat_header (bool): Repeat the header row at the top of every page.
+        cell_format (tuple): (pPr XML, rPr XML) applied to body cell paragraphs/runs.
+        header_format (tuple): (pPr XML, rPr XML) for header cells.
+        table_style_id (str): Table style to reference (Word's built-in "Table Grid" by default).
+
+    Returns:
+        tuple: (CT_Tbl element or None if there are no rows, row count, column count)
+    """
+    row_xml = []
+    column_count = 0
+    for index, row in enumerate(rows):
+        is_header = header and index == 0
+        p_pr, r_pr = header_format if is_header else cell_format
+        row_properties = '<w:trPr><w:cantSplit/><w:tblHeader/></w:trPr>' if is_header and repeat_header else '<w:trPr><w:cantSplit/></w:trPr>'
+        cells = [f'<w:p>{p_pr}<w:r>{r_pr}<w:t xml:space="preserve">{_cell_text_xml(value)}</w:t></w:r></w:p>' for value in row]
+        column_count = max(column_count, len(cells))
+        row_xml.append((row_properties, cells))
+    if not row_xml or column_count == 0: return None, 0, 0
+
+    # Column widths in twips: explicit ones as given, the remaining width shared equally
+    usable_twips = int(usable_width_emu) // EMU_PER_TWIP
+    explicit = [(int(w) // EMU_PER_TWIP if w is not None else None) for w in (column_widths or [])[:column_count]]
+    explicit += [None] * (column_count - len(explicit))
+    free_columns = explicit.count(None)
+    shared = max((usable_twips - sum(w for w in explicit if w is not None)) // free_columns, 1) if free_columns else 0
+    widths = [w if w is not None else shared for w in explicit]
+    cell_properties = [f'<w:tcPr><w:tcW w:w="{w}" w:type="dxa"/></w:tcPr>' for w in widths]
+    empty_cell = '<w:p><w:r><w:t></w:t></w:r></w:p>'
+
+    parts = [f'<w:tbl {nsdecls("w")}><w:tblPr><w:tblStyle w:val="{table_style_id}"/>'
+             f'<w:tblW w:w="{sum(widths)}" w:type="dxa"/><w:jc w:val="center"/><w:tblLayout w:type="fixed"/>'
+             '<w:tblLook w:val="04A0" w:firstRow="1" w:lastRow="0" w:firstColumn="1" w:lastColumn="0" w:noHBand="0" w:noVBand="1"/>'
+             '</w:tblPr><w:tblGrid>']
+    parts.extend(f'<w:gridCol w:w="{w}"/>' for w in widths)
+    parts.append('</w:tblGrid>')
+    for row_properties, cells in row_xml:
+        parts.append('<w:tr>'); parts.append(row_properties)
+        for column, cell in enumerate(cells):
+            parts.append('<w:tc>'); parts.append(cell_properties[column]); parts.append(cell); parts.append('</w:tc>')
+        for column in range(len(cells), column_count):
+            parts.append('<w:tc>'); parts.append(cell_properties[column]); parts.append(empty_cell); parts.append('</w:tc>')
+        parts.append('</w:tr>')
+    parts.append('</w:tbl>')
+    return parse_xml("".join(parts)), len(row_xml), column_count
@@ -0,0 +1,305 @@
+# benchmarks/bench_build.py
+"""
+End-to-end build benchmark against a local mock Ollama server (benchmarks/mock_ollama.py).
+
+Scenarios are numbers of project files:
+    1     ReportBuilder.build in one process, repeated --repeat times per document type
+    N>1   N generated project files through BatchRunner (the --batch code path)
+
+Each scenario runs in a fresh process, so peak RSS is per scenario. Reported per
+scenario: wall time, build time distribution, mean time per phase (generate,
+front_matter, body, finalize, save), Ollama's server-side timings per build (model
+load, prompt evaluation, decoding; see BuildTrace), DOCX size, peak RSS and LLM
+request count.
+Results are written as JSON; pass an earlier file with --compare to flag regressions
+(e.g. a run without and one with --project-session shows the prompt evaluation saved).
+--hosts starts several mock servers and builds against all of them (OLLAMA_ENDPOINTS);
+--slow-host-factor and --dead-host show how the endpoint pool routes around a slow or
+unreachable host.
+--model-routes with --model-slowdown benchmarks per-section model tiering (a slow large
+model for chapters, a fast small one for front matter, budgets with fallback models).
+A large --response-words simulates a model that rambles past the requested length; compare
+a run with --no-token-budgets to see the decode time the guideline num_predict caps save.
+The LLM response cache and incremental builds are disabled, so every build generates.
+
+Usage:
+    python benchmarks/bench_build.py [--files 1 50 500] [--doc-types synopsis report]
+                                     [--latency 0.05] [--tokens-per-second 400] [--response-words 150] [--project-session]
+                                     [--strategy sections|json] [--model-routes JSON] [--model-slowdown M=F] [--no-token-budgets] [--num-parallel 2] [--hosts 2] [--slow-host-factor 4] [--dead-host]
+                                     [--output results.json] [--compare previous.json]
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from mock_ollama import MockOllamaServer, parse_model_slowdown
+
+PHASES = ("generate", "front_matter", "body", "finalize", "save")
+# BuildTrace summary fields averaged per build (Ollama's server-side timings)
+LLM_FIELDS = ("llm_calls", "retries", "client_latency_s", "load_s", "prompt_eval_s", "prompt_eval_count", "eval_s", "eval_count")
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1) # Linux reports KB
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)] if ordered else 0.0
+
+def _summarize_builds(results: list) -> dict:
+    """Aggregates per-build dicts with 'status', 'seconds', 'phases' and 'output'."""
+    succeeded = [r for r in results if r["status"] == "succeeded"]
+    seconds = [r["seconds"] for r in succeeded if r.get("seconds") is not None]
+    sizes = [Path(r["output"]).stat().st_size for r in succeeded if r.get("output") and Path(r["output"]).is_file()]
+    phases = {phase: round(sum(r.get("phases", {}).get(phase, 0.0) for r in succeeded) / len(succeeded), 4)
+              for phase in PHASES} if succeeded else {}
+    # A combined batch build (several doc types per file) shares one trace; count it once
+    traces = {(r["file"], None) if r.get("combined") else i: r.get("llm", {}) for i, r in enumerate(succeeded)}
+    llm = {field: round(sum(t.get(field, 0) for t in traces.values()) / len(succeeded), 4)
+           for field in LLM_FIELDS} if succeeded else {}
+    return {
+        "builds": len(results),
+        "failed": len(results) - len(succeeded),
+        "build_seconds": {"mean": round(sum(seconds) / len(seconds), 4) if seconds else None,
+                          "p50": round(_percentile(seconds, 0.5), 4), "p95": round(_percentile(seconds, 0.95), 4),
+                          "max": round(max(seconds), 4) if seconds else None},
+        "phases_mean_s": phases,
+        "llm_mean": llm,
+        "docx_bytes": {"mean": sum(sizes) // len(sizes) if sizes else None, "total": sum(sizes)},
+    }
+
+def _apply_settings(overrides: dict):
+    """Applies config overrides in a scenario process (batch workers inherit them when forked)."""
+    import config
+    for name, value in (overrides or {}).items(): setattr(config, name, value)
+
+def _make_components(api_url, output_dir: str):
+    from agent.guideline_manager import GuidelineManager
+    from agent.ollama_client import OllamaClient
+    from agent.content_generator import ContentGenerator
+    from agent.document_formatter import DocumentFormatter
+    from agent.report_builder import ReportBuilder
+    import config
+    guideline_mgr = GuidelineManager(config.GUIDELINES_FILE_PATH)
+    client = OllamaClient(model_name=config.DEFAULT_OLLAMA_MODEL, api_url=api_url, use_cache=False)
+    return ReportBuilder(guideline_mgr, ContentGenerator(client, guideline_mgr), DocumentFormatter(guideline_mgr),
+                         output_dir=output_dir, incremental=False)
+
+def run_single_scenario(project_file: str, doc_types: list, repeat: int, api_url, work_dir: str,
+                        settings: dict = None) -> dict:
+    """Builds one project file `repeat` times per document type in this process (runs in a fresh process)."""
+    _apply_settings(settings)
+    from agent.input_parser import InputParser
+    results = []
+    start = time.perf_counter()
+    with open(Path(work_dir) / "build.log", 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+        report_builder = _make_components(api_url, work_dir)
+        project_data = InputParser(project_file).load_and_validate()
+        for _ in range(repeat):
+            for doc_type in doc_types:
+                build_start = time.perf_counter()
+                result = {"doc_type": doc_type, "status": "failed", "output": None}
+                try:
+                    output = report_builder.build(doc_type, project_data)
+                    result.update({"status": "succeeded", "output": str(output),
+                                   "phases": dict(report_builder.phase_timings.get(doc_type, {})),
+                                   "llm": report_builder.traces[doc_type].summary()})
+                except Exception as e:
+                    result["error"] = f"{type(e).__name__}: {e}"
+                result["seconds"] = round(time.perf_counter() - build_start, 4)
+                results.append(result)
+    summary = {"mode": "in-process", "wall_time_s": round(time.perf_counter() - start, 3), **_summarize_builds(results)}
+    summary["peak_rss_mb"] = {"runner": _peak_rss_mb()}
+    return summary
+
+def run_batch_scenario(project_files: list, doc_types: list, processes: int, llm_concurrency: int, api_url,
+                       work_dir: str, settings: dict = None) -> dict:
+    """Builds the files with BatchRunner (runs in a fresh process; its children are the batch workers)."""
+    _apply_settings(settings)
+    # This process was spawned, which would make BatchRunner spawn its workers too; use the
+    # platform's default start method as main.py --batch does (fork on Linux: overrides carry over)
+    multiprocessing.set_start_method(None, force=True)
+    from agent.batch_runner import BatchRunner
+    with open(Path(work_dir) / "batch.log", 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+        runner = BatchRunner(doc_types, max_processes=processes, llm_concurrency=llm_concurrency, output_dir=work_dir,
+                             use_cache=False, incremental=False, api_url=api_url)
+        batch = runner.run(project_files, summary_path=str(Path(work_dir) / "batch_summary.json"))
+    summary = {"mode": "batch", "wall_time_s": batch["wall_time_s"], **_summarize_builds(batch["results"])}
+    summary["peak_rss_mb"] = {"runner": _peak_rss_mb(), "worker_max": _peak_rss_mb(resource.RUSAGE_CHILDREN)}
+    return summary
+
+def write_project_files(count: int, directory: Path) -> list:
+    """Writes `count` variants of project_data.yaml (distinct roll numbers and titles)."""
+    import yaml
+    with open(ROOT / "project_data.yaml", 'r', encoding='utf-8') as f:
+        template = yaml.safe_load(f)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        data = dict(template, roll_number=f"BENCH{i:05d}", project_title=f"{template['project_title']} (variant {i})")
+        path = directory / f"project_{i:05d}.yaml"
+        with open(path, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(data, f, sort_keys=False, allow_unicode=True)
+        paths.append(str(path))
+    return paths
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(previous_path: str, current: dict, threshold: float):
+    """Prints the change of wall time and mean build time per scenario against an earlier result file."""
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous_results = json.load(f)
+    previous = {s["name"]: s for s in previous_results.get("scenarios", [])}
+    print(f"\nComparison with {previous_path} (commit {previous_results.get('commit')}, threshold {threshold:.0%}):")
+    for scenario in current["scenarios"]:
+        old = previous.get(scenario["name"])
+        if not old: print(f"  {scenario['name']:<10} (not in previous results)"); continue
+        for label, get in (("wall", lambda s: s["wall_time_s"]), ("build mean", lambda s: s["build_seconds"]["mean"]),
+                           ("docx mean", lambda s: s["docx_bytes"]["mean"]),
+                           ("prompt eval", lambda s: s.get("llm_mean", {}).get("prompt_eval_s")),
+                           ("prompt tok", lambda s: s.get("llm_mean", {}).get("prompt_eval_count"))):
+            before, after = get(old), get(scenario)
+            if not before or after is None: continue
+            change = (after - before) / before
+            flag = "  REGRESSION" if change > threshold else ""
+            print(f"  {scenario['name']:<10} {label:<11} {before:>10} -> {after:<10} ({change:+.1%}){flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end build benchmark with a mock Ollama server.")
+    parser.add_argument('--files', type=int, nargs='+', default=[1, 50, 500], help="Scenarios: numbers of project files.")
+    parser.add_argument('--doc-types', nargs='+', choices=['synopsis', 'report'], default=['synopsis', 'report'])
+    parser.add_argument('--repeat', type=int, default=3, help="Builds per document type in the 1-file scenario.")
+    parser.add_argument('--processes', type=int, default=None, help="Batch worker processes (default: config).")
+    parser.add_argument('--llm-concurrency', type=int, default=None, help="Shared LLM slots in batch scenarios (default: config).")
+    parser.add_argument('--project-session', action='store_true',
+                        help="Evaluate the shared project prompt prefix once per document (config.OLLAMA_PROJECT_SESSION).")
+    parser.add_argument('--strategy', choices=['sections', 'json'], default=None,
+                        help="Generation strategy for all document types (config.GENERATION_STRATEGY).")
+    parser.add_argument('--model-routes', type=json.loads, default=None, metavar="JSON",
+                        help="Per-section model routes (config.SECTION_MODEL_ROUTES), e.g. "
+                             "'{\"front_matter\": {\"model\": \"small:latest\"}}'; the mock serves every model named.")
+    parser.add_argument('--no-token-budgets', action='store_true',
+                        help="Send no num_predict/stop budgets (config.GENERATION_TOKEN_BUDGETS=False).")
+    mock = parser.add_argument_group('mock server')
+    mock.add_argument('--latency', type=float, default=0.05, help="Fixed seconds per generate request.")
+    mock.add_argument('--tokens-per-second', type=float, default=400.0, help="Simulated decode speed.")
+    mock.add_argument('--prompt-tokens-per-second', type=float, default=4000.0, help="Simulated prompt evaluation speed.")
+    mock.add_argument('--response-words', type=int, default=150, help="Words per generated response.")
+    mock.add_argument('--load-seconds', type=float, default=0.0, help="Simulated model load on first use.")
+    mock.add_argument('--num-parallel', type=int, default=None, help="Generations each mock server runs at once (default: no limit).")
+    mock.add_argument('--model-slowdown', nargs='+', default=[], metavar="MODEL=FACTOR",
+                      help="Make a model this many times slower than the others, e.g. big:latest=4.")
+    mock.add_argument('--hosts', type=int, default=1, help="Mock servers to spread requests over (config.OLLAMA_ENDPOINTS).")
+    mock.add_argument('--slow-host-factor', type=float, default=1.0,
+                      help="With several hosts, the last one is this many times slower (latency and token rates).")
+    mock.add_argument('--dead-host', action='store_true', help="Add an endpoint that refuses connections.")
+    parser.add_argument('--output', default=None, help="Results JSON (default: benchmarks/results/bench_build_<timestamp>.json).")
+    parser.add_argument('--compare', default=None, help="Earlier results JSON to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative slowdown reported as a regression.")
+    args = parser.parse_args()
+
+    os.chdir(ROOT) # config paths (guidelines, sample figure) are relative to the project root
+    import config
+    overrides = {"OLLAMA_PROJECT_SESSION": True} if args.project_session else {}
+    if args.strategy: overrides["GENERATION_STRATEGY"] = {doc_type: args.strategy for doc_type in config.GENERATION_STRATEGY}
+    if args.model_routes is not None: overrides["SECTION_MODEL_ROUTES"] = args.model_routes
+    if args.no_token_budgets: overrides["GENERATION_TOKEN_BUDGETS"] = False
+    model_slowdown = parse_model_slowdown(args.model_slowdown)
+    models = {config.DEFAULT_OLLAMA_MODEL, *model_slowdown}
+    for route in (args.model_routes or {}).values():
+        models.update(m for m in (route.get('model'), route.get('fallback_model')) if m)
+    _apply_settings(overrides)
+    servers = []
+    for i in range(max(args.hosts, 1)):
+        factor = args.slow_host_factor if args.hosts > 1 and i == args.hosts - 1 else 1.0
+        servers.append(MockOllamaServer(latency=args.latency * factor, tokens_per_second=args.tokens_per_second / factor,
+                                        prompt_tokens_per_second=args.prompt_tokens_per_second / factor,
+                                        response_words=args.response_words, load_seconds=args.load_seconds,
+                                        models=tuple(sorted(models)), num_parallel=args.num_parallel,
+                                        model_slowdown=model_slowdown).start())
+    api_url = [server.url + "/api/generate" for server in servers]
+    if args.dead_host: api_url.append("http://127.0.0.1:9/api/generate") # Discard port: nothing listens
+    if len(api_url) == 1: api_url = api_url[0]
+    print(f"Mock Ollama at {', '.join(server.url for server in servers)}: latency={args.latency}s, "
+          f"{args.tokens_per_second} tok/s, {args.response_words} words/response"
+          + (f", last host {args.slow_host_factor}x slower" if args.hosts > 1 and args.slow_host_factor != 1 else "")
+          + (", plus a dead host" if args.dead_host else ""))
+    request_counts = lambda: [server.request_count for server in servers]
+
+    results = {
+        "benchmark": "bench_build",
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "doc_types": args.doc_types,
+        "mock": {"latency": args.latency, "tokens_per_second": args.tokens_per_second,
+                 "prompt_tokens_per_second": args.prompt_tokens_per_second, "response_words": args.response_words,
+                 "load_seconds": args.load_seconds, "num_parallel": args.num_parallel, "hosts": args.hosts, "slow_host_factor": args.slow_host_factor,
+                 "dead_host": args.dead_host, "model_slowdown": model_slowdown},
+        "settings": {name: getattr(config, name) for name in (
+            "MAX_GENERATION_WORKERS", "BATCH_MAX_PROCESSES", "BATCH_LLM_CONCURRENCY", "OLLAMA_USE_STREAMING",
+            "DOCX_USE_NAMED_STYLES", "DOCX_SKELETON_CACHE", "DOCX_STREAMING_WRITER", "TOC_ESTIMATE_PAGE_NUMBERS",
+            "OLLAMA_PROJECT_SESSION", "GENERATION_STRATEGY", "SECTION_MODEL_ROUTES", "GENERATION_TOKEN_BUDGETS")},
+        "scenarios": [],
+    }
+    context = multiprocessing.get_context("spawn") # Fresh interpreter per scenario: clean peak RSS
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench_build_") as tmp:
+            for count in args.files:
+                work_dir = Path(tmp) / f"files_{count}"
+                work_dir.mkdir()
+                project_files = write_project_files(count, work_dir / "projects")
+                requests_before = request_counts()
+                print(f"\nScenario files_{count}: {count} file(s) x {args.doc_types} ...", flush=True)
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    if count == 1:
+                        future = executor.submit(run_single_scenario, project_files[0], args.doc_types, args.repeat,
+                                                 api_url, str(work_dir), overrides)
+                    else:
+                        future = executor.submit(run_batch_scenario, project_files, args.doc_types, args.processes,
+                                                 args.llm_concurrency, api_url, str(work_dir), overrides)
+                    scenario = {"name": f"files_{count}", "files": count, **future.result()}
+                per_host = [after - before for before, after in zip(requests_before, request_counts())]
+                scenario["llm_requests"] = sum(per_host)
+                if len(servers) > 1: scenario["llm_requests_per_host"] = per_host
+                scenario["builds_per_minute"] = round(scenario["builds"] / scenario["wall_time_s"] * 60, 2) if scenario["wall_time_s"] else None
+                results["scenarios"].append(scenario)
+                phases = ", ".join(f"{p}={s}" for p, s in scenario["phases_mean_s"].items())
+                print(f"  wall={scenario['wall_time_s']}s builds={scenario['builds']} failed={scenario['failed']} "
+                      f"build mean={scenario['build_seconds']['mean']}s p95={scenario['build_seconds']['p95']}s")
+                print(f"  phases (mean s): {phases}")
+                print("  LLM per build (mean): " + ", ".join(f"{k}={v}" for k, v in scenario["llm_mean"].items()))
+                print(f"  docx mean={scenario['docx_bytes']['mean']} B, peak RSS={scenario['peak_rss_mb']} MB, "
+                      f"LLM requests={scenario['llm_requests']}")
+    finally:
+        for server in servers: server.stop()
+
+    output = Path(args.output) if args.output else ROOT / "benchmarks" / "results" / f"bench_build_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare: compare(args.compare, results, args.threshold)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# benchmarks/bench_toc.py
+"""
+Times TOC / List of Figures / List of Tables generation for growing documents.
+
+Builds synthetic reports with N headings (plus N/4 figures and N/4 tables) and
+times only the list step of finalization (including the page number estimate).
+Time per entry should stay roughly flat as N grows, i.e. list generation is linear.
+
+Usage:
+    python benchmarks/bench_toc.py [--sizes 250 500 1000 2000 4000] [--named-styles | --direct-formatting]
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agent.guideline_manager import GuidelineManager
+from agent.document_formatter import DocumentFormatter
+
+def build_document(formatter: DocumentFormatter, headings: int):
+    """Creates a report with placeholders and the given number of numbered headings."""
+    formatter.create_document('report')
+    formatter.insert_toc_placeholder(); formatter.insert_lof_placeholder(); formatter.insert_lot_placeholder()
+    formatter.add_section_break()
+    for i in range(headings):
+        level = 1 if i % 10 == 0 else (2 if i % 3 else 3)
+        formatter.add_heading(f"Heading {i}", level, 'report')
+        if i % 4 == 0:
+            formatter.add_figure("", f"Figure for heading {i}")
+            formatter.add_table([], f"Table for heading {i}")
+
+def time_list_step(formatter: DocumentFormatter) -> float:
+    start = time.perf_counter()
+    formatter.generate_lists()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TOC/LoF/LoT generation.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[250, 500, 1000, 2000, 4000], help="Heading counts to test.")
+    styles = parser.add_mutually_exclusive_group()
+    styles.add_argument('--named-styles', dest='named_styles', action='store_true', default=None)
+    styles.add_argument('--direct-formatting', dest='named_styles', action='store_false')
+    args = parser.parse_args()
+
+    guideline_mgr = GuidelineManager()
+    print(f"{'headings':>9} {'entries':>8} {'list step (s)':>14} {'us/entry':>9}")
+    for size in args.sizes:
+        formatter = DocumentFormatter(guideline_mgr, use_named_styles=args.named_styles)
+        with contextlib.redirect_stdout(io.StringIO()): # Silence the formatter's progress output
+            build_document(formatter, size)
+            seconds = time_list_step(formatter)
+        entries = len(formatter.headings) + len(formatter.figures) + len(formatter.tables)
+        print(f"{size:>9} {entries:>8} {seconds:>14.4f} {seconds / max(entries, 1) * 1e6:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# benchmarks/mock_ollama.py
+"""
+Local stand-in for the Ollama HTTP API, for benchmarks that must not depend on a GPU box.
+
+Serves GET / (health), GET /api/tags and POST /api/generate (streamed NDJSON or a
+single JSON object), with simulated timing:
+
+    first request for a model   load_seconds (model load), until keep_alive expires
+    every request               latency + prompt tokens / prompt_tokens_per_second
+                                + response tokens / tokens_per_second
+
+Responses carry Ollama's timing fields (total_duration, load_duration,
+prompt_eval_count, prompt_eval_duration, eval_count, eval_duration, in ns), and
+JSON-mode requests get a JSON object with every "<key>": "..." the prompt asks for.
+A request without a prompt only loads the model (done_reason "load"), like Ollama's.
+Final responses carry a `context` token array; tokens passed back as a request's
+`context` count as already evaluated (Ollama's KV cache), so only the new prompt
+is charged prompt evaluation time. options.num_predict caps the response length.
+With num_parallel set, at most that many generations run at once and the rest queue,
+like Ollama's OLLAMA_NUM_PARALLEL. model_slowdown makes some models slower than others
+(e.g. a large and a small model).
+
+Usage:
+    python benchmarks/mock_ollama.py [--port 11434] [--latency 0.05] [--tokens-per-second 400] ...
+or, from a benchmark:
+    server = MockOllamaServer(latency=0.01).start(); ... server.url ...; server.stop()
+"""
+import argparse
+import contextlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("the system model data results analysis project performance design method evaluation approach "
+         "implementation accuracy framework users proposed study existing process improves shows").split()
+_JSON_KEY = re.compile(r'"([^"\n]{1,80})"\s*:\s*"')
+
+def _approx_tokens(text: str) -> int:
+    return max(len(text) // 4, 1) if text else 0
+
+def _parse_keep_alive(value, default: float) -> float:
+    """Seconds from an Ollama keep_alive value (number of seconds or "5m" / "1h" / "30s"; negative = forever)."""
+    if value is None: return default
+    if isinstance(value, (int, float)): return float("inf") if value < 0 else float(value)
+    match = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*([smh]?)\s*", str(value))
+    if not match: return default
+    seconds = float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+    return float("inf") if seconds < 0 else seconds
+
+class MockOllamaServer:
+    """A threaded mock Ollama server; see the module docstring for the timing model."""
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05, tokens_per_second: float = 400.0,
+                 prompt_tokens_per_second: float = 4000.0, response_words: int = 150, load_seconds: float = 0.0,
+                 models: tuple = ("gemma3:latest",), default_keep_alive: float = 300.0, num_parallel: int = None,
+                 model_slowdown: dict = None):
+        """
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind; 0 picks a free one (see url).
+            latency (float): Fixed seconds added to every generate request.
+            tokens_per_second (float): Simulated decode speed.
+            prompt_tokens_per_second (float): Simulated prompt evaluation speed.
+            response_words (int): Words per generated response.
+            load_seconds (float): Simulated model load time on the first request (and after keep_alive expires).
+            models (tuple): Model names listed by /api/tags.
+            default_keep_alive (float): Seconds a model stays loaded when a request gives no keep_alive.
+            num_parallel (int, optional): Generations processed at once; None for no limit.
+            model_slowdown (dict, optional): Model name -> factor applied to its latency, load,
+                                             prompt evaluation and decode times.
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.response_words = response_words
+        self.load_seconds = load_seconds
+        self.models = tuple(models)
+        self.default_keep_alive = default_keep_alive
+        self.loaded_until = {} # model -> monotonic time its simulated load expires
+        self._ready_at = {} # model -> monotonic time its simulated load completes
+        self.request_count = 0
+        self._slots = threading.BoundedSemaphore(num_parallel) if num_parallel else None
+        self.model_slowdown = dict(model_slowdown or {})
+        self._lock = threading.Lock()
+        self._thread = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        """Base URL, e.g. http://127.0.0.1:54321 (generate endpoint: url + '/api/generate')."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockOllamaServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown(); self.httpd.server_close()
+
+    def _load_model(self, model: str, keep_alive) -> float:
+        """
+        Returns the simulated load time for this request and updates the model's residency.
+        Requests arriving while a load is in progress wait for it to complete.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.request_count += 1
+            if self.loaded_until.get(model, 0) > now:
+                load = max(self._ready_at.get(model, 0) - now, 0.0)
+            else:
+                load = self.load_seconds * self.model_slowdown.get(model, 1.0)
+                self._ready_at[model] = now + load
+            self.loaded_until[model] = now + load + _parse_keep_alive(keep_alive, self.default_keep_alive)
+        return load
+
+    def generate(self, request: dict) -> tuple:
+        """Simulates one generation. Returns (response text, final response fields)."""
+        start = time.perf_counter()
+        model = request.get("model", "")
+        load = self._load_model(model, request.get("keep_alive"))
+        context = request.get("context") or []
+        prompt_tokens = _approx_tokens(request.get("prompt", "")) + _approx_tokens(request.get("system", ""))
+        prompt_eval = prompt_tokens / self.prompt_tokens_per_second if self.prompt_tokens_per_second else 0.0
+        if request.get("format") == "json":
+            keys = list(dict.fromkeys(_JSON_KEY.findall(request.get("prompt", "")))) or ["text"]
+            words_per_key = max(self.response_words // len(keys), 1)
+            text = json.dumps({key: self._words(words_per_key, seed=len(key)) for key in keys})
+        else:
+            text = self._words(self.response_words, seed=prompt_tokens)
+        slowdown = self.model_slowdown.get(model, 1.0)
+        prompt_eval *= slowdown
+        num_predict = (request.get("options") or {}).get("num_predict")
+        truncated = bool(num_predict and num_predict > 0 and _approx_tokens(text) > num_predict)
+        if truncated: text = text[:num_predict * 4].rsplit(" ", 1)[0] if num_predict > 1 else text.split(" ")[0]
+        eval_count = _approx_tokens(text)
+        eval_time = slowdown * eval_count / self.tokens_per_second if self.tokens_per_second else 0.0
+        with self._slots or contextlib.nullcontext(): # Queued behind other generations
+            time.sleep(load + self.latency * slowdown + prompt_eval + eval_time)
+        to_ns = lambda seconds: int(seconds * 1e9)
+        final = {"model": model, "done": True, "done_reason": "length" if truncated else "stop",
+                 "total_duration": to_ns(time.perf_counter() - start), "load_duration": to_ns(load),
+                 "prompt_eval_count": prompt_tokens, "prompt_eval_duration": to_ns(prompt_eval),
+                 "eval_count": eval_count, "eval_duration": to_ns(eval_time),
+                 "context": list(context) + [(len(context) + i) % 32000 for i in range(prompt_tokens + eval_count)]}
+        return text, final
+
+    @staticmethod
+    def _words(count: int, seed: int) -> str:
+        words = [WORDS[(seed + i * 7) % len(WORDS)] for i in range(count)]
+        sentences = [" ".join(words[i:i + 12]).capitalize() + "." for i in range(0, len(words), 12)]
+        return " ".join(sentences)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, like the real server
+
+            def log_message(self, *args): pass
+
+            def _send_json(self, status: int, body: dict):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(data)))
+                self.end_headers(); self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.startswith("/api/tags"):
+                    self._send_json(200, {"models": [{"name": name, "model": name} for name in server.models]})
+                elif self.path in ("/", ""):
+                    data = b"Ollama is running"
+                    self.send_response(200); self.send_header("Content-Length", str(len(data))); self.end_headers()
+                    self.wfile.write(data)
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                try:
+                    self._handle_post()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass # The client gave up on the request (timeout, latency budget)
+
+            def _handle_post(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send_json(400, {"error": "invalid JSON"}); return
+                if not self.path.startswith("/api/generate"):
+                    self._send_json(404, {"error": "not found"}); return
+                if request.get("model") not in server.models:
+                    self._send_json(404, {"error": f"model '{request.get('model')}' not found"}); return
+                if not request.get("prompt") and not request.get("system"): # Load-only request (warm-up)
+                    start = time.perf_counter()
+                    load = server._load_model(request["model"], request.get("keep_alive"))
+                    time.sleep(load)
+                    self._send_json(200, {"model": request["model"], "response": "", "done": True, "done_reason": "load",
+                                          "total_duration": int((time.perf_counter() - start) * 1e9), "load_duration": int(load * 1e9)})
+                    return
+                text, final = server.generate(request)
+                if not request.get("stream", True):
+                    self._send_json(200, {**final, "response": text}); return
+                # Streamed: one NDJSON line per word, then the final line with the timing fields
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson"); self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                lines = [json.dumps({"model": final["model"], "response": word + " ", "done": False}) for word in text.split(" ")]
+                lines.append(json.dumps({**final, "response": ""}))
+                for line in lines:
+                    data = (line + "\n").encode()
+                    self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+def parse_model_slowdown(values: list) -> dict:
+    """{model: factor} from MODEL=FACTOR command line values."""
+    slowdown = {}
+    for value in values:
+        model, _, factor = value.rpartition("=")
+        if not model: raise argparse.ArgumentTypeError(f"Expected MODEL=FACTOR, got '{value}'")
+        slowdown[model] = float(factor)
+    return slowdown
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock Ollama server.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.05, help="Fixed seconds per generate request.")
+    parser.add_argument('--tokens-per-second', type=float, default=400.0, help="Simulated decode speed.")
+    parser.add_argument('--prompt-tokens-per-second', type=float, default=4000.0, help="Simulated prompt evaluation speed.")
+    parser.add_argument('--response-words', type=int, default=150, help="Words per response.")
+    parser.add_argument('--load-seconds', type=float, default=0.0, help="Simulated model load time.")
+    parser.add_argument('--models', nargs='+', default=["gemma3:latest"], help="Models listed by /api/tags.")
+    parser.add_argument('--num-parallel', type=int, default=None, help="Generations processed at once (default: no limit).")
+    parser.add_argument('--model-slowdown', nargs='+', default=[], metavar="MODEL=FACTOR",
+                        help="Make a model this many times slower, e.g. gemma3:12b=4.")
+    args = parser.parse_args()
+    server = MockOllamaServer(args.host, args.port, args.latency, args.tokens_per_second, args.prompt_tokens_per_second,
+                              args.response_words, args.load_seconds, tuple(args.models), num_parallel=args.num_parallel,
+                              model_slowdown=parse_model_slowdown(args.model_slowdown))
+    print(f"Mock Ollama listening on {server.url} (models: {', '.join(server.models)})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,141 @@ PROJECT_DATA_FILE_PATH = 'project_data.yaml'
 # Key name within project_data.yaml that holds the logo path
 LOGO_IMAGE_PATH_KEY = 'logo_image_path'
 
+# Generation Settings
+# Maximum number of section prompts sent to Ollama concurrently during a build.
+# Keep this at or below the server's OLLAMA_NUM_PARALLEL to avoid queueing.
+MAX_GENERATION_WORKERS = 4
+# In-flight request limit for AsyncOllamaClient (--async); match OLLAMA_NUM_PARALLEL
+OLLAMA_ASYNC_MAX_CONCURRENCY = 4
+
+# Generation strategy per document type: 'sections' sends one request per section, 'json'
+# asks for all sections in a single JSON-mode request keyed by section name (suits the
+# synopsis, whose sections are short). Keys missing from the JSON answer are requested again,
+# up to JSON_GENERATION_MAX_ATTEMPTS requests in total; any still missing are then generated
+# one by one. Combined builds always use 'sections'.
+GENERATION_STRATEGY = {'synopsis': 'sections', 'report': 'sections'}
+JSON_GENERATION_MAX_ATTEMPTS = 2
+
+# Per-section model routing. Each section belongs to a class (SECTION_MODEL_CLASSES, default
+# 'chapter'; condensation calls use 'condense' and JSON-strategy requests 'json'), and each
+# class can name a route in SECTION_MODEL_ROUTES:
+#   'model'           Ollama model (None: DEFAULT_OLLAMA_MODEL)
+#   'options'         Ollama options for the class, e.g. {'temperature': 0.5}
+#   'budget_seconds'  Latency budget per request; when the model exceeds it (or fails), the
+#                     request is abandoned and the section is generated with 'fallback_model',
+#                     and the class keeps using the fallback for SECTION_MODEL_FALLBACK_SECONDS
+#   'fallback_model'  Smaller model used after a budget overrun (the budget needs one to apply)
+# Classes without a route use DEFAULT_OLLAMA_MODEL. Every routed model must be pulled on
+# each Ollama host. Example tiering:
+#   'front_matter': {'model': 'gemma3:1b'},
+#   'chapter': {'model': 'gemma3:12b', 'budget_seconds': 120, 'fallback_model': 'gemma3:4b'},
+SECTION_MODEL_CLASSES = {'Abstract': 'front_matter', 'Acknowledgement': 'front_matter'}
+SECTION_MODEL_ROUTES = {}
+SECTION_MODEL_FALLBACK_SECONDS = 600
+
+# Generation budgets: every section request carries num_predict, a token cap derived from the
+# guidelines. The body sections share a body page target inside the guideline page range
+# (page_limit_min..page_limit_max), weighted by the length each prompt asks for; explicit word
+# limits such as the Abstract's apply as given, and other front matter gets one page. The body
+# can neither outgrow its page range nor be capped below its minimum, and rambling responses
+# stop costing decode time. A response cut off by its cap is trimmed to its last full sentence.
+GENERATION_TOKEN_BUDGETS = True
+GENERATION_TOKENS_PER_WORD = 1.4 # Average tokens per English word for common model tokenizers
+GENERATION_BODY_PAGE_TARGET = 0.5 # Position of the body page target in the page range: 0 = page_limit_min, 1 = page_limit_max
+GENERATION_PAGE_FILL = 0.85 # Share of a page's estimated text capacity budgeted (paragraph breaks, headings)
+# Responses end at these sequences: markdown headings and rules the model adds before
+# starting another section (not sent with JSON-mode requests). Empty list disables them.
+GENERATION_STOP_SEQUENCES = ['\n#', '\n---']
+
+# Incremental rebuilds: a manifest saved next to each output records the input fields
+# every section's prompt consumed; unchanged sections reuse their stored text.
+# Overridden by the --full-rebuild command line flag.
+INCREMENTAL_BUILDS = True
+
+# Combined builds (synopsis + report in one run): sections present in both documents are
+# generated once for the report; 'condense' derives the synopsis text with a short
+# condensation call, 'reuse' copies the report text unchanged.
+COMBINED_SHARED_SECTION_MODE = 'condense'
+
+# Per-build trace of LLM calls (section, client latency, retries, Ollama's load / prompt
+# eval / eval timings) and build phases, written next to the output document:
+# 'jsonl' -> <output>.trace.jsonl, 'chrome' -> <output>.trace.json (chrome://tracing,
+# Perfetto), None -> only the summary line is printed. Overridden by --trace.
+BUILD_TRACE_FORMAT = None
+
+# Batch Mode (main.py --batch)
+BATCH_MAX_PROCESSES = 4 # Worker processes building documents in parallel
+BATCH_LLM_CONCURRENCY = 4 # LLM requests in flight across ALL workers (shared rate limit)
+
+# HTTP connection pool, timeouts and retries for Ollama requests
+OLLAMA_POOL_CONNECTIONS = 4 # Number of hosts to keep connection pools for
+OLLAMA_POOL_MAXSIZE = 8 # Keep-alive connections per host; should be >= MAX_GENERATION_WORKERS
+OLLAMA_CONNECT_TIMEOUT = 5 # seconds to establish a TCP connection
+OLLAMA_READ_TIMEOUT = 120 # seconds to wait for a non-streamed response
+OLLAMA_MAX_RETRIES = 3 # Retries for connection failures and retryable statuses
+OLLAMA_READ_RETRIES = 1 # Retries after the request was sent (resets, read timeouts)
+OLLAMA_RETRY_STATUS_CODES = (429, 502, 503, 504) # Transient gateway/overload responses
+OLLAMA_RETRY_BACKOFF_FACTOR = 0.5 # Sleep = factor * 2**(retry - 1) seconds ...
+OLLAMA_RETRY_BACKOFF_MAX = 10 # ... capped at this many seconds ...
+OLLAMA_RETRY_BACKOFF_JITTER = 0.5 # ... plus up to this many seconds of random jitter
+# The /api/tags model list used by the startup check is cached in LLM_CACHE_DIR this long,
+# so processes started shortly after each other skip the request (0 disables the cache)
+OLLAMA_TAGS_CACHE_TTL_SECONDS = 300
+# Several Ollama servers: generate API URLs to spread requests over (replaces OLLAMA_API_URL
+# when non-empty). Each request goes to the host with the lowest expected wait (requests in
+# flight x its average latency); a host that fails or lacks the model is skipped and probed
+# again every OLLAMA_ENDPOINT_REPROBE_SECONDS, and the request fails over to another host.
+OLLAMA_ENDPOINTS = [] # E.g. ['http://192.168.0.193:11434/api/generate', 'http://192.168.0.194:11434/api/generate']
+OLLAMA_ENDPOINT_REPROBE_SECONDS = 30
+
+# Model residency: sent as keep_alive with every request, so Ollama keeps the model loaded
+# this long after its last use (Ollama's own default is 5m). A duration string ('30m', '2h'),
+# seconds, or -1 to keep it loaded until the server restarts.
+OLLAMA_KEEP_ALIVE = '30m'
+OLLAMA_BATCH_KEEP_ALIVE = '2h' # Used by batch builds (main.py --batch), which run for longer
+# Load the model with a background request as soon as possible - before the interactive
+# prompt in main.py, when the client is created elsewhere - so the load overlaps with user
+# input and front matter construction instead of delaying the first section
+OLLAMA_WARMUP = True
+
+# Project session: the system message and the project context block every section prompt
+# starts with are evaluated by Ollama once per document, and each section request sends
+# the returned `context` token array plus only its own instructions.
+OLLAMA_PROJECT_SESSION = False
+
+# Streaming: sections are collected from Ollama's NDJSON stream so long outputs are not
+# cut off by a wall-clock timeout. The read timeout applies between received chunks.
+OLLAMA_USE_STREAMING = True
+OLLAMA_STREAM_INACTIVITY_TIMEOUT = 60 # seconds without any streamed data before giving up
+
+# LLM Response Cache (SQLite, keyed by model/prompt/system/options/format)
+LLM_CACHE_ENABLED = True # Overridden by the --no-cache command line flag
+LLM_CACHE_DIR = 'output/.cache'
+LLM_CACHE_MAX_ENTRIES = 2000 # Least recently used entries are evicted beyond this
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600 # 0 disables expiry
+
+# Document Output
+# Register each guideline formatting style once as a named Word paragraph style and have
+# paragraphs reference it, instead of writing direct formatting on every paragraph and run.
+DOCX_USE_NAMED_STYLES = True
+# Build the static front matter (title page, declaration) once per document type and
+# guideline rule set, then clone it and fill in the student's fields for every build.
+DOCX_SKELETON_CACHE = True
+# Bounded-memory writer for very large reports: finished body content is spooled to a
+# temporary file and streamed into word/document.xml at save time.
+DOCX_STREAMING_WRITER = False
+DOCX_STREAMING_FLUSH_THRESHOLD = 200 # Body elements kept in memory before a flush
+# Fill TOC / List of Figures / List of Tables page numbers from an in-process pagination
+# estimate (agent/pagination.py) instead of leaving "..." for a later field update in Word.
+TOC_ESTIMATE_PAGE_NUMBERS = True
+# Figure images are downscaled to the printable width and recompressed before insertion
+# (needs Pillow; without it images are inserted as given). Processed files are cached by
+# content hash, so repeated builds and duplicate images are processed only once.
+FIGURE_IMAGE_OPTIMIZATION = True
+FIGURE_IMAGE_DPI = 200 # Pixel density at the printed size; wider images are downscaled
+FIGURE_JPEG_QUALITY = 85 # 1-95; used for photographs (screenshots and diagrams stay PNG)
+FIGURE_IMAGE_CACHE_DIR = 'output/.cache/images'
+
 # Document Types (used internally)
 DOC_SYNOPSIS = 'synopsis'
 DOC_REPORT = 'report'
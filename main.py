@@ -1,13 +1,14 @@
 # main.py (Final Version)
 import config
-from agent.report_builder import ReportBuilder # Import ReportBuilder
-from agent.guideline_manager import GuidelineManager
-from agent.ollama_client import OllamaClient
-from agent.content_generator import ContentGenerator
-from agent.document_formatter import DocumentFormatter
-from agent.input_parser import InputParser
+import argparse
 import sys
+import threading
 from pathlib import Path # For dummy image creation if needed
+# Agent modules (python-docx, lxml, requests, yaml) are imported where they are used, so
+# --help, the batch parent process and the interactive prompt start without loading them
+
+# Interactive choice that builds the synopsis and the report in one combined run
+DOC_BOTH = 'both'
 
 # --- Helper to create a dummy image file for testing ---
 # (Keep this if you want the optional figure generation in ReportBuilder to work)
@@ -31,8 +32,121 @@ def create_dummy_image(filepath="data/sample_figure.png"):
         except Exception as e: print(f"    Error creating dummy image: {e}"); return None
     return str(path)
 
-def run_agent():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='AI Project Report Agent')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always query Ollama instead of reusing cached responses.')
+    parser.add_argument('--clear-cache', action='store_true',
+                        help='Delete all cached LLM responses before building.')
+    parser.add_argument('--full-rebuild', action='store_true',
+                        help='Regenerate every section, ignoring unchanged sections from the previous build.')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Generate sections with the asyncio client (requires aiohttp).')
+    parser.add_argument('--deadline', type=float, default=None,
+                        help='With --async: seconds allowed for content generation before unfinished sections are cancelled.')
+    parser.add_argument('--trace', choices=['jsonl', 'chrome'], default=None,
+                        help='Write a per-build trace of LLM calls and phases next to each output document.')
+    batch = parser.add_argument_group('batch mode (non-interactive)')
+    batch.add_argument('--batch', metavar='DIR_OR_GLOB',
+                       help='Build documents for every project YAML in a directory or matching a glob pattern.')
+    batch.add_argument('--doc-type', nargs='+', choices=[config.DOC_SYNOPSIS, config.DOC_REPORT],
+                       default=[config.DOC_SYNOPSIS], help='Document type(s) to build for each file.')
+    batch.add_argument('--processes', type=int, default=None,
+                       help=f'Worker processes (default: {config.BATCH_MAX_PROCESSES}).')
+    batch.add_argument('--llm-concurrency', type=int, default=None,
+                       help=f'Concurrent LLM requests shared by all workers (default: {config.BATCH_LLM_CONCURRENCY}).')
+    batch.add_argument('--summary', default=None,
+                       help='Path for the JSON summary (default: output/batch_summary_<timestamp>.json).')
+    return parser.parse_args(argv)
+
+def clear_response_cache():
+    """Deletes all cached LLM responses (--clear-cache)."""
+    from agent.response_cache import ResponseCache
+    try:
+        removed = ResponseCache().invalidate()
+        print(f'    Cleared {removed} cached LLM responses.')
+    except Exception as e:
+        print(f'    Warning: Could not clear LLM response cache: {e}')
+
+def run_batch(source: str, doc_types: list, processes: int = None, llm_concurrency: int = None,
+              summary_path: str = None, use_cache: bool = True, incremental: bool = True, trace_format: str = None,
+              clear_cache: bool = False) -> int:
+    """Runs a non-interactive batch build. Returns a process exit code."""
+    from agent.batch_runner import BatchRunner, collect_project_files
+    print('\n--- AI Project Report Agent (batch mode) ---')
+    if clear_cache: clear_response_cache() # Before any worker can read a stale response
+    project_files = collect_project_files(source)
+    if not project_files:
+        print(f'    ERROR: No project YAML files found for: {source}'); return 1
+    create_dummy_image()
+    runner = BatchRunner(doc_types, max_processes=processes, llm_concurrency=llm_concurrency, use_cache=use_cache,
+                         incremental=incremental, trace_format=trace_format)
+    summary = runner.run(project_files, summary_path=summary_path)
+    return 0 if summary['failed'] == 0 else 2
+
+async def build_with_async_client(report_builder, doc_type: str, project_data: dict, use_cache: bool = True, deadline: float = None):
+    """Runs ReportBuilder.build_async with a temporary AsyncOllamaClient."""
+    from agent.async_ollama_client import AsyncOllamaClient
+    async with AsyncOllamaClient(model_name=config.DEFAULT_OLLAMA_MODEL,
+                                 use_cache=use_cache and config.LLM_CACHE_ENABLED) as async_client:
+        report_builder.content_gen.async_client = async_client
+        try:
+            await report_builder.build_async(doc_type, project_data, deadline=deadline)
+        finally:
+            report_builder.content_gen.async_client = None
+
+def preload_agent_modules():
+    """Imports the agent modules (python-docx, lxml, requests, yaml); run_agent's imports then find them loaded."""
+    try:
+        import agent.input_parser, agent.report_builder # noqa: F401 (report_builder pulls in the other modules)
+    except Exception:
+        pass # Reported by run_agent's own imports
+
+def warm_up_in_background(api_url: str, messages: list):
+    """
+    Loads the model on one Ollama host while the user answers the prompt (config.OLLAMA_WARMUP).
+    The outcome is appended to `messages`, printed once the build starts.
+    """
+    try:
+        import requests
+        from agent.endpoint_pool import base_url_of
+        from agent.ollama_client import warm_up_model
+    except ImportError:
+        return # Reported by run_agent's own imports
+    try:
+        seconds = warm_up_model(api_url, config.DEFAULT_OLLAMA_MODEL)
+        messages.append(f"      Model '{config.DEFAULT_OLLAMA_MODEL}' loaded in the background on {base_url_of(api_url)} "
+                        f"({seconds:.1f}s, keep-alive {config.OLLAMA_KEEP_ALIVE}).")
+    except requests.exceptions.RequestException as e:
+        messages.append(f"      Warning: Model warm-up failed on {base_url_of(api_url)}: {e}")
+
+def run_agent(use_cache: bool = True, clear_cache: bool = False, use_async: bool = False, deadline: float = None,
+              incremental: bool = True, trace_format: str = None):
     print('\n--- AI Project Report Agent ---')
+    if clear_cache: clear_response_cache()
+    # The agent modules load in the background while the user answers the prompt
+    threading.Thread(target=preload_agent_modules, name="preload-agent-modules", daemon=True).start()
+    # ... and the model loads on each Ollama host (the client is created after the prompt)
+    warmup_messages = []
+    if config.OLLAMA_WARMUP:
+        for api_url in config.OLLAMA_ENDPOINTS or [config.OLLAMA_API_URL]:
+            threading.Thread(target=warm_up_in_background, args=(api_url, warmup_messages), name="ollama-warm-up", daemon=True).start()
+
+    # 0. Choose Document Type
+    doc_type = ''
+    while doc_type not in [config.DOC_SYNOPSIS, config.DOC_REPORT, DOC_BOTH]:
+        doc_choice = input(f'>>> Generate [{config.DOC_SYNOPSIS}], [{config.DOC_REPORT}] or [{DOC_BOTH}]? ').lower().strip()
+        if doc_choice == config.DOC_SYNOPSIS: doc_type = config.DOC_SYNOPSIS
+        elif doc_choice == config.DOC_REPORT: doc_type = config.DOC_REPORT
+        elif doc_choice == DOC_BOTH: doc_type = DOC_BOTH
+    print(f'    Selected document type: {doc_type}')
+
+    from agent.guideline_manager import GuidelineManager
+    from agent.input_parser import InputParser
+    from agent.ollama_client import OllamaClient
+    from agent.content_generator import ContentGenerator
+    from agent.document_formatter import DocumentFormatter
+    from agent.report_builder import ReportBuilder
 
     # 1. Load Configuration & Guidelines
     print('[1] Loading guidelines...')
@@ -56,7 +170,9 @@ def run_agent():
     # 3. Initialize Core Components
     print('[3] Initializing agent components...')
     try:
-        ollama_client = OllamaClient(model_name=config.DEFAULT_OLLAMA_MODEL, api_url=config.OLLAMA_API_URL)
+        ollama_client = OllamaClient(model_name=config.DEFAULT_OLLAMA_MODEL,
+                                     use_cache=use_cache and config.LLM_CACHE_ENABLED,
+                                     warm_up=False) # Already loading since before the prompt
         content_gen = ContentGenerator(ollama_client, guideline_mgr)
         doc_formatter = DocumentFormatter(guideline_mgr)
         # Initialize ReportBuilder with all components
@@ -64,7 +180,9 @@ def run_agent():
             guideline_manager=guideline_mgr,
             content_generator=content_gen,
             document_formatter=doc_formatter,
-            output_dir=config.OUTPUT_DIR
+            output_dir=config.OUTPUT_DIR,
+            incremental=incremental and config.INCREMENTAL_BUILDS,
+            trace_format=trace_format
         )
         print('    Core components initialized.')
     except Exception as e:
@@ -73,20 +191,27 @@ def run_agent():
     # --- Create dummy image if needed by ReportBuilder examples ---
     create_dummy_image()
 
-    # 4. Choose Document Type
-    doc_type = ''
-    while doc_type not in [config.DOC_SYNOPSIS, config.DOC_REPORT]:
-        doc_choice = input(f'>>> Generate [{config.DOC_SYNOPSIS}] or [{config.DOC_REPORT}]? ').lower().strip()
-        if doc_choice == config.DOC_SYNOPSIS: doc_type = config.DOC_SYNOPSIS
-        elif doc_choice == config.DOC_REPORT: doc_type = config.DOC_REPORT
-    print(f'    Selected document type: {doc_type}')
+    ollama_client.report_connection_status(timeout=0) # Connection check results, if already finished
+    for message in list(warmup_messages): print(message) # Warm-up results, if already finished
 
     # 5. Build the Document (Remove the old test block)
     print(f'\n[4] Starting main build process for {doc_type.upper()}...')
     try:
         # Call the main build method
-        report_builder.build(doc_type, project_data)
+        if doc_type == DOC_BOTH:
+            # Shares the sections common to both documents (synchronous path)
+            if use_async or deadline is not None:
+                print("    Warning: --async and --deadline are not supported for combined builds; "
+                      "generating with the thread pool and no deadline.")
+            report_builder.build_combined(project_data, (config.DOC_REPORT, config.DOC_SYNOPSIS))
+        elif use_async:
+            import asyncio
+            asyncio.run(build_with_async_client(report_builder, doc_type, project_data, use_cache=use_cache, deadline=deadline))
+        else:
+            report_builder.build(doc_type, project_data)
         print(f"\n--- Agent Finished: Check the '{config.OUTPUT_DIR}' folder. ---")
+    except KeyboardInterrupt:
+         print("\n--- Build interrupted; outstanding generations were cancelled. ---")
     except Exception as e:
          print(f"\n--- FATAL ERROR DURING BUILD PROCESS ---")
          import traceback
@@ -94,4 +219,10 @@ def run_agent():
          print("-----------------------------------------")
 
 if __name__ == '__main__':
-    run_agent()
\ No newline at end of file
+    args = parse_args()
+    if args.batch:
+        sys.exit(run_batch(args.batch, args.doc_type, processes=args.processes, llm_concurrency=args.llm_concurrency,
+                           summary_path=args.summary, use_cache=not args.no_cache, incremental=not args.full_rebuild,
+                           trace_format=args.trace, clear_cache=args.clear_cache))
+    run_agent(use_cache=not args.no_cache, clear_cache=args.clear_cache, use_async=args.use_async, deadline=args.deadline,
+              incremental=not args.full_rebuild, trace_format=args.trace)
\ No newline at end of file